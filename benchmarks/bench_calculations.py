@@ -0,0 +1,68 @@
+"""Benchmark del calcolo dei totali materiali: ciclo Python contro NumPy.
+
+Simula il ricalcolo di un intero progetto (molti quadri, decine di
+migliaia di righe) dopo un aggiornamento dei prezzi.
+
+    python benchmarks/bench_calculations.py [righe] [quadri]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import MANUFACTURERS
+from src.utils.calculations import MaterialCalculations
+
+def make_records(count, tableaux):
+    random.seed(42)
+    records = []
+    for i in range(count):
+        records.append({
+            'quantity': random.randint(1, 20),
+            'price': round(random.uniform(5, 500), 2),
+            'time': random.randint(5, 40),
+            'num_modules': random.choice([0.5, 1, 2, 3, 4, 6]),
+            'num_bornes': random.randint(0, 8),
+            'tot_bornes_mm': random.choice([0, 52.5, 70.0, 105.0]),
+            'manufacturer': random.choice(MANUFACTURERS),
+            'tableau': i % tableaux
+        })
+    return records
+
+def timed(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    tableaux = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    records = make_records(count, tableaux)
+    by_tableau = [[] for _ in range(tableaux)]
+    for record in records:
+        by_tableau[record['tableau']].append(record)
+
+    python_time, _ = timed(lambda: [
+        MaterialCalculations.build_totals(MaterialCalculations.sum_contributions(rows))
+        for rows in by_tableau
+    ])
+
+    columns = MaterialCalculations.material_columns(records)
+    groups = [record['tableau'] for record in records]
+    numpy_time, _ = timed(lambda: MaterialCalculations.calculate_material_totals_arrays(
+        **columns, groups=groups, n_groups=tableaux
+    ))
+    convert_time, _ = timed(lambda: MaterialCalculations.material_columns(records))
+
+    print(f"{count} righe, {tableaux} quadri")
+    print(f"ciclo Python:           {python_time * 1000:8.1f} ms")
+    print(f"NumPy (colonne pronte): {numpy_time * 1000:8.1f} ms  (x{python_time / numpy_time:.0f})")
+    print(f"conversione in colonne: {convert_time * 1000:8.1f} ms")
+
+if __name__ == '__main__':
+    main()
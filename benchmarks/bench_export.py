@@ -0,0 +1,71 @@
+"""Benchmark dell'esportazione Excel: backend pandas contro streaming.
+
+Esporta un progetto sintetico con molti quadri e riporta tempo e picco di
+memoria del processo per ciascun backend (ognuno in un processo separato).
+
+    python benchmarks/bench_export.py [quadri] [righe per produttore]
+"""
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import LaborType
+from src.models import Project
+from src.models.materials import MaterialRow
+from src.utils.calculations import TotalCalculations
+from src.utils.export import ExcelExporter, EXPORT_BACKENDS
+
+def make_project(tableaux, rows):
+    random.seed(42)
+    project = Project(name="Benchmark", client_name="Cliente", volta_number="B001")
+    for t in range(tableaux):
+        tableau = project.add_tableau(f"Q{t:03d}")
+        for manufacturer in ('Hager', 'Schneider'):
+            tableau.materials_data[manufacturer] = [
+                dict(MaterialRow(
+                    float(random.randint(1, 20)), f"REF{t:03d}{i:05d}",
+                    designation=f"Articolo {i}", price=round(random.uniform(5, 500), 2),
+                    time=random.randint(5, 40), num_modules=2, num_bornes=3
+                ).to_dict(), row=i)
+                for i in range(rows)
+            ]
+        tableau.labor_data = [{'type': 'Pose', 'hours': 4.0}, {'type': 'Schéma', 'hours': 2.0}]
+        totals = TotalCalculations.calculate_tableau_totals(
+            [], tableau.labor_data, LaborType.INTERNAL, 0.25
+        )
+        tableau.summary_data = {'labor_type': LaborType.INTERNAL.value, 'margin': 0.25,
+                                'totals': totals}
+    return project
+
+def run(backend, tableaux, rows, filename):
+    project = make_project(tableaux, rows)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    ok = ExcelExporter(project, backend=backend).export(filename)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss è in KB su Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+    print(f"{backend:>10}: {elapsed:7.2f} s, memoria aggiuntiva {peak / 1024:7.1f} MB, "
+          f"{os.path.getsize(filename) / 1e6:.1f} MB{'' if ok else ' (ERRORE)'}")
+
+def main():
+    tableaux = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    if len(sys.argv) > 4:
+        run(sys.argv[3], tableaux, rows, sys.argv[4])
+        return
+    print(f"{tableaux} quadri, {rows} righe per produttore")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for backend in EXPORT_BACKENDS:
+            filename = os.path.join(tmpdir, f"{backend}.xlsx")
+            subprocess.run([sys.executable, __file__, str(tableaux), str(rows), backend, filename],
+                           check=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Benchmark di scalabilità del backend di esportazione 'parallel'.
+
+Esporta lo stesso progetto sintetico di bench_export.py con il backend
+streaming e con il backend parallel a 1, 2, 4... processi (fino al numero
+di CPU) e riporta il tempo di ciascuna esportazione.
+
+    python benchmarks/bench_export_parallel.py [quadri] [righe per produttore]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_export import make_project
+from src.utils.export import ExcelExporter
+
+def timed(project, filename, backend, workers=None):
+    start = time.perf_counter()
+    ok = ExcelExporter(project, backend=backend, workers=workers).export(filename)
+    elapsed = time.perf_counter() - start
+    label = backend if workers is None else f"{backend} x{workers}"
+    print(f"{label:>14}: {elapsed:7.2f} s{'' if ok else ' (ERRORE)'}")
+    return elapsed
+
+def main():
+    tableaux = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    cpus = os.cpu_count() or 1
+    print(f"{tableaux} quadri, {rows} righe per produttore, {cpus} CPU")
+    project = make_project(tableaux, rows)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        timed(project, os.path.join(tmpdir, "streaming.xlsx"), 'streaming')
+        workers = 1
+        baseline = None
+        while True:
+            elapsed = timed(project, os.path.join(tmpdir, f"parallel-{workers}.xlsx"),
+                            'parallel', workers)
+            baseline = baseline or elapsed
+            if workers > 1:
+                print(f"{'':>14}  accelerazione {baseline / elapsed:.2f}x rispetto a 1 processo")
+            if workers >= cpus:
+                break
+            workers = min(workers * 2, cpus)
+
+if __name__ == '__main__':
+    main()
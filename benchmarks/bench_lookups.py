@@ -0,0 +1,71 @@
+"""Micro-benchmark delle ricerche prodotto nel catalogo.
+
+Confronta una connessione aperta per ogni ricerca (comportamento precedente)
+con la connessione persistente di Database, e la risoluzione di molte
+referenze una alla volta (get_product) con quella in blocco (get_products).
+
+    python benchmarks/bench_lookups.py [numero_ricerche]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.database import Database, GET_PRODUCT_SQL, SAMPLE_PRODUCTS, UPSERT_PRODUCT_SQL
+
+def lookup_keys():
+    return [(product[0], manufacturer)
+            for manufacturer, products in SAMPLE_PRODUCTS.items()
+            for product in products]
+
+def bench_connect_per_lookup(db_file, keys, count):
+    start = time.perf_counter()
+    for i in range(count):
+        with sqlite3.connect(db_file) as conn:
+            conn.execute(GET_PRODUCT_SQL, keys[i % len(keys)]).fetchone()
+    return count / (time.perf_counter() - start)
+
+def bench_managed_connection(db, keys, count):
+    start = time.perf_counter()
+    for i in range(count):
+        db.get_product(*keys[i % len(keys)])
+    return count / (time.perf_counter() - start)
+
+def bench_batch(db, references):
+    """Secondi per risolvere tutte le referenze, una per volta e in blocco (senza cache)"""
+    keys = [('Hager', reference) for reference in references]
+    db.product_cache.clear()
+    start = time.perf_counter()
+    for manufacturer, reference in keys:
+        db.get_product(reference, manufacturer)
+    single = time.perf_counter() - start
+    db.product_cache.clear()
+    start = time.perf_counter()
+    db.get_products(keys)
+    return single, time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    keys = lookup_keys()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_file = os.path.join(tmpdir, 'bench.db')
+        with Database(db_file) as db:
+            before = bench_connect_per_lookup(db_file, keys, count)
+            after = bench_managed_connection(db, keys, count)
+            conn = db.connection()
+            with conn:
+                conn.executemany(UPSERT_PRODUCT_SQL, [
+                    (f"B{i:06d}", f"Articolo {i}", 1.0, 1, 1, 1, 17.5, 17.5, 1.0, 1.0, 'Hager')
+                    for i in range(100000)
+                ])
+            single, batch = bench_batch(db, [f"B{i * 97 % 100000:06d}" for i in range(1000)])
+    print(f"connessione per ricerca: {before:12,.0f} ricerche/s")
+    print(f"connessione persistente: {after:12,.0f} ricerche/s  (x{after / before:.1f})")
+    print(f"1000 referenze, una per volta: {single * 1000:8.2f} ms")
+    print(f"1000 referenze, get_products:  {batch * 1000:8.2f} ms  (x{single / batch:.1f})")
+
+if __name__ == '__main__':
+    main()
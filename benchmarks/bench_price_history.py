@@ -0,0 +1,59 @@
+"""Benchmark delle ricerche di prezzo a una data sullo storico prezzi.
+
+Crea un catalogo con molte variazioni di prezzo per referenza e confronta
+la ricerca del prezzo attuale con quella del prezzo in vigore a una data.
+
+    python benchmarks/bench_price_history.py [referenze] [variazioni per referenza]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.database import Database, RECORD_PRICE_SQL, UPSERT_PRODUCT_SQL
+
+def fill(db, references, versions):
+    random.seed(42)
+    start = date(2015, 1, 1)
+    conn = db.connection()
+    with conn:
+        conn.executemany(UPSERT_PRODUCT_SQL, [
+            (f"R{i:07d}", f"Articolo {i}", 10.0, 5, 1, 2, 17.5, 35.0, 11.0, 12.0, 'Hager')
+            for i in range(references)
+        ])
+        for version in range(versions):
+            valid_from = (start + timedelta(days=30 * version)).isoformat()
+            conn.executemany(RECORD_PRICE_SQL, [
+                ('Hager', f"R{i:07d}", valid_from, round(random.uniform(5, 500), 2), None, None)
+                for i in range(references)
+            ])
+
+def timed(label, lookups, fn):
+    start = time.perf_counter()
+    for key in lookups:
+        fn(*key)
+    rate = len(lookups) / (time.perf_counter() - start)
+    print(f"{label:>24}: {rate:12,.0f} ricerche/s")
+
+def main():
+    references = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    versions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with Database(os.path.join(tmpdir, 'bench.db'), seed=False) as db:
+            fill(db, references, versions)
+            count = db.connection().execute('SELECT COUNT(*) FROM price_history').fetchone()[0]
+            print(f"{references} referenze, {count:,} righe di storico")
+            random.seed(1)
+            lookups = [(f"R{random.randrange(references):07d}", 'Hager') for _ in range(20000)]
+            db.product_cache.clear()
+            timed("prezzo attuale", lookups, db.get_product)
+            db.product_cache.clear()
+            timed("prezzo a una data", lookups,
+                  lambda reference, manufacturer: db.get_product(reference, manufacturer, as_of='2016-06-15'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark della ricerca di referenze e designazioni nel catalogo.
+
+Crea un catalogo sintetico con designazioni realistiche e misura il tempo
+medio di ricerca per referenza, per un termine, per più termini e per
+termini corti (sotto i 3 caratteri dell'indice trigram).
+
+    python benchmarks/bench_search.py [prodotti]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.database import Database, UPSERT_PRODUCT_SQL
+
+MANUFACTURERS = ('Hager', 'Schneider', 'ABB', 'Legrand')
+KINDS = ('Interruttore magnetotermico', 'Interruttore differenziale', 'Presa', 'Contattore',
+         'Relè', 'Morsetto', 'Cavo', 'Sezionatore', 'Scaricatore', 'Variateur LED')
+POLES = ('1P', '1P+N', '2P', '3P', '4P')
+CURVES = ('B', 'C', 'D')
+CURRENTS = ('6A', '10A', '13A', '16A', '20A', '25A', '32A', '40A', '50A', '63A')
+
+QUERIES = (
+    ('referenza (prefisso)', 'R00123'),
+    ('un termine', 'Sezionatore'),
+    ('più termini', 'Interruttore 63A'),
+    ('più termini, rari', 'Scaricatore 4P D 13A'),
+    ('termini corti', 'C 6A'),
+    ('lungo e corti', 'magnetotermico C 6A'),
+    ('corti, nessun risultato', 'Q 9Z'),
+)
+
+def make_rows(count):
+    random.seed(42)
+    for i in range(count):
+        designation = (f"{random.choice(KINDS)} {random.choice(POLES)} "
+                       f"{random.choice(CURVES)} {random.choice(CURRENTS)}")
+        yield (f"R{i:07d}", designation, 10.0, 5, 1, 2, 17.5, 35.0, 11.0, 12.0,
+               MANUFACTURERS[i % len(MANUFACTURERS)])
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    repeat = 50
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with Database(os.path.join(tmpdir, 'bench.db'), seed=False) as db:
+            conn = db.connection()
+            with conn:
+                conn.executemany(UPSERT_PRODUCT_SQL, make_rows(count))
+            print(f"{count:,} prodotti, {len(MANUFACTURERS)} produttori")
+            for label, text in QUERIES:
+                results = db.search_products(text, 'Hager')
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    db.search_products(text, 'Hager')
+                elapsed = (time.perf_counter() - start) / repeat
+                print(f"{label:>24} {text!r:>24}: {elapsed * 1000:7.2f} ms  ({len(results)} risultati)")
+
+if __name__ == '__main__':
+    main()
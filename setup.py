@@ -8,6 +8,7 @@ setup(
     install_requires=[
         "PyQt6",
         "pandas",
+        "numpy",
         "openpyxl",
         "pytest"
     ],
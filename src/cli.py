@@ -0,0 +1,122 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+# Aggiungi il percorso del progetto al PYTHONPATH
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from src.config import APP_CONFIG, MANUFACTURERS
+from src.models.database import Database, price_date
+from src.utils import quoting, repricing
+
+def import_catalog(args):
+    db = Database(args.db, seed=False)
+    report = db.import_catalog(args.path, args.manufacturer, chunk_size=args.chunk_size,
+                               valid_from=args.valid_from)
+    print(report)
+    return 0
+
+def write_quotes(results, output_format, f):
+    """Scrive i preventivi man mano che arrivano; restituisce (progetti, errori)"""
+    counts = {'projects': 0, 'errors': 0}
+
+    def counted():
+        for result in results:
+            counts['projects'] += 1
+            counts['errors'] += 'error' in result
+            yield result
+
+    if output_format == 'csv':
+        quoting.write_csv(counted(), f)
+    else:
+        f.write('[')
+        for idx, result in enumerate(counted()):
+            f.write(',\n' if idx else '\n')
+            f.write(json.dumps(result, ensure_ascii=False))
+        f.write('\n]\n')
+    return counts['projects'], counts['errors']
+
+def quote(args):
+    files = quoting.find_projects(args.paths)
+    db_file = None
+    if not args.saved_prices:
+        # Porta lo schema all'ultima versione prima di aprire il catalogo nei processi
+        Database(args.db, seed=False).close()
+        db_file = args.db
+    output_format = args.format or ('csv' if (args.output or '').lower().endswith('.csv') else 'json')
+    results = quoting.quote_projects(files, db_file, workers=args.workers, as_of=args.as_of)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            projects, errors = write_quotes(results, output_format, f)
+    else:
+        projects, errors = write_quotes(results, output_format, sys.stdout)
+    logging.info(f"Preventivi calcolati: {projects - errors} di {projects} progetti")
+    return 1 if errors else 0
+
+def reprice(args):
+    files = quoting.find_projects(args.paths)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    with Database(args.db, seed=False) as db:
+        report = repricing.reprice_files(files, db, output_dir=args.output_dir, dry_run=args.dry_run)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8', newline='') as f:
+            report.write_csv(f)
+    for filename, total in report.totals.items():
+        print(f"{filename}: {total['old']:.2f} -> {total['new']:.2f}")
+    print(report)
+    return 1 if report.errors else 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m src.cli',
+                                     description="Strumenti Volta+ senza interfaccia grafica")
+    parser.add_argument('--db', default=APP_CONFIG['database_file'],
+                        help="File del database catalogo")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    catalog = subparsers.add_parser('import-catalog', help="Importa un listino CSV/XLSX")
+    catalog.add_argument('path', help="File del listino (.csv o .xlsx)")
+    catalog.add_argument('--manufacturer', required=True, choices=MANUFACTURERS)
+    catalog.add_argument('--chunk-size', type=int, default=10000)
+    catalog.add_argument('--valid-from', type=price_date, metavar='AAAA-MM-GG',
+                         help="Data da cui valgono i nuovi prezzi (default: oggi)")
+    catalog.set_defaults(func=import_catalog)
+
+    quote_parser = subparsers.add_parser('quote', help="Calcola i preventivi di file .volta")
+    quote_parser.add_argument('paths', nargs='+', help="File .volta o cartelle che li contengono")
+    quote_parser.add_argument('--output', '-o', help="File dei risultati (default: standard output)")
+    quote_parser.add_argument('--format', choices=('json', 'csv'),
+                              help="Formato dei risultati (default: dall'estensione, altrimenti json)")
+    quote_parser.add_argument('--workers', type=int, help="Processi in parallelo (default: numero di CPU)")
+    quote_parser.add_argument('--saved-prices', action='store_true',
+                              help="Usa i prezzi salvati nei progetti invece del catalogo")
+    quote_parser.add_argument('--as-of', type=price_date, metavar='AAAA-MM-GG',
+                              help="Usa i prezzi del catalogo in vigore a questa data")
+    quote_parser.set_defaults(func=quote)
+
+    reprice_parser = subparsers.add_parser('reprice', help="Aggiorna i prezzi dei progetti dal catalogo")
+    reprice_parser.add_argument('paths', nargs='+', help="File .volta o cartelle che li contengono")
+    reprice_parser.add_argument('--report', help="File CSV con le differenze di prezzo")
+    reprice_parser.add_argument('--output-dir', help="Cartella dei progetti aggiornati (default: sovrascrive)")
+    reprice_parser.add_argument('--dry-run', action='store_true',
+                                help="Calcola solo le differenze, senza scrivere i progetti")
+    reprice_parser.set_defaults(func=reprice)
+
+    return parser
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        logging.error(f"Errore nel comando {args.command}: {str(e)}")
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -76,7 +76,14 @@ APP_CONFIG = {
     'log_file': 'volta_plus.log',
     'autosave_interval': 300000,  # 5 minuti in millisecondi
     'default_margin': 25.0,
-    'project_file_extension': '.volta'
+    'project_file_extension': '.volta',
+    'project_file_format': 'json',  # 'json' (leggibile) o 'binary' (compatto, più veloce)
+    'product_cache_size': 4096,  # prodotti tenuti in memoria
+    'product_cache_ttl': 600,  # secondi, None per nessuna scadenza
+    'totals_verify_every': 500,  # modifiche tra due ricalcoli completi dei totali (0 = mai)
+    'journal_compact_threshold': 1000,  # modifiche nel giornale prima di un salvataggio completo
+    'excel_export_backend': 'streaming',  # 'streaming' (openpyxl write-only), 'parallel' o 'pandas'
+    'excel_export_workers': None  # processi del backend 'parallel' (None = numero di CPU)
 }
 
 # Lista dei produttori
@@ -88,7 +95,9 @@ UI_CONFIG = {
     'window_height': 900,
     'table_row_height': 25,
     'min_button_width': 80,
-    'margin_decimals': 2
+    'margin_decimals': 2,
+    'materials_spare_rows': 50,  # righe libere sotto l'ultima riga compilata
+    'live_inactive_tableaux': 3  # quadri non visibili che mantengono i widget costruiti
 }
 
 # Colori
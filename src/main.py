@@ -1,6 +1,7 @@
 import sys
 import os
 import logging
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtCore import Qt
 
@@ -22,6 +23,9 @@ def setup_logging():
     )
 
 def main():
+    # Nell'eseguibile PyInstaller i processi dell'esportazione parallela
+    # rilanciano l'eseguibile: freeze_support li esegue senza riaprire la GUI
+    multiprocessing.freeze_support()
     try:
         # Setup logging
         setup_logging()
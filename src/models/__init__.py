@@ -1,3 +1,4 @@
 from .database import Database
+from .product_cache import ProductCache
 from .project import Project, TableauElectrique
 from .rates import LaborRates
\ No newline at end of file
@@ -0,0 +1,197 @@
+import logging
+import re
+import sqlite3
+from typing import List, Tuple
+
+# Lunghezza minima di un termine per l'indice trigram di FTS5
+MIN_TERM_LENGTH = 3
+
+# Migliori candidati FTS5 (per bm25) riordinati poi con relevance()
+FTS_CANDIDATES = 100
+
+SEARCH_INDEX_SQL = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        reference, designation, manufacturer,
+        content='products', content_rowid='rowid',
+        tokenize='trigram'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, reference, designation, manufacturer)
+        VALUES (new.rowid, new.reference, new.designation, new.manufacturer);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, reference, designation, manufacturer)
+        VALUES ('delete', old.rowid, old.reference, old.designation, old.manufacturer);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_update
+    AFTER UPDATE OF reference, designation, manufacturer ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, reference, designation, manufacturer)
+        VALUES ('delete', old.rowid, old.reference, old.designation, old.manufacturer);
+        INSERT INTO products_fts (rowid, reference, designation, manufacturer)
+        VALUES (new.rowid, new.reference, new.designation, new.manufacturer);
+    END
+    ''',
+    "INSERT INTO products_fts (products_fts) VALUES ('rebuild')",
+]
+
+# Referenze che iniziano con il testo, maiuscole o minuscole: intervallo
+# sull'indice (manufacturer, reference COLLATE NOCASE)
+SEARCH_PREFIX_SQL = '''
+SELECT reference, designation
+FROM products
+WHERE manufacturer = ? AND reference >= ? COLLATE NOCASE AND reference < ? COLLATE NOCASE
+ORDER BY reference COLLATE NOCASE
+LIMIT ?
+'''
+
+# Ricerca di sottostringhe su referenza e designazione, le corrispondenze
+# migliori per bm25 prima del LIMIT (pesi: referenza 10, designazione 1,
+# produttore 0). Il costo cresce con il numero di righe che contengono i
+# termini: bm25 le legge tutte.
+# CROSS JOIN obbliga SQLite a partire dall'indice FTS e non dai prodotti.
+# {filters} riceve le condizioni LIKE dei termini troppo corti per l'indice.
+SEARCH_FTS_SQL = '''
+SELECT p.reference, p.designation
+FROM products_fts
+CROSS JOIN products p ON p.rowid = products_fts.rowid
+WHERE products_fts MATCH ? AND p.manufacturer = ?{filters}
+ORDER BY bm25(products_fts, 10.0, 1.0, 0.0)
+LIMIT ?
+'''
+
+# Alternativa se SQLite non è compilato con FTS5 o se tutti i termini sono
+# corti: scansione dei prodotti del produttore con un LIKE per termine
+SEARCH_LIKE_SQL = '''
+SELECT reference, designation
+FROM products
+WHERE manufacturer = ?{filters}
+ORDER BY reference
+LIMIT ?
+'''
+
+SEARCH_TRIGGERS = ('products_fts_insert', 'products_fts_delete', 'products_fts_update')
+
+def drop_search_triggers(conn):
+    """Sospende l'aggiornamento riga per riga dell'indice durante un import massivo"""
+    for trigger in SEARCH_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+
+def create_search_index(conn):
+    """Crea (o ricostruisce) l'indice FTS5 sul catalogo; senza FTS5 la ricerca usa LIKE"""
+    try:
+        for statement in SEARCH_INDEX_SQL:
+            conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        logging.warning(f"Indice di ricerca FTS5 non disponibile: {str(e)}")
+
+def _quote(term: str) -> str:
+    return '"{}"'.format(term.replace('"', '""'))
+
+def split_terms(text: str) -> Tuple[List[str], List[str]]:
+    """Termini del testo: (lunghi abbastanza per l'indice trigram, troppo corti)"""
+    terms = text.split()
+    return ([term for term in terms if len(term) >= MIN_TERM_LENGTH],
+            [term for term in terms if len(term) < MIN_TERM_LENGTH])
+
+def like_filters(terms: List[str], table: str = '') -> Tuple[str, List[str]]:
+    """Condizioni SQL (ogni termine nella referenza o nella designazione) e parametri"""
+    condition = f" AND ({table}reference LIKE ? ESCAPE '\\' OR {table}designation LIKE ? ESCAPE '\\')"
+    params = []
+    for term in terms:
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term) + '%'
+        params.extend((pattern, pattern))
+    return condition * len(terms), params
+
+def build_match_query(text: str, manufacturer: str = None) -> str:
+    """Trasforma il testo digitato in una query FTS5 (tutti i termini, come frasi).
+
+    I termini sotto MIN_TERM_LENGTH caratteri non sono nell'indice trigram e
+    restano fuori dalla query: search() li filtra con LIKE.
+    """
+    terms, _ = split_terms(text)
+    if not terms:
+        return ''
+    query = '{reference designation} : (' + ' AND '.join(_quote(term) for term in terms) + ')'
+    if manufacturer and len(manufacturer) >= MIN_TERM_LENGTH:
+        # Filtro nell'indice stesso, così i candidati sono già del produttore
+        query = f'manufacturer : {_quote(manufacturer)} AND {query}'
+    return query
+
+def relevance(text: str, reference: str, designation: str) -> Tuple:
+    """Chiave di ordinamento: referenza per prefisso, poi contenuta, poi designazione"""
+    needle = text.upper()
+    reference = (reference or '').upper()
+    designation = (designation or '').upper()
+    if reference.startswith(needle):
+        group = 0
+    elif needle in reference:
+        group = 1
+    elif designation.startswith(needle):
+        group = 2
+    else:
+        group = 3
+    position = designation.find(needle)
+    return (group, position if position >= 0 else len(designation), len(designation), reference)
+
+class CatalogSearch:
+    """Ricerca ordinata di referenze e designazioni nel catalogo.
+
+    Prima le referenze che iniziano con il testo cercato (indice del
+    catalogo), poi le migliori corrispondenze FTS5 (trigram, bm25) su
+    referenza e designazione, ordinate con relevance(). I termini corti (es. "C 6A")
+    sono cercati con LIKE, anche quando non c'è nessun termine per FTS5.
+    """
+
+    def __init__(self, database):
+        self.db = database
+        self._has_fts = None
+
+    @property
+    def has_fts(self) -> bool:
+        if self._has_fts is None:
+            self._has_fts = self.db.connection().execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'products_fts'"
+            ).fetchone() is not None
+        return self._has_fts
+
+    def search(self, text: str, manufacturer: str, limit: int = 20) -> List[Tuple[str, str]]:
+        text = text.strip()
+        if not text:
+            return []
+        
+        conn = self.db.connection()
+        results = conn.execute(
+            SEARCH_PREFIX_SQL, (manufacturer, text, text + '\uffff', limit)
+        ).fetchall()
+        if len(results) >= limit:
+            return results
+        
+        long_terms, short_terms = split_terms(text)
+        if self.has_fts and long_terms:
+            filters, params = like_filters(short_terms, 'p.')
+            extra = conn.execute(
+                SEARCH_FTS_SQL.format(filters=filters),
+                (build_match_query(text, manufacturer), manufacturer, *params, FTS_CANDIDATES)
+            ).fetchall()
+        else:
+            filters, params = like_filters(long_terms + short_terms)
+            extra = conn.execute(
+                SEARCH_LIKE_SQL.format(filters=filters), (manufacturer, *params, limit)
+            ).fetchall()
+        
+        seen = {reference for reference, _ in results}
+        extra.sort(key=lambda row: relevance(text, row[0], row[1]))
+        for row in extra:
+            if row[0] not in seen:
+                results.append(row)
+                seen.add(row[0])
+                if len(results) >= limit:
+                    break
+        return results
@@ -1,138 +1,590 @@
-from typing import Dict, List, Tuple
+from dataclasses import dataclass
+from datetime import date, datetime
+import logging
+from typing import Dict, Iterable, List, Tuple
+import itertools
 import sqlite3
+import threading
+import time
 from src.config import APP_CONFIG, MANUFACTURERS
+from src.utils.catalog_reader import iter_catalog_rows, iter_chunks
+from .product_cache import ProductCache
+from .catalog_search import (CatalogSearch, SEARCH_PREFIX_SQL, SEARCH_FTS_SQL, SEARCH_LIKE_SQL,
+                             build_match_query, like_filters,
+                             create_search_index, drop_search_triggers)
+
+PRODUCT_COLUMNS = (
+    'reference', 'designation', 'price', 'time', 'num_modules', 'num_bornes',
+    'bornes_mm', 'tot_bornes_mm', 'prix_2s', 'prix_3s', 'manufacturer'
+)
+
+# Inserisce o aggiorna un prodotto mantenendo la riga esistente; i campi
+# assenti dal listino (NULL) conservano il valore precedente
+UPSERT_PRODUCT_SQL = f'''
+INSERT INTO products ({', '.join(PRODUCT_COLUMNS)})
+VALUES ({', '.join('?' for _ in PRODUCT_COLUMNS)})
+ON CONFLICT(reference) DO UPDATE SET
+    {', '.join(f'{col} = COALESCE(excluded.{col}, products.{col})' for col in PRODUCT_COLUMNS[1:])}
+'''
+
+# Storico prezzi: una riga per ogni variazione, valida dalla data valid_from
+# (AAAA-MM-GG) fino alla successiva. La chiave primaria su (manufacturer,
+# reference, valid_from) di una tabella WITHOUT ROWID è l'indice stesso, quindi
+# la ricerca del prezzo a una data è una sola discesa nel B-tree.
+PRICE_HISTORY_FIELDS = ('price', 'prix_2s', 'prix_3s')
+
+# Data di validità dei prezzi già presenti quando è stato creato lo storico
+HISTORY_START = '0001-01-01'
+
+# Registra un prezzo solo se diverso da quello in vigore alla stessa data
+RECORD_PRICE_SQL = '''
+INSERT OR REPLACE INTO price_history (manufacturer, reference, valid_from, price, prix_2s, prix_3s)
+SELECT ?1, ?2, ?3, ?4, ?5, ?6
+WHERE NOT EXISTS (
+    SELECT 1 FROM (
+        SELECT price, prix_2s, prix_3s FROM price_history
+        WHERE manufacturer = ?1 AND reference = ?2 AND valid_from <= ?3
+        ORDER BY valid_from DESC LIMIT 1
+    )
+    WHERE price IS ?4 AND prix_2s IS ?5 AND prix_3s IS ?6
+)
+'''
+
+# Come RECORD_PRICE_SQL, con i prezzi appena scritti in products: un listino
+# senza alcune colonne di prezzo registra quelli che il prodotto conserva
+RECORD_PRODUCT_PRICE_SQL = '''
+INSERT OR REPLACE INTO price_history (manufacturer, reference, valid_from, price, prix_2s, prix_3s)
+SELECT p.manufacturer, p.reference, :valid_from, p.price, p.prix_2s, p.prix_3s
+FROM products AS p
+WHERE p.reference = :reference AND p.manufacturer = :manufacturer AND NOT EXISTS (
+    SELECT 1 FROM price_history AS h
+    WHERE h.manufacturer = p.manufacturer AND h.reference = p.reference
+      AND h.valid_from = (
+          SELECT MAX(valid_from) FROM price_history
+          WHERE manufacturer = p.manufacturer AND reference = p.reference AND valid_from <= :valid_from
+      )
+      AND h.price IS p.price AND h.prix_2s IS p.prix_2s AND h.prix_3s IS p.prix_3s
+)
+'''
+
+# products contiene i prezzi in vigore oggi. Una variazione con data futura,
+# o retrodatata quando esistono già variazioni successive, entra solo nello
+# storico: products riprende i prezzi dell'ultima variazione non futura
+RESTORE_CURRENT_PRICES_SQL = '''
+UPDATE products SET (price, prix_2s, prix_3s) = (
+    SELECT h.price, h.prix_2s, h.prix_3s FROM price_history AS h
+    WHERE h.manufacturer = products.manufacturer AND h.reference = products.reference
+      AND h.valid_from <= :today
+    ORDER BY h.valid_from DESC LIMIT 1
+)
+WHERE {where} AND (:valid_from > :today OR EXISTS (
+    SELECT 1 FROM price_history AS h
+    WHERE h.manufacturer = products.manufacturer AND h.reference = products.reference
+      AND h.valid_from > :valid_from AND h.valid_from <= :today
+))
+'''
+RESTORE_CURRENT_PRICE_SQL = RESTORE_CURRENT_PRICES_SQL.format(
+    where='reference = :reference AND manufacturer = :manufacturer')
+RESTORE_MANUFACTURER_PRICES_SQL = RESTORE_CURRENT_PRICES_SQL.format(where='manufacturer = :manufacturer')
+
+# Variazioni entrate in vigore dopo l'ultimo aggiornamento (:since) di products
+APPLY_DUE_PRICES_SQL = '''
+UPDATE products SET (price, prix_2s, prix_3s) = (
+    SELECT h.price, h.prix_2s, h.prix_3s FROM price_history AS h
+    WHERE h.manufacturer = products.manufacturer AND h.reference = products.reference
+      AND h.valid_from <= :today
+    ORDER BY h.valid_from DESC LIMIT 1
+)
+WHERE reference IN (
+    SELECT reference FROM price_history WHERE valid_from > :since AND valid_from <= :today
+)
+'''
+
+# Dati di esempio per diversi produttori, caricati solo se il catalogo è vuoto
+SAMPLE_PRODUCTS = {
+    'Schneider': [
+        ('A9F74206', 'iC60N 2P C 6A', 45.60, 15, 2, 4, 17.5, 70.0, 50.20, 55.80),
+        ('A9F74210', 'iC60N 2P C 10A', 48.90, 15, 2, 4, 17.5, 70.0, 53.80, 59.40),
+        ('A9F74216', 'iC60N 2P C 16A', 52.30, 15, 2, 4, 17.5, 70.0, 57.50, 63.30),
+        ('A9F74220', 'iC60N 2P C 20A', 55.70, 15, 2, 4, 17.5, 70.0, 61.30, 67.40),
+        ('A9F74225', 'iC60N 2P C 25A', 58.40, 15, 2, 4, 17.5, 70.0, 64.20, 70.60),
+    ],
+    'Hager': [
+        ('HTS263E', 'Interruttore 2P C 63A', 62.30, 20, 4, 6, 17.5, 105.0, 68.50, 75.40),
+        ('HTS240E', 'Interruttore 2P C 40A', 58.70, 20, 4, 6, 17.5, 105.0, 64.60, 71.20),
+        ('HTS232E', 'Interruttore 2P C 32A', 55.90, 20, 4, 6, 17.5, 105.0, 61.50, 67.70),
+        ('HTS225E', 'Interruttore 2P C 25A', 54.30, 20, 4, 6, 17.5, 105.0, 59.70, 65.70),
+    ],
+    'KNX': [
+        ('MTN6725-0001', 'KNX Power Supply 640mA', 385.0, 30, 4, 8, 17.5, 140.0, 423.50, 465.85),
+        ('MTN6003-0002', 'KNX IP Router', 420.0, 35, 2, 4, 17.5, 70.0, 462.00, 508.20),
+        ('MTN6164-0004', 'KNX Switch Actuator 4-fold', 275.0, 25, 4, 8, 17.5, 140.0, 302.50, 332.75),
+    ],
+    'MCR': [
+        ('MCR001', 'Relè di controllo', 145.30, 25, 2, 6, 17.5, 105.0, 159.83, 175.81),
+        ('MCR002', 'Timer digitale', 168.50, 28, 2, 4, 17.5, 70.0, 185.35, 203.89),
+        ('MCR003', 'Contatore energia', 195.70, 30, 4, 8, 17.5, 140.0, 215.27, 236.80),
+    ],
+    'Swisspro': [
+        ('SP001', 'Presa T13', 35.40, 10, 1, 3, 17.5, 52.5, 38.94, 42.83),
+        ('SP002', 'Interruttore', 42.60, 12, 1, 4, 17.5, 70.0, 46.86, 51.55),
+        ('SP003', 'Dimmer LED', 85.30, 15, 2, 6, 17.5, 105.0, 93.83, 103.21),
+    ]
+}
+
+# Migrazioni dello schema: la versione corrente è salvata in PRAGMA user_version.
+# Ogni voce porta il database dalla versione precedente a quella indicata.
+# Non modificare mai una migrazione già rilasciata: aggiungerne una nuova.
+MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS products (
+            reference TEXT PRIMARY KEY,
+            designation TEXT,
+            price REAL,
+            time INTEGER,
+            num_modules INTEGER,
+            num_bornes INTEGER,
+            bornes_mm REAL,
+            tot_bornes_mm REAL,
+            prix_2s REAL,
+            prix_3s REAL,
+            manufacturer TEXT
+        )
+        ''',
+    ]),
+    (2, [
+        # Indice composto e coprente: filtro per produttore, ordinamento per
+        # riferimento e designazione per l'autocompletamento senza leggere la tabella
+        '''
+        CREATE INDEX IF NOT EXISTS idx_products_manufacturer_reference
+        ON products (manufacturer, reference, designation)
+        ''',
+    ]),
+    # Indice FTS5 per la ricerca di referenze e designazioni
+    (3, [create_search_index]),
+    # Storico prezzi; i prezzi esistenti valgono da HISTORY_START
+    (4, [
+        '''
+        CREATE TABLE IF NOT EXISTS price_history (
+            manufacturer TEXT NOT NULL,
+            reference TEXT NOT NULL,
+            valid_from TEXT NOT NULL,
+            price REAL,
+            prix_2s REAL,
+            prix_3s REAL,
+            PRIMARY KEY (manufacturer, reference, valid_from)
+        ) WITHOUT ROWID
+        ''',
+        f'''
+        INSERT OR IGNORE INTO price_history (manufacturer, reference, valid_from, price, prix_2s, prix_3s)
+        SELECT manufacturer, reference, '{HISTORY_START}', price, prix_2s, prix_3s
+        FROM products WHERE manufacturer IS NOT NULL
+        ''',
+    ]),
+    # Variazioni future: data fino alla quale sono già state applicate a products
+    (5, [
+        'CREATE INDEX IF NOT EXISTS idx_price_history_valid_from ON price_history (valid_from)',
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''',
+    ]),
+    # Ricerca per prefisso della referenza senza distinguere maiuscole e minuscole
+    (6, [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_products_manufacturer_reference_nocase
+        ON products (manufacturer, reference COLLATE NOCASE, designation)
+        ''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Query del catalogo: stringhe costanti, così sqlite3 riusa lo statement
+# preparato dalla cache della connessione invece di ricompilarlo
+GET_PRODUCT_SQL = f'''
+SELECT {', '.join(PRODUCT_COLUMNS)} FROM products
+WHERE reference = ? AND manufacturer = ?
+'''
+
+GET_PRODUCTS_BY_MANUFACTURER_SQL = f'''
+SELECT {', '.join(PRODUCT_COLUMNS)} FROM products
+WHERE manufacturer = ?
+ORDER BY reference
+'''
+
+GET_PRICE_AS_OF_SQL = '''
+SELECT price, prix_2s, prix_3s FROM price_history
+WHERE manufacturer = ? AND reference = ? AND valid_from <= ?
+ORDER BY valid_from DESC
+LIMIT 1
+'''
+
+GET_REFERENCES_BY_MANUFACTURER_SQL = '''
+SELECT reference, designation
+FROM products
+WHERE manufacturer = ?
+ORDER BY reference
+'''
+
+# Ricerca di molti prodotti insieme: le chiavi (produttore, referenza) vanno
+# in una tabella temporanea della connessione e un solo join le risolve tutte,
+# ognuna con una ricerca sulla chiave primaria di products (CROSS JOIN impone
+# a SQLite l'ordine: prima le chiavi, mai una scansione del catalogo)
+CREATE_PRODUCT_KEYS_SQL = '''
+CREATE TEMP TABLE IF NOT EXISTS product_keys (
+    manufacturer TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    PRIMARY KEY (manufacturer, reference)
+) WITHOUT ROWID
+'''
+
+JOIN_PRODUCT_KEYS_SQL = f'''
+SELECT {', '.join(f'p.{col}' for col in PRODUCT_COLUMNS)}
+FROM product_keys AS k
+CROSS JOIN products AS p ON p.reference = k.reference AND p.manufacturer = k.manufacturer
+'''
+
+# Query di lettura del catalogo con parametri di esempio, verificate dai test
+# con EXPLAIN QUERY PLAN: nessuna deve ricadere in una scansione completa
+CATALOG_QUERIES = {
+    'get_product': (GET_PRODUCT_SQL, ('A9F74206', 'Schneider')),
+    'get_price_as_of': (GET_PRICE_AS_OF_SQL, ('Schneider', 'A9F74206', '2024-01-01')),
+    'get_products_by_manufacturer': (GET_PRODUCTS_BY_MANUFACTURER_SQL, ('Schneider',)),
+    'get_references_by_manufacturer': (GET_REFERENCES_BY_MANUFACTURER_SQL, ('Schneider',)),
+    'search_prefix': (SEARCH_PREFIX_SQL, ('Schneider', 'A9F', 'A9F\uffff', 20)),
+    'search_fts': (SEARCH_FTS_SQL.format(filters=''), (build_match_query('iC60', 'Schneider'), 'Schneider', 200)),
+    'search_like': (SEARCH_LIKE_SQL.format(filters=like_filters(['6A'])[0]), ('Schneider', '%6A%', '%6A%', 20)),
+}
+
+STATEMENT_CACHE_SIZE = 256
+
+_memory_db_ids = itertools.count()
+
+def price_date(value=None) -> str:
+    """Data per lo storico prezzi (AAAA-MM-GG); senza valore la data di oggi"""
+    if value is None:
+        return date.today().isoformat()
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return date.fromisoformat(str(value)).isoformat()
+
+@dataclass
+class ImportReport:
+    manufacturer: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+    def __str__(self):
+        return (f"{self.manufacturer}: importate {self.rows} righe in "
+                f"{self.seconds:.2f} s ({self.rows_per_second:,.0f} righe/s)")
 
 class Database:
-    def __init__(self, db_file: str = None):
+    """Catalogo prodotti con una connessione SQLite persistente per thread.
+
+    Le connessioni restano aperte per tutta la vita dell'oggetto; usare
+    close() o il blocco with per rilasciarle. Dopo close() il catalogo non
+    si può più usare (per ':memory:' i dati sono andati persi).
+    """
+
+    def __init__(self, db_file: str = None, seed: bool = True):
         self.db_file = db_file or APP_CONFIG['database_file']
-        self.init_database()
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.product_cache = ProductCache(APP_CONFIG['product_cache_size'],
+                                          APP_CONFIG['product_cache_ttl'])
+        self.catalog_search = CatalogSearch(self)
+        
+        if self.db_file == ':memory:':
+            # Un database in memoria privato non sarebbe visibile agli altri
+            # thread: si usa una cache condivisa con nome univoco
+            self._target = f'file:voltaplus_{next(_memory_db_ids)}?mode=memory&cache=shared'
+            self._uri = True
+        else:
+            self._target = self.db_file
+            self._uri = False
+        
+        # La connessione del thread principale tiene in vita anche il database in memoria
+        self._main_connection = self.connection()
+        self.init_database(seed=seed)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connection(self) -> sqlite3.Connection:
+        """Restituisce la connessione del thread corrente, aprendola se necessario"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._lock:
+                if self._closed:
+                    raise sqlite3.ProgrammingError(f"Database {self.db_file} già chiuso")
+                conn = sqlite3.connect(
+                    self._target,
+                    uri=self._uri,
+                    cached_statements=STATEMENT_CACHE_SIZE,
+                    check_same_thread=False  # solo per poterla chiudere da close()
+                )
+                self._local.conn = conn
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Chiude tutte le connessioni aperte dai vari thread"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+            self._closed = True
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.error(f"Errore nella chiusura della connessione: {str(e)}")
+        self._main_connection = None
     
-    def init_database(self):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            
-            # Prima elimina la tabella se esiste
-            cursor.execute('DROP TABLE IF EXISTS products')
-            
-            # Crea tabella prodotti con colonne aggiuntive
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                reference TEXT PRIMARY KEY,
-                designation TEXT,
-                price REAL,
-                time INTEGER,
-                num_modules INTEGER,
-                num_bornes INTEGER,
-                bornes_mm REAL,
-                tot_bornes_mm REAL,
-                prix_2s REAL,
-                prix_3s REAL,
-                manufacturer TEXT
-            )
-            ''')
-            
-            # Dati di esempio per diversi produttori
-            manufacturers_data = {
-                'Schneider': [
-                    ('A9F74206', 'iC60N 2P C 6A', 45.60, 15, 2, 4, 17.5, 70.0, 50.20, 55.80),
-                    ('A9F74210', 'iC60N 2P C 10A', 48.90, 15, 2, 4, 17.5, 70.0, 53.80, 59.40),
-                    ('A9F74216', 'iC60N 2P C 16A', 52.30, 15, 2, 4, 17.5, 70.0, 57.50, 63.30),
-                    ('A9F74220', 'iC60N 2P C 20A', 55.70, 15, 2, 4, 17.5, 70.0, 61.30, 67.40),
-                    ('A9F74225', 'iC60N 2P C 25A', 58.40, 15, 2, 4, 17.5, 70.0, 64.20, 70.60),
-                ],
-                'Hager': [
-                    ('HTS263E', 'Interruttore 2P C 63A', 62.30, 20, 4, 6, 17.5, 105.0, 68.50, 75.40),
-                    ('HTS240E', 'Interruttore 2P C 40A', 58.70, 20, 4, 6, 17.5, 105.0, 64.60, 71.20),
-                    ('HTS232E', 'Interruttore 2P C 32A', 55.90, 20, 4, 6, 17.5, 105.0, 61.50, 67.70),
-                    ('HTS225E', 'Interruttore 2P C 25A', 54.30, 20, 4, 6, 17.5, 105.0, 59.70, 65.70),
-                ],
-                'KNX': [
-                    ('MTN6725-0001', 'KNX Power Supply 640mA', 385.0, 30, 4, 8, 17.5, 140.0, 423.50, 465.85),
-                    ('MTN6003-0002', 'KNX IP Router', 420.0, 35, 2, 4, 17.5, 70.0, 462.00, 508.20),
-                    ('MTN6164-0004', 'KNX Switch Actuator 4-fold', 275.0, 25, 4, 8, 17.5, 140.0, 302.50, 332.75),
-                ],
-                'MCR': [
-                    ('MCR001', 'Relè di controllo', 145.30, 25, 2, 6, 17.5, 105.0, 159.83, 175.81),
-                    ('MCR002', 'Timer digitale', 168.50, 28, 2, 4, 17.5, 70.0, 185.35, 203.89),
-                    ('MCR003', 'Contatore energia', 195.70, 30, 4, 8, 17.5, 140.0, 215.27, 236.80),
-                ],
-                'Swisspro': [
-                    ('SP001', 'Presa T13', 35.40, 10, 1, 3, 17.5, 52.5, 38.94, 42.83),
-                    ('SP002', 'Interruttore', 42.60, 12, 1, 4, 17.5, 70.0, 46.86, 51.55),
-                    ('SP003', 'Dimmer LED', 85.30, 15, 2, 6, 17.5, 105.0, 93.83, 103.21),
-                ]
-            }
-            
-            # Inserisci i dati per ogni produttore
-            for manufacturer, products in manufacturers_data.items():
-                for product in products:
-                    cursor.execute('''
-                    INSERT OR REPLACE INTO products 
-                    (reference, designation, price, time, num_modules, num_bornes, 
-                    bornes_mm, tot_bornes_mm, prix_2s, prix_3s, manufacturer)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (*product, manufacturer))
-            
-            conn.commit()
+    def init_database(self, seed: bool = True):
+        """Porta lo schema all'ultima versione e carica i dati di esempio se il catalogo è vuoto"""
+        conn = self.connection()
+        self.migrate(conn)
+        if seed:
+            self.seed_if_empty(conn)
+        self.apply_due_prices()
+
+    def apply_due_prices(self, today=None) -> int:
+        """Porta in products i prezzi entrati in vigore dall'ultima chiamata.
+
+        Serve per i listini importati con data futura; restituisce il numero
+        di prodotti aggiornati.
+        """
+        today = price_date(today)
+        conn = self.connection()
+        row = conn.execute("SELECT value FROM catalog_state WHERE key = 'prices_applied'").fetchone()
+        since = row[0] if row else ''
+        if since >= today:
+            return 0
+        with conn:
+            updated = conn.execute(APPLY_DUE_PRICES_SQL, {'since': since, 'today': today}).rowcount
+            conn.execute("INSERT OR REPLACE INTO catalog_state (key, value) VALUES ('prices_applied', ?)",
+                         (today,))
+        if updated:
+            self.product_cache.clear()
+        return updated
+
+    @staticmethod
+    def get_schema_version(conn) -> int:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def migrate(self, conn) -> int:
+        """Applica le migrazioni mancanti; non scrive nulla se lo schema è aggiornato"""
+        version = self.get_schema_version(conn)
+        if version >= SCHEMA_VERSION:
+            return version
+        
+        for target_version, statements in MIGRATIONS:
+            if target_version <= version:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            # PRAGMA non accetta parametri, la versione è un intero nostro
+            conn.execute(f'PRAGMA user_version = {int(target_version)}')
+        conn.commit()
+        return SCHEMA_VERSION
+
+    def seed_if_empty(self, conn) -> bool:
+        """Inserisce i dati di esempio solo se la tabella prodotti è vuota"""
+        if conn.execute('SELECT 1 FROM products LIMIT 1').fetchone():
+            return False
+        
+        conn.executemany('''
+        INSERT OR REPLACE INTO products 
+        (reference, designation, price, time, num_modules, num_bornes, 
+        bornes_mm, tot_bornes_mm, prix_2s, prix_3s, manufacturer)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (*product, manufacturer)
+            for manufacturer, products in SAMPLE_PRODUCTS.items()
+            for product in products
+        ])
+        conn.executemany(RECORD_PRICE_SQL, [
+            (manufacturer, product[0], HISTORY_START, product[2], product[8], product[9])
+            for manufacturer, products in SAMPLE_PRODUCTS.items()
+            for product in products
+        ])
+        conn.commit()
+        return True
+
+    @staticmethod
+    def configure_bulk_write(conn):
+        """PRAGMA per scritture massive: WAL e sync ridotto (sicuro con WAL)"""
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA temp_store = MEMORY')
+
+    def import_catalog(self, path: str, manufacturer: str, chunk_size: int = 10000,
+                       valid_from=None) -> ImportReport:
+        """Importa un listino CSV/XLSX del produttore in un'unica transazione.
+
+        I prezzi cambiati sono registrati nello storico con validità da
+        valid_from (default: oggi); con una data futura i prezzi attuali
+        restano quelli in vigore oggi fino a quella data.
+        """
+        start = time.perf_counter()
+        valid_from = price_date(valid_from)
+        imported = 0
+        conn = self.connection()
+        self.configure_bulk_write(conn)
+        has_fts = self.catalog_search.has_fts
+        with conn:
+            # sqlite3 non apre la transazione prima di un DROP TRIGGER: senza
+            # BEGIN esplicito un import fallito lascerebbe l'indice senza trigger
+            conn.execute('BEGIN')
+            if has_fts:
+                # Ricostruire l'indice alla fine costa molto meno dei trigger riga per riga
+                drop_search_triggers(conn)
+            for chunk in iter_chunks(iter_catalog_rows(path), chunk_size):
+                conn.executemany(UPSERT_PRODUCT_SQL, [(*row, manufacturer) for row in chunk])
+                conn.executemany(RECORD_PRODUCT_PRICE_SQL, [
+                    {'reference': row[0], 'manufacturer': manufacturer, 'valid_from': valid_from}
+                    for row in chunk
+                ])
+                imported += len(chunk)
+            conn.execute(RESTORE_MANUFACTURER_PRICES_SQL, {'manufacturer': manufacturer, 'valid_from': valid_from,
+                                                           'today': price_date()})
+            if has_fts:
+                create_search_index(conn)
+        # Un import può cambiare prezzi e produttore di qualsiasi referenza
+        self.product_cache.clear()
+        # L'uscita dal blocco with esegue il commit unico
+        return ImportReport(manufacturer, imported, time.perf_counter() - start)
     
-    def get_product(self, reference: str, manufacturer: str) -> Dict:
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            SELECT * FROM products
-            WHERE reference = ? AND manufacturer = ?
-            ''', (reference, manufacturer))
-            
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'reference': row[0],
-                    'designation': row[1],
-                    'price': row[2],
-                    'time': row[3],
-                    'num_modules': row[4],
-                    'num_bornes': row[5],
-                    'bornes_mm': row[6],
-                    'tot_bornes_mm': row[7],
-                    'prix_2s': row[8],
-                    'prix_3s': row[9],
-                    'manufacturer': row[10]
-                }
-            return None
+    @staticmethod
+    def _row_to_product(row) -> Dict:
+        return dict(zip(PRODUCT_COLUMNS, row))
+
+    def explain_query_plan(self, sql: str, params=()) -> List[str]:
+        """Restituisce le righe di EXPLAIN QUERY PLAN di una query"""
+        rows = self.connection().execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        return [row[-1] for row in rows]
+
+    def get_product(self, reference: str, manufacturer: str, as_of=None) -> Dict:
+        """Prodotto del catalogo; con as_of (data) i prezzi in vigore a quella data.
+
+        Con as_of restituisce None se il prodotto non aveva ancora un prezzo.
+        """
+        key = (manufacturer, reference)
+        found, product = self.product_cache.get(key)
+        if not found:
+            row = self.connection().execute(GET_PRODUCT_SQL, (reference, manufacturer)).fetchone()
+            product = self._row_to_product(row) if row else None
+            self.product_cache.put(key, product)
+        if product and as_of is not None:
+            prices = self.connection().execute(
+                GET_PRICE_AS_OF_SQL, (manufacturer, reference, price_date(as_of))
+            ).fetchone()
+            if prices is None:
+                return None
+            return dict(product, **dict(zip(PRICE_HISTORY_FIELDS, prices)))
+        # Copia, così chi modifica il dizionario non altera la cache
+        return dict(product) if product else None
+
+    def get_products(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """Come get_product per molte coppie (produttore, referenza) insieme.
+
+        Le chiavi non in cache sono risolte con un solo join; il risultato ha
+        una voce per ogni chiave (None se il prodotto non esiste).
+        """
+        products = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            found, product = self.product_cache.get(key)
+            if found:
+                products[key] = product
+            else:
+                missing.append(key)
+        if missing:
+            found_products = self.lookup_products(missing)
+            for key in missing:
+                product = found_products.get(key)
+                self.product_cache.put(key, product)
+                products[key] = product
+        # Copie, così chi modifica i dizionari non altera la cache
+        return {key: dict(product) if product else None for key, product in products.items()}
+
+    def lookup_products(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """Prodotti di molte coppie (produttore, referenza) con un solo join.
+
+        Restituisce {(produttore, referenza): prodotto} per le chiavi trovate;
+        non usa la cache dei prodotti.
+        """
+        conn = self.connection()
+        with conn:
+            conn.execute(CREATE_PRODUCT_KEYS_SQL)
+            conn.execute('DELETE FROM product_keys')
+            conn.executemany('INSERT OR IGNORE INTO product_keys (manufacturer, reference) VALUES (?, ?)',
+                             keys)
+            rows = conn.execute(JOIN_PRODUCT_KEYS_SQL).fetchall()
+            conn.execute('DELETE FROM product_keys')
+        products = {}
+        for row in rows:
+            product = self._row_to_product(row)
+            products[(product['manufacturer'], product['reference'])] = product
+        return products
+
+    def search_products(self, text: str, manufacturer: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """Referenze e designazioni che corrispondono al testo, le più pertinenti prima"""
+        return self.catalog_search.search(text, manufacturer, limit)
+
+    def update_product(self, reference: str, manufacturer: str, valid_from=None, **fields) -> bool:
+        """Aggiorna i campi di un prodotto (es. price, prix_2s, prix_3s).
+
+        Un cambio di prezzo è registrato nello storico da valid_from (default: oggi).
+        """
+        unknown = set(fields) - set(PRODUCT_COLUMNS[1:-1])
+        if unknown:
+            raise ValueError(f"Campi prodotto non validi: {', '.join(sorted(unknown))}")
+        if not fields:
+            return False
+        
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                f'UPDATE products SET {assignments} WHERE reference = ? AND manufacturer = ?',
+                (*fields.values(), reference, manufacturer)
+            )
+            if cursor.rowcount and set(fields) & set(PRICE_HISTORY_FIELDS):
+                prices = conn.execute(
+                    'SELECT price, prix_2s, prix_3s FROM products WHERE reference = ? AND manufacturer = ?',
+                    (reference, manufacturer)
+                ).fetchone()
+                valid_from = price_date(valid_from)
+                conn.execute(RECORD_PRICE_SQL, (manufacturer, reference, valid_from, *prices))
+                conn.execute(RESTORE_CURRENT_PRICE_SQL, {'reference': reference, 'manufacturer': manufacturer,
+                                                         'valid_from': valid_from, 'today': price_date()})
+        self.product_cache.invalidate((manufacturer, reference))
+        return cursor.rowcount > 0
 
     def get_products_by_manufacturer(self, manufacturer: str) -> List[Dict]:
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            SELECT * FROM products
-            WHERE manufacturer = ?
-            ORDER BY reference
-            ''', (manufacturer,))
-            
-            products = []
-            for row in cursor.fetchall():
-                products.append({
-                    'reference': row[0],
-                    'designation': row[1],
-                    'price': row[2],
-                    'time': row[3],
-                    'num_modules': row[4],
-                    'num_bornes': row[5],
-                    'bornes_mm': row[6],
-                    'tot_bornes_mm': row[7],
-                    'prix_2s': row[8],
-                    'prix_3s': row[9],
-                    'manufacturer': row[10]
-                })
-            return products
+        cursor = self.connection().execute(GET_PRODUCTS_BY_MANUFACTURER_SQL, (manufacturer,))
+        return [self._row_to_product(row) for row in cursor]
 
     def get_references_by_manufacturer(self, manufacturer: str) -> List[Tuple[str, str]]:
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            SELECT reference, designation
-            FROM products
-            WHERE manufacturer = ?
-            ORDER BY reference
-            ''', (manufacturer,))
-            return cursor.fetchall()
\ No newline at end of file
+        return self.connection().execute(
+            GET_REFERENCES_BY_MANUFACTURER_SQL, (manufacturer,)
+        ).fetchall()
@@ -0,0 +1,109 @@
+import csv
+import io
+from typing import Dict, List, Optional
+
+# Campi copiati dal catalogo quando si inserisce una referenza
+PRODUCT_FIELDS = (
+    'designation', 'price', 'time', 'num_modules', 'num_bornes',
+    'bornes_mm', 'tot_bornes_mm', 'prix_2s', 'prix_3s'
+)
+
+# Campi modificabili, nell'ordine delle colonne della tabella
+EDITABLE_FIELDS = ('quantity', 'reference')
+
+class MaterialRow:
+    """Riga materiale tipizzata: quantità, referenza e dati del prodotto.
+
+    Usa __slots__ per restare compatta: un quadro può avere migliaia di righe.
+    """
+    __slots__ = ('quantity', 'reference') + PRODUCT_FIELDS
+
+    def __init__(self, quantity: Optional[float] = None, reference: str = '', **fields):
+        self.quantity = quantity
+        self.reference = reference
+        for name in PRODUCT_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    def __repr__(self):
+        return f"MaterialRow({self.quantity!r}, {self.reference!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, MaterialRow):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.quantity is None and not self.reference
+
+    @property
+    def has_product(self) -> bool:
+        """Vero se la riga contiene dati del catalogo"""
+        return any(getattr(self, name) is not None for name in PRODUCT_FIELDS)
+
+    @property
+    def total_price(self) -> Optional[float]:
+        if self.quantity is None or self.price is None:
+            return None
+        return self.price * self.quantity
+
+    @property
+    def total_time(self) -> Optional[int]:
+        if self.quantity is None or self.time is None:
+            return None
+        return int(self.time * self.quantity)
+
+    def apply_product(self, product: Optional[Dict]):
+        """Copia i dati del prodotto del catalogo (o li svuota se non trovato)"""
+        for name in PRODUCT_FIELDS:
+            setattr(self, name, product.get(name) if product else None)
+
+    def copy(self) -> 'MaterialRow':
+        row = MaterialRow.__new__(MaterialRow)
+        for name in self.__slots__:
+            setattr(row, name, getattr(self, name))
+        return row
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MaterialRow':
+        return cls(
+            quantity=data.get('quantity'),
+            reference=data.get('reference') or '',
+            **{name: data.get(name) for name in PRODUCT_FIELDS}
+        )
+
+def parse_quantity(value) -> Optional[float]:
+    """Converte il testo della cella quantità (accetta la virgola decimale)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace(',', '.')
+    if not text:
+        return None
+    return float(text)
+
+def parse_pasted_rows(text: str, first_column: int = 0) -> List[Dict]:
+    """Celle copiate da Excel (righe di testo separate da tabulazioni) come modifiche.
+
+    first_column è la colonna della tabella da cui si incolla (0 quantità,
+    1 referenza); le colonne oltre quelle modificabili sono ignorate. Ogni
+    riga diventa un dizionario con 'quantity' e/o 'reference' (vuoto per una
+    riga vuota); le quantità non numeriche sono ignorate come nella cella.
+    """
+    changes = []
+    for cells in csv.reader(io.StringIO(text.rstrip('\r\n')), delimiter='\t'):
+        change = {}
+        for field, value in zip(EDITABLE_FIELDS[first_column:], cells):
+            if field == 'quantity':
+                try:
+                    change['quantity'] = parse_quantity(value)
+                except ValueError:
+                    continue
+            else:
+                change['reference'] = value.strip()
+        changes.append(change)
+    return changes
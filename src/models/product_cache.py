@@ -0,0 +1,65 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+class ProductCache:
+    """Cache LRU con scadenza opzionale per le ricerche prodotto.
+
+    Memorizza anche i riferimenti non trovati (valore None), così una
+    referenza sconosciuta non ritorna sul disco a ogni modifica della cella.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional[Dict]]:
+        """Restituisce (trovato, valore); il valore può essere None se memorizzato come assente"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Optional[Dict]):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
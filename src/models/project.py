@@ -1,16 +1,56 @@
 from dataclasses import dataclass, field
-from typing import List, Dict
-import json
+from typing import Callable, List, Dict, Optional
+import copy
+import logging
+import os
+import stat
+import tempfile
+import uuid
 from datetime import datetime
 
+from ..config import APP_CONFIG
+from . import project_format
+from .project_journal import ProjectJournal
+
+def copy_target_mode(tmp_path: str, filename: str):
+    """Dà al file temporaneo i permessi del file che andrà a sostituire.
+
+    mkstemp crea il file con permessi 0600; per un file nuovo si usano quelli
+    predefiniti di open() (0666 meno la umask).
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(tmp_path, mode)
+
 @dataclass
 class TableauElectrique:
     name: str
     materials_data: Dict = field(default_factory=dict)
     labor_data: List = field(default_factory=list)
     summary_data: Dict = field(default_factory=dict)
+    # Se impostato, i dati sono ancora nel file e vengono letti da load()
+    loader: Optional[Callable[[], Dict]] = field(default=None, repr=False, compare=False)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loader is None
+
+    def load(self):
+        """Legge dal file i dati del quadro, se non sono ancora stati caricati"""
+        if self.loader is None:
+            return
+        data = self.loader()
+        self.loader = None
+        self.materials_data = data.get('materials_data', {})
+        self.labor_data = data.get('labor_data', [])
+        self.summary_data = data.get('summary_data', {})
     
     def to_dict(self):
+        self.load()
         return {
             'name': self.name,
             'materials_data': self.materials_data,
@@ -34,6 +74,17 @@ class Project:
     volta_number: str
     creation_date: str = field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d"))
     tableaux: Dict[str, TableauElectrique] = field(default_factory=dict)
+    # Contatori delle modifiche: il progetto è da salvare se revision > saved_revision
+    revision: int = field(default=0, repr=False, compare=False)
+    saved_revision: int = field(default=0, repr=False, compare=False)
+    # Giornale delle modifiche: identificativo dell'ultimo salvataggio completo,
+    # modifiche non ancora scritte e numero di modifiche già nel giornale
+    journal_id: str = field(default='', repr=False, compare=False)
+    changes: List = field(default_factory=list, repr=False, compare=False)
+    journal_length: int = field(default=0, repr=False, compare=False)
+    needs_snapshot: bool = field(default=False, repr=False, compare=False)
+    # Percorso del file da cui il progetto è stato caricato o in cui è stato salvato
+    filename: str = field(default='', repr=False, compare=False)
     
     def add_tableau(self, name: str) -> TableauElectrique:
         """Aggiunge un nuovo quadro al progetto"""
@@ -41,36 +92,219 @@ class Project:
             raise ValueError(f"Quadro '{name}' già esistente in questo progetto")
         tableau = TableauElectrique(name=name)
         self.tableaux[name] = tableau
+        self.record_change({'op': 'add_tableau', 'tableau': name})
+        self.mark_dirty()
         return tableau
     
     def remove_tableau(self, name: str):
         """Rimuove un quadro dal progetto"""
         if name in self.tableaux:
             del self.tableaux[name]
-    
-    def save_to_file(self, filename: str):
-        """Salva il progetto su file"""
-        data = {
+            self.record_change({'op': 'remove_tableau', 'tableau': name})
+            self.mark_dirty()
+
+    def record_change(self, entry: Dict):
+        """Registra una modifica da scrivere nel giornale al prossimo salvataggio"""
+        self.changes.append(entry)
+
+    def record_row(self, tableau: str, manufacturer: str, row: int, data: Optional[Dict]):
+        self.record_change({'op': 'row', 'tableau': tableau, 'manufacturer': manufacturer,
+                            'row': row, 'data': data})
+
+    def record_rows(self, tableau: str, manufacturer: str, rows: List):
+        """Come record_row per un blocco di coppie (riga, dati)"""
+        for row, data in rows:
+            self.record_row(tableau, manufacturer, row, data)
+
+    def record_settings(self, tableau: str, labor_data: List, summary_data: Dict):
+        self.record_change({'op': 'settings', 'tableau': tableau,
+                            'labor_data': labor_data, 'summary_data': summary_data})
+
+    def apply_changes(self, entries: List[Dict]):
+        """Riapplica le modifiche del giornale ai dati dei quadri"""
+        positions = {}
+        for entry in entries:
+            op = entry.get('op')
+            name = entry.get('tableau')
+            if op == 'add_tableau':
+                self.tableaux.setdefault(name, TableauElectrique(name=name))
+                continue
+            if op == 'remove_tableau':
+                self.tableaux.pop(name, None)
+                positions = {key: value for key, value in positions.items() if key[0] != name}
+                continue
+            tableau = self.tableaux.get(name)
+            if tableau is None:
+                continue
+            tableau.load()
+            if op == 'settings':
+                tableau.labor_data = entry['labor_data']
+                tableau.summary_data = dict(tableau.summary_data, **entry['summary_data'])
+            elif op == 'row':
+                rows = tableau.materials_data.setdefault(entry['manufacturer'], [])
+                key = (name, entry['manufacturer'])
+                if key not in positions:
+                    positions[key] = {row.get('row'): i for i, row in enumerate(rows)}
+                index = positions[key]
+                position = index.get(entry['row'])
+                if position is None and entry['data'] is not None:
+                    index[entry['row']] = len(rows)
+                    rows.append(dict(entry['data'], row=entry['row']))
+                elif position is not None and entry['data'] is not None:
+                    rows[position] = dict(entry['data'], row=entry['row'])
+                elif position is not None:
+                    # Riga svuotata: la si lascia vuota per non spostare le posizioni
+                    rows[position] = None
+        for name, manufacturer in positions:
+            tableau = self.tableaux.get(name)
+            if tableau is None:
+                continue
+            rows = [row for row in tableau.materials_data.get(manufacturer, []) if row is not None]
+            if rows:
+                tableau.materials_data[manufacturer] = rows
+            else:
+                tableau.materials_data.pop(manufacturer, None)
+
+    def mark_dirty(self):
+        self.revision += 1
+
+    def mark_saved(self, revision: int = None):
+        """Registra il salvataggio della revisione indicata (di default quella corrente)"""
+        revision = self.revision if revision is None else revision
+        self.saved_revision = max(self.saved_revision, revision)
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.revision > self.saved_revision
+
+    def to_dict(self) -> Dict:
+        return {
             'name': self.name,
             'client_name': self.client_name,
             'volta_number': self.volta_number,
             'creation_date': self.creation_date,
+            'journal_id': self.journal_id,
             'tableaux': {name: tableau.to_dict() for name, tableau in self.tableaux.items()}
         }
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+
+    def snapshot(self) -> Dict:
+        """Copia indipendente dei dati, serializzabile da un altro thread"""
+        return copy.deepcopy(self.to_dict())
+
+    def begin_snapshot(self) -> Dict:
+        """Dati per un salvataggio completo, che fa ripartire il giornale"""
+        self.journal_id = uuid.uuid4().hex
+        self.journal_length = 0
+        self.needs_snapshot = False
+        self.changes = []
+        return self.snapshot()
+
+    def journal_ready(self, filename: str) -> bool:
+        """Vero se le modifiche possono essere aggiunte al giornale invece di riscrivere tutto"""
+        if (not self.journal_id or self.needs_snapshot or not os.path.exists(filename)
+                or self.journal_length + len(self.changes) > APP_CONFIG['journal_compact_threshold']):
+            return False
+        # Il giornale vale solo per il file dell'ultimo salvataggio completo:
+        # un altro file con lo stesso nome ignorerebbe queste modifiche
+        try:
+            return project_format.read_project_header(filename).get('journal_id') == self.journal_id
+        except Exception as e:
+            logging.error(f"Errore nella lettura dell'intestazione di {filename}: {str(e)}")
+            return False
+
+    def take_changes(self) -> List[Dict]:
+        changes, self.changes = self.changes, []
+        self.journal_length += len(changes)
+        return changes
+
+    @staticmethod
+    def write_snapshot(data: Dict, filename: str, file_format: str = None):
+        """Scrive i dati in modo atomico: file temporaneo e poi os.replace.
+
+        Un'interruzione durante la scrittura lascia intatto il file precedente.
+        Il formato ('json' o 'binary') è di default quello di APP_CONFIG.
+        Il giornale delle modifiche precedenti viene poi eliminato.
+        """
+        raw = project_format.dumps(data, file_format or APP_CONFIG['project_file_format'])
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, tmp_path = tempfile.mkstemp(prefix='.volta-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+            copy_target_mode(tmp_path, filename)
+            os.replace(tmp_path, filename)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        ProjectJournal(filename).discard()
+
+    @staticmethod
+    def write_journal(entries: List[Dict], filename: str, snapshot_id: str):
+        ProjectJournal(filename).append(snapshot_id, entries)
+    
+    def save_to_file(self, filename: str, file_format: str = None):
+        """Salva il progetto su file (salvataggio completo)"""
+        revision = self.revision
+        self.write_snapshot(self.begin_snapshot(), filename, file_format)
+        self.mark_saved(revision)
+        self.filename = os.path.abspath(filename)
+
+    def save_changes(self, filename: str):
+        """Aggiunge al giornale le sole modifiche, o salva tutto se non è possibile"""
+        if not self.journal_ready(filename):
+            self.save_to_file(filename)
+            return
+        revision = self.revision
+        self.write_journal(self.take_changes(), filename, self.journal_id)
+        self.mark_saved(revision)
     
     @classmethod
-    def load_from_file(cls, filename: str):
-        """Carica il progetto da file"""
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    def from_dict(cls, data: Dict) -> 'Project':
+        """Progetto costruito dai dati di to_dict() (ad es. una copia da esportare)"""
         project = cls(
             name=data['name'],
             client_name=data['client_name'],
             volta_number=data['volta_number'],
-            creation_date=data.get('creation_date', datetime.now().strftime("%Y-%m-%d"))
+            creation_date=data.get('creation_date', datetime.now().strftime("%Y-%m-%d")),
+            journal_id=data.get('journal_id', '')
         )
-        for name, tableau_data in data['tableaux'].items():
+        for name, tableau_data in data.get('tableaux', {}).items():
             project.tableaux[name] = TableauElectrique.from_dict(tableau_data)
         return project
+
+    @classmethod
+    def load_from_file(cls, filename: str, lazy: bool = False):
+        """Carica il progetto da file.
+
+        Con lazy=True si legge solo l'intestazione e l'elenco dei quadri; i
+        dati di ogni quadro sono letti alla prima chiamata di load().
+        """
+        reader = project_format.open_project(filename)
+        header = reader.header
+        project = cls(
+            name=header['name'],
+            client_name=header['client_name'],
+            volta_number=header['volta_number'],
+            creation_date=header.get('creation_date', datetime.now().strftime("%Y-%m-%d"))
+        )
+        for name in reader.tableau_names():
+            if lazy:
+                loader = lambda name=name: reader.read_tableau(name)
+                project.tableaux[name] = TableauElectrique(name=name, loader=loader)
+            else:
+                project.tableaux[name] = TableauElectrique.from_dict(reader.read_tableau(name))
+
+        # Modifiche salvate nel giornale dopo l'ultimo salvataggio completo
+        project.filename = os.path.abspath(filename)
+        project.journal_id = header.get('journal_id', '')
+        entries = ProjectJournal(filename).read(project.journal_id)
+        if entries:
+            project.apply_changes(entries)
+            logging.info(f"Recuperate {len(entries)} modifiche dal giornale di {filename}")
+            # Il prossimo salvataggio riscrive il progetto e azzera il giornale
+            project.needs_snapshot = True
+            project.mark_dirty()
+        return project
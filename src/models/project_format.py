@@ -0,0 +1,313 @@
+import codecs
+import json
+import struct
+import zlib
+from typing import Dict, List
+
+try:
+    import msgpack
+except ImportError:  # msgpack è opzionale: senza, il formato binario usa JSON compatto
+    msgpack = None
+
+# Formato binario: MAGIC, versione del formato, codifica del contenuto.
+# Le righe materiali sono salvate per colonne (una lista di valori per campo)
+# invece che come dizionari.
+#
+# Versione 2 (contenitore indicizzato): dopo l'intestazione fissa c'è la
+# lunghezza dell'indice, l'indice compresso (dati del progetto e, per ogni
+# quadro, [nome, offset, lunghezza]) e poi i quadri compressi uno per uno,
+# così l'intestazione si legge subito e ogni quadro si decodifica da solo.
+# Versione 1: tutto il progetto in un unico blocco compresso (solo lettura).
+MAGIC = b'VOLTA'
+FORMAT_VERSION = 2
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+HEADER = struct.Struct('<5sBB')
+INDEX_LENGTH = struct.Struct('<I')
+
+FILE_FORMATS = ('json', 'binary')
+
+# Chiavi dell'intestazione, scritte da Project.to_dict prima di 'tableaux'
+HEADER_KEYS = ('name', 'client_name', 'volta_number', 'creation_date', 'journal_id')
+
+def to_columns(rows: List[Dict]):
+    """Righe con le stesse chiavi -> {'columns': [...], 'values': [[...], ...]}"""
+    if not rows:
+        return rows
+    columns = list(rows[0])
+    if any(len(row) != len(columns) or list(row) != columns for row in rows):
+        return rows
+    return {
+        'columns': columns,
+        'values': [[row[name] for row in rows] for name in columns]
+    }
+
+def from_columns(table) -> List[Dict]:
+    if not isinstance(table, dict):
+        return table
+    return [dict(zip(table['columns'], values)) for values in zip(*table['values'])]
+
+def _map_tableau(tableau: Dict, convert) -> Dict:
+    materials = {manufacturer: convert(rows)
+                 for manufacturer, rows in tableau.get('materials_data', {}).items()}
+    return dict(tableau, materials_data=materials)
+
+def _pack(payload, codec: int) -> bytes:
+    if codec == CODEC_MSGPACK:
+        body = msgpack.packb(payload, use_bin_type=True)
+    else:
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return zlib.compress(body, 1)
+
+def _unpack(raw: bytes, codec: int):
+    body = zlib.decompress(raw)
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Il file progetto richiede il modulo msgpack")
+        return msgpack.unpackb(body, raw=False)
+    if codec == CODEC_JSON:
+        return json.loads(body.decode('utf-8'))
+    raise ValueError(f"Codifica del file progetto sconosciuta: {codec}")
+
+def is_binary(raw: bytes) -> bool:
+    return raw[:len(MAGIC)] == MAGIC
+
+def encode_binary(data: Dict) -> bytes:
+    codec = CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+    blobs = []
+    index = []
+    offset = 0
+    for name, tableau in data.get('tableaux', {}).items():
+        blob = _pack(_map_tableau(tableau, to_columns), codec)
+        index.append([name, offset, len(blob)])
+        blobs.append(blob)
+        offset += len(blob)
+    header = _pack(dict(data, tableaux=index), codec)
+    return b''.join([HEADER.pack(MAGIC, FORMAT_VERSION, codec),
+                     INDEX_LENGTH.pack(len(header)), header] + blobs)
+
+def decode_binary(raw: bytes) -> Dict:
+    magic, version, codec = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("File progetto binario non valido")
+    if version == 1:
+        payload = _unpack(raw[HEADER.size:], codec)
+        tableaux = payload.get('tableaux', {})
+    elif version == 2:
+        (length,) = INDEX_LENGTH.unpack_from(raw, HEADER.size)
+        start = HEADER.size + INDEX_LENGTH.size
+        payload = _unpack(raw[start:start + length], codec)
+        start += length
+        tableaux = {name: _unpack(raw[start + offset:start + offset + size], codec)
+                    for name, offset, size in payload['tableaux']}
+    else:
+        raise ValueError(f"Versione del file progetto non supportata: {version}")
+    tableaux = {name: _map_tableau(tableau, from_columns) for name, tableau in tableaux.items()}
+    return dict(payload, tableaux=tableaux)
+
+def dumps(data: Dict, file_format: str = 'json') -> bytes:
+    """Serializza il progetto nel formato richiesto ('json' o 'binary')"""
+    if file_format == 'binary':
+        return encode_binary(data)
+    if file_format == 'json':
+        return json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+    raise ValueError(f"Formato file progetto sconosciuto: {file_format}")
+
+def loads(raw: bytes) -> Dict:
+    """Legge un progetto JSON o binario, riconosciuto dall'intestazione"""
+    if is_binary(raw):
+        return decode_binary(raw)
+    return json.loads(raw.decode('utf-8'))
+
+class BinaryProjectReader:
+    """Legge l'indice di un file binario; i quadri si decodificano su richiesta"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            magic, version, self.codec = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError("File progetto binario non valido")
+            if version == 1:
+                # Nessun indice: il file va letto tutto
+                f.seek(0)
+                data = decode_binary(f.read())
+                self._tableaux = data.pop('tableaux')
+                self.header = data
+                return
+            if version != 2:
+                raise ValueError(f"Versione del file progetto non supportata: {version}")
+            (length,) = INDEX_LENGTH.unpack(f.read(INDEX_LENGTH.size))
+            payload = _unpack(f.read(length), self.codec)
+        self._data_start = HEADER.size + INDEX_LENGTH.size + length
+        self._index = {name: (offset, size) for name, offset, size in payload.pop('tableaux')}
+        self._tableaux = None
+        self.header = payload
+
+    def tableau_names(self) -> List[str]:
+        return list(self._tableaux if self._tableaux is not None else self._index)
+
+    def read_tableau(self, name: str) -> Dict:
+        if self._tableaux is not None:
+            return self._tableaux[name]
+        offset, size = self._index[name]
+        with open(self.filename, 'rb') as f:
+            f.seek(self._data_start + offset)
+            tableau = _unpack(f.read(size), self.codec)
+        return _map_tableau(tableau, from_columns)
+
+class JsonProjectReader:
+    """Lettura incrementale di un file progetto JSON.
+
+    L'intestazione (le chiavi prima di 'tableaux') si legge subito; se manca
+    una delle HEADER_KEYS (file scritto con un altro ordine delle chiavi) si
+    analizza subito tutto il file, per trovarla anche dopo i quadri. I quadri
+    sono analizzati uno alla volta alla prima richiesta, ricordando per
+    ognuno la posizione in byte nel file e scartando i dati: la memoria
+    usata è quella del quadro più grande, non dell'intero progetto.
+    """
+
+    CHUNK_SIZE = 1 << 22
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.header = {}
+        self._decoder = json.JSONDecoder()
+        self._index = None
+        self._tableaux_offset = None
+        with open(filename, 'rb') as f:
+            bom = f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8
+            self._start(f, len(codecs.BOM_UTF8) if bom else 0)
+            self._expect('{')
+            self._read_members(stop_at_tableaux=True)
+        if any(key not in self.header for key in HEADER_KEYS):
+            self._ensure_index()
+
+    # --- Scansione ---
+
+    def _start(self, f, offset: int):
+        f.seek(offset)
+        self._file = f
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._base = offset  # offset in byte di self._buf[0]
+        self._eof = False
+
+    def _fill(self, size: int = 0) -> bool:
+        if self._eof:
+            return False
+        chunk = self._file.read(max(size, self.CHUNK_SIZE))
+        self._eof = not chunk
+        self._buf += self._text.decode(chunk, final=self._eof)
+        return not self._eof
+
+    def _compact(self):
+        """Scarta il testo già letto, aggiornando l'offset in byte"""
+        self._base += len(self._buf[:self._pos].encode('utf-8'))
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            self._compact()
+            if not self._fill():
+                raise ValueError("File progetto JSON incompleto")
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"File progetto JSON non valido: atteso '{char}'")
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        self._compact()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # Un numero alla fine del buffer potrebbe continuare nel blocco successivo
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Blocchi crescenti: ogni valore viene rianalizzato poche volte
+            self._fill(len(self._buf))
+
+    def _read_members(self, stop_at_tableaux: bool):
+        while self._peek() != '}':
+            key = self._value()
+            self._expect(':')
+            if key == 'tableaux':
+                self._peek()
+                self._compact()
+                self._tableaux_offset = self._base
+                if stop_at_tableaux:
+                    return
+                self._scan_tableaux()
+            else:
+                self.header[key] = self._value()
+            if self._peek() == ',':
+                self._pos += 1
+
+    def _scan_tableaux(self):
+        self._index = {}
+        self._expect('{')
+        while self._peek() != '}':
+            name = self._value()
+            self._expect(':')
+            self._peek()
+            self._compact()
+            start = self._base
+            self._value()
+            self._compact()
+            self._index[name] = (start, self._base - start)
+            if self._peek() == ',':
+                self._pos += 1
+        self._pos += 1
+
+    def _ensure_index(self):
+        if self._index is not None:
+            return
+        if self._tableaux_offset is None:
+            self._index = {}
+            return
+        with open(self.filename, 'rb') as f:
+            self._start(f, self._tableaux_offset)
+            self._scan_tableaux()
+            if self._peek() == ',':
+                self._pos += 1
+                self._read_members(stop_at_tableaux=False)
+        self._buf = ''
+
+    # --- Accesso ---
+
+    def tableau_names(self) -> List[str]:
+        self._ensure_index()
+        return list(self._index)
+
+    def read_tableau(self, name: str) -> Dict:
+        self._ensure_index()
+        offset, size = self._index[name]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(size).decode('utf-8'))
+
+def open_project(filename: str):
+    """Reader del file progetto: intestazione subito, quadri su richiesta"""
+    with open(filename, 'rb') as f:
+        binary = is_binary(f.read(len(MAGIC)))
+    return BinaryProjectReader(filename) if binary else JsonProjectReader(filename)
+
+def read_project_header(filename: str) -> Dict:
+    """Dati del progetto senza i quadri; 'tableaux' solo se noto senza analizzarli"""
+    reader = open_project(filename)
+    header = dict(reader.header)
+    if isinstance(reader, BinaryProjectReader):
+        header['tableaux'] = reader.tableau_names()
+    return header
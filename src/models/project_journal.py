@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+from typing import Dict, List
+
+JOURNAL_SUFFIX = '.journal'
+
+def journal_path(filename: str) -> str:
+    return filename + JOURNAL_SUFFIX
+
+class ProjectJournal:
+    """Giornale delle modifiche accanto al file .volta (una riga JSON per modifica).
+
+    La prima riga indica l'identificativo del salvataggio completo a cui le
+    modifiche si applicano: un giornale di un altro salvataggio viene ignorato.
+    Le modifiche sono idempotenti (impostano lo stato di una riga o di un
+    quadro), quindi rileggerle più volte dà lo stesso risultato.
+    """
+
+    def __init__(self, filename: str):
+        self.path = journal_path(filename)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def append(self, snapshot_id: str, entries: List[Dict]) -> int:
+        """Aggiunge le modifiche in fondo al giornale: costo proporzionale alle modifiche"""
+        lines = []
+        if not self.exists():
+            lines.append(json.dumps({'op': 'start', 'snapshot': snapshot_id}))
+        lines.extend(json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+                     for entry in entries)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return len(entries)
+
+    def read(self, snapshot_id: str) -> List[Dict]:
+        """Modifiche registrate dopo il salvataggio snapshot_id"""
+        if not self.exists():
+            return []
+        entries = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Ultima riga troncata da un'interruzione durante la scrittura
+                    logging.warning(f"Riga del giornale non valida ignorata: {self.path}")
+                    break
+        if not entries or entries[0].get('op') != 'start' or entries[0].get('snapshot') != snapshot_id:
+            logging.warning(f"Giornale non corrispondente al file progetto ignorato: {self.path}")
+            return []
+        return entries[1:]
+
+    def discard(self):
+        if self.exists():
+            os.remove(self.path)
@@ -1,8 +1,12 @@
 
+import glob
+import logging
+import os
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QPushButton, 
-                           QLabel, QFileDialog)
+                           QLabel, QFileDialog, QListWidget, QListWidgetItem)
 from PyQt6.QtCore import Qt
-from ...config import COLORS
+from ...config import APP_CONFIG, COLORS
+from ...models.project_format import read_project_header
 from .new_project import NewProjectDialog
 
 class StartupDialog(QDialog):
@@ -69,6 +73,14 @@ class StartupDialog(QDialog):
         open_project_btn.clicked.connect(self.open_existing_project)
         layout.addWidget(open_project_btn, alignment=Qt.AlignmentFlag.AlignCenter)
         
+        # Progetti nella cartella corrente (legge solo le intestazioni)
+        self.recent_list = QListWidget()
+        self.recent_list.itemDoubleClicked.connect(self.open_recent_project)
+        self.load_recent_projects()
+        if self.recent_list.count():
+            layout.addWidget(QLabel("Progetti recenti (doppio clic per aprire):"))
+            layout.addWidget(self.recent_list)
+        
         # Versione e copyright
         version_label = QLabel("Versione 1.0.0")
         version_label.setStyleSheet("color: gray; margin-top: 20px;")
@@ -84,6 +96,29 @@ class StartupDialog(QDialog):
             }}
         """)
 
+    def load_recent_projects(self, directory='.'):
+        pattern = os.path.join(directory, f"*{APP_CONFIG['project_file_extension']}")
+        files = sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)
+        for file_name in files:
+            try:
+                header = read_project_header(file_name)
+            except Exception as e:
+                logging.error(f"Errore nella lettura del progetto {file_name}: {str(e)}")
+                continue
+            text = (f"{header.get('name', '')} - {header.get('client_name', '')} "
+                    f"(Volta {header.get('volta_number', '')}, {header.get('creation_date', '')})")
+            if 'tableaux' in header:
+                text += f" - {len(header['tableaux'])} quadri"
+            item = QListWidgetItem(text)
+            item.setData(Qt.ItemDataRole.UserRole, file_name)
+            item.setToolTip(os.path.abspath(file_name))
+            self.recent_list.addItem(item)
+
+    def open_recent_project(self, item):
+        self.project_data = item.data(Qt.ItemDataRole.UserRole)
+        self.action = "open"
+        self.accept()
+
     def create_new_project(self):
         dialog = NewProjectDialog(self)
         if dialog.exec():
@@ -1,24 +1,38 @@
 import logging
+import os
 import sys
+from collections import OrderedDict
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                           QPushButton, QLabel, QTabWidget, QMessageBox,
-                          QFileDialog)
-from PyQt6.QtCore import Qt, QTimer
+                          QFileDialog, QProgressDialog)
+from PyQt6.QtCore import Qt, QTimer, QThreadPool
 from PyQt6.QtGui import QColor
 
-from ..config import APP_CONFIG, MANUFACTURERS, TAB_COLORS, UI_CONFIG, COLORS
+from ..config import APP_CONFIG, MANUFACTURERS, TAB_COLORS, UI_CONFIG, COLORS, LaborType
 from .dialogs import NewProjectDialog, StartupDialog
 from .widgets import MaterialsTab, LaborWidget, SummaryWidget
 from ..models import Project, TableauElectrique, Database
 from ..utils.error_handler import ErrorHandler
+from ..utils.export import ExcelExporter
+from ..utils.calculations import TotalCalculations, MaterialTotalsAggregator
 from .dialogs.new_tableau import NewTableauDialog
+from .recalc_scheduler import RecalcScheduler
+from .workers import Worker
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         try:
             self.db = Database()
+            self.recalc_scheduler = RecalcScheduler(self.update_totals, self)
             self.project = None
+            self.autosave_worker = None
+            self.export_worker = None
+            # Pool dedicato: attendere il salvataggio non deve attendere anche l'esportazione
+            self.autosave_pool = QThreadPool(self)
+            self.autosave_pool.setMaxThreadCount(1)
+            # Tab dei quadri con i widget costruiti, dal meno recente
+            self.live_tableaux = OrderedDict()
             
             self.setup_project()
             
@@ -53,7 +67,7 @@ class MainWindow(QMainWindow):
                         self.project.add_tableau(tableau_data['name'])
                 else:
                     try:
-                        self.project = Project.load_from_file(startup.project_data)
+                        self.project = Project.load_from_file(startup.project_data, lazy=True)
                     except Exception as e:
                         ErrorHandler.show_error(self, "Errore", 
                             "Errore durante il caricamento del progetto", e)
@@ -101,29 +115,79 @@ class MainWindow(QMainWindow):
         self.tableaux_tabs = QTabWidget()
         self.tableaux_tabs.setTabsClosable(True)
         self.tableaux_tabs.tabCloseRequested.connect(self.close_tableau)
+        self.tableaux_tabs.currentChanged.connect(self.on_tableau_activated)
         main_layout.addWidget(self.tableaux_tabs)
         
-        # Crea tab per ogni quadro
+        # Crea tab per ogni quadro (i widget sono costruiti alla prima apertura)
         for name, tableau in self.project.tableaux.items():
             self.add_tableau_tab(tableau)
 
     def add_tableau_tab(self, tableau: TableauElectrique):
+        """Aggiunge il tab del quadro con un segnaposto leggero"""
         try:
             tab = QWidget()
-            main_layout = QHBoxLayout(tab)
+            tab.tableau = tableau
+            tab.is_built = False
+            layout = QVBoxLayout(tab)
+            layout.setContentsMargins(0, 0, 0, 0)
+            tab.placeholder = QLabel(f"Caricamento del quadro {tableau.name}...")
+            tab.placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            layout.addWidget(tab.placeholder)
+
+            # Il primo tab aggiunto diventa corrente ed è costruito da on_tableau_activated
+            self.tableaux_tabs.addTab(tab, tableau.name)
+        except Exception as e:
+            logging.error(f"Errore nell'aggiunta del tab del quadro: {str(e)}")
+            QMessageBox.critical(self, "Errore", f"Errore nell'aggiunta del quadro: {str(e)}")
+
+    def on_tableau_activated(self, index):
+        tab = self.tableaux_tabs.widget(index)
+        if tab is None:
+            return
+        if not tab.is_built:
+            self.build_tableau_tab(tab)
+        self.live_tableaux[tab] = True
+        self.live_tableaux.move_to_end(tab)
+
+        # Oltre al quadro corrente restano costruiti solo i più recenti
+        while len(self.live_tableaux) > UI_CONFIG['live_inactive_tableaux'] + 1:
+            self.release_tableau_tab(next(iter(self.live_tableaux)))
+
+    def build_tableau_tab(self, tab):
+        """Costruisce i widget del quadro al posto del segnaposto"""
+        try:
+            content = QWidget()
+            main_layout = QHBoxLayout(content)
             
             # Tab per materiali (a sinistra)
             materials_tabs = QTabWidget()
             materials_widgets = []
             
+            # Totali materiali del quadro, aggiornati solo con la riga modificata
+            material_totals = MaterialTotalsAggregator(
+                records_provider=lambda: [record for widget in materials_widgets
+                                          for record in widget.model.records()],
+                verify_every=APP_CONFIG['totals_verify_every']
+            )
+            
             # Crea un tab per ogni produttore
             for manufacturer in MANUFACTURERS:
                 materials_tab = MaterialsTab(
-                    parent=tab,
+                    parent=content,
                     manufacturer=manufacturer,
                     database=self.db
                 )
-                materials_tab.dataChanged.connect(lambda: self.update_totals())
+                materials_tab.model.rowChanged.connect(material_totals.apply)
+                materials_tab.model.rowsChanged.connect(material_totals.apply_many)
+                materials_tab.model.rowEdited.connect(
+                    lambda row, data, manufacturer=manufacturer:
+                        self.project.record_row(tab.tableau.name, manufacturer, row, data))
+                materials_tab.model.rowsEdited.connect(
+                    lambda rows, manufacturer=manufacturer:
+                        self.project.record_rows(tab.tableau.name, manufacturer, rows))
+                materials_tab.dataChanged.connect(lambda: self.on_tableau_edited(tab))
+                materials_tab.contentChanged.connect(
+                    lambda manufacturer, has_content: self.update_tab_color(manufacturer, has_content, tab))
                 materials_widgets.append(materials_tab)
                 materials_tabs.addTab(materials_tab, manufacturer)
             
@@ -136,12 +200,12 @@ class MainWindow(QMainWindow):
             
             # Widget manodopera
             labor_widget = LaborWidget(parent=right_container)
-            labor_widget.dataChanged.connect(lambda: self.update_totals())
+            labor_widget.dataChanged.connect(lambda: self.on_settings_edited(tab))
             right_layout.addWidget(labor_widget)
             
             # Widget riepilogo
             summary_widget = SummaryWidget(parent=right_container)
-            summary_widget.marginChanged.connect(lambda: self.update_totals())
+            summary_widget.marginChanged.connect(lambda: self.on_settings_edited(tab))
             right_layout.addWidget(summary_widget)
             
             # Aggiungi spacer per spingere tutto verso l'alto
@@ -150,104 +214,127 @@ class MainWindow(QMainWindow):
             main_layout.addWidget(right_container, stretch=1)
             
             # Salva riferimenti ai widget nel tab
+            tab.content = content
             tab.materials_tabs = materials_tabs
             tab.materials_widgets = materials_widgets
+            tab.material_totals = material_totals
             tab.labor_widget = labor_widget
             tab.summary_widget = summary_widget
             
-            # Aggiungi tab
-            self.tableaux_tabs.addTab(tab, tableau.name)
+            # Sostituisci il segnaposto
+            tab.placeholder.hide()
+            tab.layout().addWidget(content)
+            tab.is_built = True
+            self.restore_tableau(tab)
             
         except Exception as e:
-            logging.error(f"Errore nell'aggiunta del tab del quadro: {str(e)}")
-            QMessageBox.critical(self, "Errore", f"Errore nell'aggiunta del quadro: {str(e)}")
+            logging.error(f"Errore nella costruzione del tab del quadro: {str(e)}")
+            QMessageBox.critical(self, "Errore", f"Errore nell'apertura del quadro: {str(e)}")
 
-    def update_totals(self):
+    def release_tableau_tab(self, tab):
+        """Salva lo stato nel TableauElectrique e torna al segnaposto"""
+        self.live_tableaux.pop(tab, None)
+        if not tab.is_built:
+            return
         try:
-            current_tab = self.tableaux_tabs.currentWidget()
-            if not current_tab:
-                return
+            self.capture_tableau(tab)
+        except Exception as e:
+            # Senza lo stato salvato i widget restano costruiti
+            logging.error(f"Errore nel salvataggio dello stato del quadro: {str(e)}")
+            self.live_tableaux[tab] = True
+            return
+        self.recalc_scheduler.cancel(tab)
+        tab.content.deleteLater()
+        for name in ('content', 'materials_tabs', 'materials_widgets', 'material_totals',
+                     'labor_widget', 'summary_widget'):
+            delattr(tab, name)
+        tab.is_built = False
+        tab.placeholder.show()
 
-            # Calcola totali materiali
-            material_total = 0
-            time_total = 0
-            modules_data = {
-                'knx_modules': 0,
-                'modules_05': 0,
-                'modules_1p2p': 0,
-                'modules_3p': 0,
-                'modules_4p': 0,
-                'total_modules': 0,
-                'total_bornes': 0,
-                'total_bornes_space': 0
-            }
-
-            # Raccolta dati da tutte le tabelle materiali
-            for materials_tab in current_tab.materials_widgets:
-                table = materials_tab.table
-                manufacturer = materials_tab.manufacturer
-
-                for row in range(table.rowCount()):
-                    try:
-                        qty_item = table.item(row, 0)
-                        price_total_item = table.item(row, 5)
-                        time_total_item = table.item(row, 6)
-                        modules_item = table.item(row, 7)
-                        bornes_item = table.item(row, 8)
-                        bornes_space_item = table.item(row, 10)
-
-                        if all([qty_item, price_total_item]) and qty_item.text():
-                            qty = float(qty_item.text().replace(",", "."))
-                            price_total = float(price_total_item.text().replace("'", ""))
-                            material_total += price_total
-
-                            if time_total_item and time_total_item.text():
-                                time_total += float(time_total_item.text())
-
-                            # Calcolo moduli
-                            if modules_item and modules_item.text():
-                                module_size = float(modules_item.text())
-                                if manufacturer == 'KNX':
-                                    modules_data['knx_modules'] += qty * module_size
-                                if module_size == 0.5:
-                                    modules_data['modules_05'] += qty
-                                elif module_size in [1, 2]:
-                                    modules_data['modules_1p2p'] += qty
-                                elif module_size == 3:
-                                    modules_data['modules_3p'] += qty
-                                elif module_size >= 4:
-                                    modules_data['modules_4p'] += qty
-                                modules_data['total_modules'] += qty * module_size
-
-                            # Calcolo bornes
-                            if bornes_item and bornes_item.text():
-                                modules_data['total_bornes'] += qty * float(bornes_item.text())
-                            if bornes_space_item and bornes_space_item.text():
-                                modules_data['total_bornes_space'] += qty * float(bornes_space_item.text())
-
-                    except ValueError:
-                        continue
-                    except Exception as e:
-                        logging.error(f"Errore nel calcolo della riga {row}: {str(e)}")
+    def on_tableau_edited(self, tab):
+        """Segna il progetto come modificato e richiede il ricalcolo dei totali"""
+        if self.project:
+            self.project.mark_dirty()
+        self.recalc_scheduler.request(tab)
+
+    def on_settings_edited(self, tab):
+        """Manodopera o margine modificati: registra lo stato nel giornale"""
+        self.project.record_settings(tab.tableau.name, tab.labor_widget.get_labor_rows(), {
+            'labor_type': tab.labor_widget.current_labor_type.value,
+            'margin': tab.summary_widget.get_margin()
+        })
+        self.on_tableau_edited(tab)
 
-            # Calcolo rangées
-            if modules_data['total_modules'] > 0:
-                modules_data['rangees'] = modules_data['total_modules'] * 1.3 / 80
-                modules_data['rangees_24m'] = modules_data['total_modules'] * 1.3 / 24
+    def tableau_totals(self, tab):
+        # Totali materiali mantenuti dall'aggregatore incrementale: O(1) per modifica
+        labor_widget = tab.labor_widget
+        return TotalCalculations.combine_tableau_totals(
+            tab.material_totals.totals(),
+            labor_widget.get_labor_rows(),
+            labor_widget.current_labor_type,
+            tab.summary_widget.get_margin()
+        )
 
-            # Ottieni il costo della manodopera
-            labor_total = current_tab.labor_widget.get_total_cost()
+    def update_totals(self, tab=None):
+        try:
+            current_tab = tab or self.tableaux_tabs.currentWidget()
+            if not current_tab or not current_tab.is_built:
+                return
 
             # Aggiorna il riepilogo
-            current_tab.summary_widget.update_costs(material_total, time_total, labor_total)
-            current_tab.summary_widget.update_info(modules_data)
+            current_tab.summary_widget.show_totals(self.tableau_totals(current_tab))
             
         except Exception as e:
             logging.error(f"Errore nell'aggiornamento dei totali: {str(e)}")
 
+    def capture_tableau(self, tab):
+        """Copia lo stato dei widget del tab nel TableauElectrique"""
+        tableau = tab.tableau
+        materials_data = {}
+        for widget in tab.materials_widgets:
+            rows = widget.get_data()
+            if rows:
+                materials_data[widget.manufacturer] = rows
+        tableau.materials_data = materials_data
+        tableau.labor_data = tab.labor_widget.get_labor_rows()
+        tableau.summary_data = {
+            'labor_type': tab.labor_widget.current_labor_type.value,
+            'margin': tab.summary_widget.get_margin(),
+            'totals': self.tableau_totals(tab)
+        }
+
+    def restore_tableau(self, tab):
+        """Ripristina i widget dal TableauElectrique senza segnare modifiche"""
+        tableau = tab.tableau
+        tableau.load()
+        for widget in tab.materials_widgets:
+            widget.set_data(tableau.materials_data.get(widget.manufacturer, []))
+        tab.material_totals.reset()
+
+        summary_data = tableau.summary_data or {}
+        labor_type = next((t for t in LaborType if t.value == summary_data.get('labor_type')), None)
+        tab.labor_widget.set_labor_rows(tableau.labor_data or [], labor_type)
+        if 'margin' in summary_data:
+            tab.summary_widget.set_margin(summary_data['margin'], notify=False)
+        self.recalc_scheduler.request(tab)
+
+    def capture_state(self):
+        # I quadri non costruiti hanno già lo stato nel TableauElectrique
+        for tab in self.live_tableaux:
+            self.capture_tableau(tab)
+
+    def project_filename(self):
+        """File del progetto: quello caricato o salvato, altrimento <nome>.volta"""
+        if not self.project.filename:
+            self.project.filename = os.path.abspath(f"{self.project.name}.volta")
+        return self.project.filename
+
     def save_project(self, show_message=True):
         try:
-            filename = f"{self.project.name}.volta"
+            # Un salvataggio automatico in corso non deve sovrascrivere questo
+            self.wait_for_autosave()
+            filename = self.project_filename()
+            self.capture_state()
             self.project.save_to_file(filename)
             if show_message:
                 QMessageBox.information(self, "Salvataggio",
@@ -259,11 +346,46 @@ class MainWindow(QMainWindow):
             logging.error(f"Errore durante il salvataggio del progetto: {str(e)}")
 
     def auto_save(self):
+        """Salva in background solo se il progetto è stato modificato.
+
+        Di norma aggiunge al giornale solo le modifiche; il progetto viene
+        riscritto per intero quando il giornale supera la soglia configurata.
+        """
         try:
-            self.save_project(show_message=False)
+            if not self.project or not self.project.is_dirty or self.autosave_worker:
+                return
+            revision = self.project.revision
+            filename = self.project_filename()
+            if self.project.journal_ready(filename):
+                worker = Worker(Project.write_journal, self.project.take_changes(),
+                                filename, self.project.journal_id)
+            else:
+                self.capture_state()
+                worker = Worker(Project.write_snapshot, self.project.begin_snapshot(), filename)
+            worker.signals.finished.connect(lambda _: self.on_autosave_done(revision))
+            worker.signals.error.connect(self.on_autosave_error)
+            self.autosave_worker = worker
+            self.autosave_pool.start(worker)
         except Exception as e:
+            self.autosave_worker = None
             logging.error(f"Errore nel salvataggio automatico: {str(e)}")
 
+    def on_autosave_done(self, revision):
+        self.autosave_worker = None
+        # Le modifiche fatte durante il salvataggio restano da salvare
+        self.project.mark_saved(revision)
+        logging.info(f"Salvataggio automatico completato: {self.project_filename()}")
+
+    def on_autosave_error(self, message):
+        self.autosave_worker = None
+        # Le modifiche non scritte sono nei widget: il prossimo salvataggio sarà completo
+        self.project.needs_snapshot = True
+        logging.error(f"Errore nel salvataggio automatico: {message}")
+
+    def wait_for_autosave(self):
+        if self.autosave_worker:
+            self.autosave_pool.waitForDone()
+
     def closeEvent(self, event):
         try:
             reply = QMessageBox.question(
@@ -283,6 +405,14 @@ class MainWindow(QMainWindow):
         except Exception as e:
             logging.error(f"Errore durante la chiusura: {str(e)}")
             event.accept()
+        
+        if event.isAccepted():
+            self.autosave_pool.waitForDone()
+            # L'esportazione annullata si ferma al foglio successivo
+            if self.export_worker:
+                self.export_worker.cancel()
+            QThreadPool.globalInstance().waitForDone()
+            self.db.close()
 
     def add_new_tableau(self):
         try:
@@ -310,6 +440,9 @@ class MainWindow(QMainWindow):
                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
                 ) == QMessageBox.StandardButton.Yes:
                     name = self.tableaux_tabs.tabText(index)
+                    tab = self.tableaux_tabs.widget(index)
+                    self.recalc_scheduler.cancel(tab)
+                    self.live_tableaux.pop(tab, None)
                     self.project.remove_tableau(name)
                     self.tableaux_tabs.removeTab(index)
             else:
@@ -318,9 +451,9 @@ class MainWindow(QMainWindow):
         except Exception as e:
             logging.error(f"Errore durante la chiusura del quadro: {str(e)}")
 
-    def update_tab_color(self, manufacturer, has_content):
+    def update_tab_color(self, manufacturer, has_content, tab=None):
         try:
-            current_tab = self.tableaux_tabs.currentWidget()
+            current_tab = tab or self.tableaux_tabs.currentWidget()
             if hasattr(current_tab, 'materials_tabs'):
                 materials_tabs = current_tab.materials_tabs
                 for i in range(materials_tabs.count()):
@@ -356,10 +489,8 @@ class MainWindow(QMainWindow):
             )
             if filename:
                 try:
-                    # Qui puoi implementare la logica di esportazione
+                    # L'esito è mostrato al termine dell'esportazione in background
                     self.export_to_excel(filename)
-                    QMessageBox.information(self, "Export",
-                                        f"Preventivo esportato in {filename}")
                 except Exception as e:
                     QMessageBox.critical(self, "Errore",
                                     f"Errore durante l'esportazione: {str(e)}")
@@ -370,10 +501,49 @@ class MainWindow(QMainWindow):
                             "Errore nella selezione del file di esportazione")
 
     def export_to_excel(self, filename):
+        """Esporta in background una copia del progetto: si può continuare a lavorare"""
         try:
-            # Implementa qui la logica di esportazione in Excel
-            # Per ora è un placeholder
-            pass
+            if self.export_worker:
+                QMessageBox.warning(self, "Export", "Un'esportazione è già in corso")
+                return
+            self.capture_state()
+            exporter = ExcelExporter(Project.from_dict(self.project.snapshot()))
+
+            progress = QProgressDialog("Preparazione dell'esportazione...", "Annulla", 0, 0, self)
+            progress.setWindowTitle("Export")
+            progress.setWindowModality(Qt.WindowModality.NonModal)
+            progress.setMinimumDuration(0)
+
+            worker = Worker(exporter.write, filename, report_progress=True)
+            worker.signals.progress.connect(
+                lambda done, total, sheet: self.on_export_progress(progress, done, total, sheet))
+            worker.signals.finished.connect(
+                lambda completed: self.on_export_done(progress, filename, completed))
+            worker.signals.error.connect(lambda message: self.on_export_error(progress, message))
+            progress.canceled.connect(worker.cancel)
+
+            self.export_worker = worker
+            QThreadPool.globalInstance().start(worker)
+            progress.show()
         except Exception as e:
+            self.export_worker = None
             logging.error(f"Errore nell'esportazione in Excel: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def on_export_progress(self, progress, done, total, sheet):
+        progress.setMaximum(total)
+        progress.setValue(done)
+        progress.setLabelText(f"Foglio {done} di {total}: {sheet}")
+
+    def on_export_done(self, progress, filename, completed):
+        self.export_worker = None
+        progress.close()
+        if completed:
+            QMessageBox.information(self, "Export", f"Preventivo esportato in {filename}")
+        else:
+            logging.info(f"Esportazione annullata: {filename}")
+
+    def on_export_error(self, progress, message):
+        self.export_worker = None
+        progress.close()
+        QMessageBox.critical(self, "Errore", f"Errore durante l'esportazione: {message}")
\ No newline at end of file
@@ -0,0 +1,54 @@
+import logging
+from PyQt6.QtCore import QObject, QTimer
+
+class RecalcScheduler(QObject):
+    """Raggruppa le richieste di ricalcolo dei totali.
+
+    Le notifiche che arrivano nello stesso giro del ciclo eventi (incolla,
+    caricamento, cambio tipo di manodopera...) producono un solo ricalcolo
+    per quadro, eseguito appena il ciclo eventi torna libero.
+    """
+
+    def __init__(self, callback, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+        self.requested = 0
+        self.executed = 0
+        self._pending = {}  # dizionario usato come insieme ordinato
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.flush)
+
+    @property
+    def saved(self) -> int:
+        """Ricalcoli evitati grazie al raggruppamento"""
+        return self.requested - self.executed - len(self._pending)
+
+    def request(self, key):
+        self.requested += 1
+        self._pending[key] = None
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def cancel(self, key):
+        """Annulla un ricalcolo in attesa (es. quadro chiuso)"""
+        self._pending.pop(key, None)
+
+    def flush(self):
+        """Esegue subito i ricalcoli in attesa"""
+        self._timer.stop()
+        pending, self._pending = self._pending, {}
+        for key in pending:
+            self.executed += 1
+            try:
+                self.callback(key)
+            except Exception as e:
+                logging.error(f"Errore nel ricalcolo dei totali: {str(e)}")
+
+    def stats(self):
+        return {
+            'requested': self.requested,
+            'executed': self.executed,
+            'saved': self.saved
+        }
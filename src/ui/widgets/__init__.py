@@ -1,3 +1,3 @@
 from .materials_tab import MaterialsTab
 from .labor_widget import LaborWidget
-from .summary_widget import SummaryWidget
\ No newline at end of file
+from .summary_widget import SummaryWidget
@@ -1,15 +1,13 @@
 import logging
-from PyQt6.QtWidgets import QLineEdit, QComboBox, QStyledItemDelegate
+from PyQt6.QtWidgets import QLineEdit, QComboBox, QStyledItemDelegate, QCompleter
 from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QStandardItem, QStandardItemModel
 
 class InlineEditDelegate(QStyledItemDelegate):
     def createEditor(self, parent, option, index):
         try:
             if index.column() == 1:  # Reference column
-                editor = ReferenceEditor(parent)
-                if hasattr(self.parent(), 'reference_completer'):
-                    editor.setCompleter(self.parent().reference_completer)
-                return editor
+                return ReferenceEditor(parent, search=getattr(self.parent(), 'search_references', None))
             elif index.column() == 0:  # Quantity column
                 editor = QuantityEditor(parent)
                 return editor
@@ -27,8 +25,12 @@ class InlineEditDelegate(QStyledItemDelegate):
         model.setData(index, value, Qt.ItemDataRole.EditRole)
 
 class ReferenceEditor(QLineEdit):
-    def __init__(self, parent=None):
+    # Ruolo con la sola referenza, inserita nella cella alla scelta del suggerimento
+    ReferenceRole = Qt.ItemDataRole.UserRole
+
+    def __init__(self, parent=None, search=None):
         super().__init__(parent)
+        self.search = search
         self.setFrame(False)  # Rimuove il bordo
         self.setStyleSheet("""
             QLineEdit {
@@ -41,6 +43,35 @@ class ReferenceEditor(QLineEdit):
                 border: 1px solid #4CAF50;
             }
         """)
+        
+        if self.search is not None:
+            self.setup_search_completer()
+
+    def setup_search_completer(self):
+        # I suggerimenti arrivano già filtrati e ordinati dalla ricerca nel catalogo
+        self.suggestions = QStandardItemModel(self)
+        completer = QCompleter(self.suggestions, self)
+        completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        completer.setCompletionRole(self.ReferenceRole)
+        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.setCompleter(completer)
+        self.textEdited.connect(self.update_suggestions)
+
+    def update_suggestions(self, text):
+        try:
+            results = self.search(text) if text.strip() else []
+        except Exception as e:
+            logging.error(f"Errore nella ricerca delle referenze: {str(e)}")
+            results = []
+        
+        self.suggestions.clear()
+        for reference, designation in results:
+            item = QStandardItem(f"{reference} - {designation}" if designation else reference)
+            item.setData(reference, self.ReferenceRole)
+            self.suggestions.appendRow(item)
+        
+        if results:
+            self.completer().complete()
     
     def keyPressEvent(self, event):
         if event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
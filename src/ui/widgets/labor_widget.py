@@ -6,6 +6,7 @@ from PyQt6.QtCore import Qt, pyqtSignal
 from ...config import (LABOR_BASE_RATES, LABOR_COEFFICIENTS, LaborType, 
                       COLORS)
 from .custom_editors import HoursDelegate
+from ...utils.calculations import LaborCalculations
 from ...utils.error_handler import ErrorHandler
 
 class LaborWidget(QWidget):
@@ -116,14 +117,18 @@ class LaborWidget(QWidget):
         self.dataChanged.emit()
     
     def update_rates(self):
-        for i, (labor_type, base_rate) in enumerate(LABOR_BASE_RATES.items()):
-            coefficient = LABOR_COEFFICIENTS[self.current_labor_type][labor_type]
-            rate = base_rate * coefficient
-            rate_item = QTableWidgetItem(f"{rate:.2f}")
-            rate_item.setFlags(rate_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            rate_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-            self.table.setItem(i, 2, rate_item)
-        self.on_data_changed()
+        """Aggiorna le tariffe; dataChanged lo emette chi cambia il tipo, una volta sola"""
+        blocked = self.table.blockSignals(True)
+        try:
+            for i, (labor_type, base_rate) in enumerate(LABOR_BASE_RATES.items()):
+                coefficient = LABOR_COEFFICIENTS[self.current_labor_type][labor_type]
+                rate = base_rate * coefficient
+                rate_item = QTableWidgetItem(f"{rate:.2f}")
+                rate_item.setFlags(rate_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+                rate_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(i, 2, rate_item)
+        finally:
+            self.table.blockSignals(blocked)
     
     def update_button_states(self):
         for labor_type, btn in self.type_buttons.items():
@@ -155,20 +160,41 @@ class LaborWidget(QWidget):
     def on_data_changed(self, item=None):
         self.dataChanged.emit()
     
-    def get_total_cost(self):
-        total_cost = 0
+    def get_labor_rows(self):
+        """Ore inserite per tipo di manodopera, come numeri"""
+        rows = []
         for row in range(self.table.rowCount()):
+            type_item = self.table.item(row, 0)
             hours_item = self.table.item(row, 1)
-            rate_item = self.table.item(row, 2)
-            
-            if hours_item and rate_item and hours_item.text() and rate_item.text():
-                try:
-                    hours = float(hours_item.text().replace(",", "."))
-                    rate = float(rate_item.text().replace("'", ""))
-                    total_cost += hours * rate
-                except ValueError:
-                    continue
-        return total_cost
+            if not (type_item and hours_item and hours_item.text()):
+                continue
+            try:
+                hours = float(hours_item.text().replace(",", "."))
+            except ValueError:
+                continue
+            rows.append({'type': type_item.text(), 'hours': hours})
+        return rows
+    
+    def set_labor_rows(self, rows, labor_type: LaborType = None):
+        """Ripristina ore e tipo di manodopera senza emettere dataChanged"""
+        hours = {row['type']: row['hours'] for row in rows}
+        blocked = self.blockSignals(True)
+        table_blocked = self.table.blockSignals(True)
+        try:
+            if labor_type is not None:
+                self.current_labor_type = labor_type
+                self.update_rates()
+                self.update_button_states()
+            for row in range(self.table.rowCount()):
+                type_item = self.table.item(row, 0)
+                value = hours.get(type_item.text(), 0) if type_item else 0
+                self.table.item(row, 1).setText(f"{value:g}")
+        finally:
+            self.table.blockSignals(table_blocked)
+            self.blockSignals(blocked)
+    
+    def get_total_cost(self):
+        return LaborCalculations.calculate_labor_cost(self.get_labor_rows(), self.current_labor_type)
     
     def get_data(self):
         data = []
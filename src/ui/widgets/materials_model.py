@@ -0,0 +1,347 @@
+import logging
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+from ...config import UI_CONFIG
+from ...models.materials import MaterialRow, parse_quantity
+
+# Colonne visibili + colonne nascoste di default (dalla 7 in poi)
+MATERIAL_COLUMNS = [
+    "Quantité", "Référence No.", "Désignation", "Prix",
+    "Temps Article (minutes)", "Prix * Qté", "Temps Article Tot",
+    "Numero Module", "Bornes", "1 Borne mm", "Tot mm Bornes",
+    "Prix 2S", "Prix 3S"
+]
+
+QUANTITY_COLUMN = 0
+REFERENCE_COLUMN = 1
+EDITABLE_COLUMNS = (QUANTITY_COLUMN, REFERENCE_COLUMN)
+PRICE_COLUMNS = (3, 5, 11, 12)
+
+def format_number(value, decimals=2):
+    try:
+        num = float(value)
+        return f"{num:,.{decimals}f}".replace(",", "'")
+    except (ValueError, TypeError):
+        return value
+
+def format_plain(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class MaterialsTableModel(QAbstractTableModel):
+    """Modello della tabella materiali.
+
+    Le righe sono MaterialRow create solo quando contengono dati; le righe
+    vuote non occupano memoria (None). Sotto l'ultima riga usata restano
+    sempre alcune righe libere, così la tabella cresce mentre si scrive.
+
+    rowChanged(old, new) porta la riga prima e dopo ogni modifica come
+    dizionari (None se vuota), per l'aggiornamento incrementale dei totali.
+    rowEdited(indice, dati) porta lo stato salvabile della riga modificata
+    (come in dump_rows, None se vuota), per il giornale del progetto.
+
+    rowsChanged e rowsEdited sono le versioni per un blocco di righe
+    (update_rows): liste di coppie (vecchia, nuova) e (indice, dati),
+    emesse una sola volta per tutto il blocco.
+
+    resolve_product(referenza) cerca un prodotto; resolve_products(referenze)
+    ne cerca molti con una sola query e restituisce {referenza: prodotto}.
+
+    Il numero di righe compilate (quantità e referenza) è tenuto aggiornato
+    a ogni modifica, così has_content non scorre la tabella.
+    """
+    rowChanged = pyqtSignal(object, object)
+    rowEdited = pyqtSignal(int, object)
+    rowsChanged = pyqtSignal(object)
+    rowsEdited = pyqtSignal(object)
+
+    def __init__(self, manufacturer=None, resolve_product=None, resolve_products=None, parent=None):
+        super().__init__(parent)
+        self.manufacturer = manufacturer
+        self.resolve_product = resolve_product
+        self.resolve_products = resolve_products
+        self.spare_rows = UI_CONFIG['materials_spare_rows']
+        self._rows = []
+        self._filled_rows = 0
+
+    # --- API Qt ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows) + self.spare_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(MATERIAL_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return MATERIAL_COLUMNS[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() in EDITABLE_COLUMNS:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            row = self.row(index.row())
+            return self.cell_text(row, index.column()) if row else ""
+        if role == Qt.ItemDataRole.TextAlignmentRole and index.column() in PRICE_COLUMNS:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        column = index.column()
+        if column == QUANTITY_COLUMN:
+            try:
+                quantity = parse_quantity(value)
+            except ValueError:
+                return False
+            return self.update_row(index.row(), quantity=quantity)
+        if column == REFERENCE_COLUMN:
+            return self.update_row(index.row(), reference=str(value or '').strip())
+        return False
+
+    # --- Accesso ai dati ---
+
+    @staticmethod
+    def cell_text(row: MaterialRow, column: int) -> str:
+        if column == 0:
+            return format_plain(row.quantity)
+        if column == 1:
+            return row.reference or ""
+        if column == 2:
+            return row.designation or ""
+        if column == 3:
+            return format_number(row.price) if row.price is not None else ""
+        if column == 4:
+            return format_plain(row.time)
+        if column == 5:
+            total = row.total_price
+            return format_number(total) if total is not None else ""
+        if column == 6:
+            total = row.total_time
+            return str(total) if total is not None else ""
+        if column == 7:
+            return format_plain(row.num_modules)
+        if column == 8:
+            return format_plain(row.num_bornes)
+        if column == 9:
+            return format_plain(row.bornes_mm)
+        if column == 10:
+            return format_plain(row.tot_bornes_mm)
+        if column == 11:
+            return format_number(row.prix_2s) if row.prix_2s is not None else ""
+        if column == 12:
+            return format_number(row.prix_3s) if row.prix_3s is not None else ""
+        return ""
+
+    def row(self, row_index: int):
+        """Restituisce la MaterialRow della riga o None se vuota"""
+        if 0 <= row_index < len(self._rows):
+            return self._rows[row_index]
+        return None
+
+    def iter_rows(self):
+        """Righe con contenuto, in ordine"""
+        return (row for row in self._rows if row is not None and not row.is_empty)
+
+    def record(self, row: MaterialRow):
+        """Riga come dizionario per il motore di calcolo (con il produttore)"""
+        if row is None or row.is_empty:
+            return None
+        return dict(row.to_dict(), manufacturer=self.manufacturer)
+
+    def records(self):
+        return [self.record(row) for row in self.iter_rows()]
+
+    def dump_rows(self):
+        """Righe compilate come dizionari, con la loro posizione ('row')"""
+        return [dict(row.to_dict(), row=i) for i, row in enumerate(self._rows)
+                if row is not None and not row.is_empty]
+
+    def load_rows(self, rows):
+        """Sostituisce tutte le righe (da dump_rows).
+
+        Non emette rowChanged: chi usa i totali incrementali deve ricalcolarli.
+        """
+        self.beginResetModel()
+        self._rows = []
+        for data in rows:
+            row_index = data.get('row', len(self._rows))
+            if row_index >= len(self._rows):
+                self._rows.extend([None] * (row_index + 1 - len(self._rows)))
+            self._rows[row_index] = MaterialRow.from_dict(data)
+        # Righe salvate senza dati del catalogo: una sola ricerca per tutte
+        self.apply_products([row for row in self._rows if row is not None])
+        self._filled_rows = sum(self.is_filled(row) for row in self._rows)
+        self.endResetModel()
+
+    @staticmethod
+    def is_filled(row) -> bool:
+        return row is not None and row.quantity is not None and bool(row.reference)
+
+    def has_content(self) -> bool:
+        return self._filled_rows > 0
+
+    # --- Modifiche ---
+
+    def _grow(self, size: int):
+        missing = size - len(self._rows)
+        if missing > 0:
+            # Le righe libere sotto l'ultima riga usata restano costanti
+            first = len(self._rows) + self.spare_rows
+            self.beginInsertRows(QModelIndex(), first, first + missing - 1)
+            self._rows.extend([None] * missing)
+            self.endInsertRows()
+
+    def _ensure_row(self, row_index: int) -> MaterialRow:
+        self._grow(row_index + 1)
+        if self._rows[row_index] is None:
+            self._rows[row_index] = MaterialRow()
+        return self._rows[row_index]
+
+    @staticmethod
+    def saved_data(row):
+        return None if row is None or row.is_empty else row.to_dict()
+
+    def _emit_row_changed(self, row_index: int, old_record=None):
+        row = self.row(row_index)
+        self.rowChanged.emit(old_record, self.record(row))
+        self.rowEdited.emit(row_index, self.saved_data(row))
+        self.dataChanged.emit(
+            self.index(row_index, 0),
+            self.index(row_index, len(MATERIAL_COLUMNS) - 1)
+        )
+
+    def update_row(self, row_index: int, **changes) -> bool:
+        """Modifica quantità e/o referenza; una nuova referenza ricarica il prodotto"""
+        row = self._ensure_row(row_index)
+        old_record = self.record(row)
+        filled = self.is_filled(row)
+        if 'quantity' in changes:
+            row.quantity = changes['quantity']
+        if 'reference' in changes and changes['reference'] != row.reference:
+            row.reference = changes['reference']
+            row.apply_product(self.lookup(row.reference))
+        self._filled_rows += self.is_filled(row) - filled
+        self._emit_row_changed(row_index, old_record)
+        return True
+
+    def lookup(self, reference):
+        if not reference or self.resolve_product is None:
+            return None
+        try:
+            return self.resolve_product(reference)
+        except Exception as e:
+            logging.error(f"Errore nella ricerca del prodotto {reference}: {str(e)}")
+            return None
+
+    def update_rows(self, start_row: int, changes) -> int:
+        """Modifica un blocco di righe consecutive (es. incollate da Excel).
+
+        changes ha un dizionario per riga come in update_row ({} = riga
+        invariata). I prodotti delle nuove referenze sono cercati con una sola
+        query e i segnali sono emessi una volta per tutto il blocco.
+        Restituisce il numero di righe modificate.
+        """
+        if not changes:
+            return 0
+        self._grow(start_row + len(changes))
+        edited = []
+        lookups = []
+        for row_index, change in enumerate(changes, start_row):
+            if not change:
+                continue
+            row = self._rows[row_index]
+            if row is None:
+                row = self._rows[row_index] = MaterialRow()
+            edited.append((row_index, self.record(row)))
+            filled = self.is_filled(row)
+            if 'quantity' in change:
+                row.quantity = change['quantity']
+            if 'reference' in change and change['reference'] != row.reference:
+                row.reference = change['reference']
+                lookups.append(row)
+            self._filled_rows += self.is_filled(row) - filled
+        if not edited:
+            self._trim()
+            return 0
+
+        products = self.lookup_many(row.reference for row in lookups)
+        for row in lookups:
+            row.apply_product(products.get(row.reference))
+
+        self.rowsChanged.emit([(old_record, self.record(self._rows[row_index]))
+                               for row_index, old_record in edited])
+        self.rowsEdited.emit([(row_index, self.saved_data(self._rows[row_index]))
+                              for row_index, _ in edited])
+        self.dataChanged.emit(
+            self.index(edited[0][0], 0),
+            self.index(edited[-1][0], len(MATERIAL_COLUMNS) - 1)
+        )
+        self._trim()
+        return len(edited)
+
+    def lookup_many(self, references):
+        """{referenza: prodotto} con una sola ricerca (senza resolve_products, una per referenza)"""
+        references = [reference for reference in dict.fromkeys(references) if reference]
+        if not references:
+            return {}
+        if self.resolve_products is None:
+            return {reference: self.lookup(reference) for reference in references}
+        try:
+            return self.resolve_products(references)
+        except Exception as e:
+            logging.error(f"Errore nella ricerca dei prodotti: {str(e)}")
+            return {}
+
+    def apply_products(self, rows):
+        """Completa con i dati del catalogo le righe con referenza ma senza prodotto"""
+        pending = [row for row in rows if row.reference and not row.has_product]
+        if not pending:
+            return
+        products = self.lookup_many(row.reference for row in pending)
+        for row in pending:
+            row.apply_product(products.get(row.reference))
+
+    def set_row(self, row_index: int, material_row: MaterialRow):
+        old_record = self.record(self.row(row_index))
+        filled = self.is_filled(self.row(row_index))
+        self._ensure_row(row_index)
+        self._rows[row_index] = material_row.copy()
+        self._filled_rows += self.is_filled(self._rows[row_index]) - filled
+        self._emit_row_changed(row_index, old_record)
+
+    def clear_row(self, row_index: int):
+        if row_index >= len(self._rows) or self._rows[row_index] is None:
+            return
+        old_record = self.record(self._rows[row_index])
+        self._filled_rows -= self.is_filled(self._rows[row_index])
+        self._rows[row_index] = None
+        self._emit_row_changed(row_index, old_record)
+        self._trim()
+
+    def _trim(self):
+        """Elimina le righe vuote in fondo, mantenendo solo le righe libere"""
+        last = len(self._rows)
+        while last > 0 and (self._rows[last - 1] is None or self._rows[last - 1].is_empty):
+            last -= 1
+        if last < len(self._rows):
+            removed = len(self._rows) - last
+            first = last + self.spare_rows
+            self.beginRemoveRows(QModelIndex(), first, first + removed - 1)
+            del self._rows[last:]
+            self.endRemoveRows()
@@ -1,7 +1,7 @@
 import logging
 import sqlite3
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget,
-                           QTableWidgetItem, QCheckBox, QLabel, QHeaderView,
+from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QTableView,
+                           QCheckBox, QLabel, QHeaderView,
                            QMessageBox, QLineEdit, QCompleter, QStyledItemDelegate,
                            QAbstractItemView)
 from PyQt6.QtCore import Qt, pyqtSignal
@@ -9,11 +9,14 @@ from PyQt6.QtGui import QColor
 
 from ...config import TAB_COLORS, COLORS, MANUFACTURERS
 from ...models import Database
+from ...models.materials import parse_pasted_rows
 from .custom_editors import InlineEditDelegate
+from .materials_model import MaterialsTableModel, MATERIAL_COLUMNS, format_number
 from ...utils.error_handler import ErrorHandler
 
 class MaterialsTab(QWidget):
     dataChanged = pyqtSignal()
+    contentChanged = pyqtSignal(str, bool)
     
     def __init__(self, parent=None, manufacturer=None, database=None):
         super().__init__(parent)
@@ -21,34 +24,15 @@ class MaterialsTab(QWidget):
         self.db = database
         self.has_content = False
         
-        # Inizializza il completer qui
-        self.setup_reference_autocomplete()
         self.setup_ui()
-    
-    def setup_reference_autocomplete(self):
-        try:
-            if hasattr(self.db, 'get_references_by_manufacturer'):
-                references = self.db.get_references_by_manufacturer(self.manufacturer)
-                self.references_data = {ref: desc for ref, desc in references}
-                
-                # Crea il completer
-                self.reference_completer = QCompleter(list(self.references_data.keys()))
-                self.reference_completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-                self.reference_completer.setFilterMode(Qt.MatchFlag.MatchContains)
-            else:
-                self.references_data = {}
-                self.reference_completer = QCompleter([])
-                logging.error("Database non ha il metodo get_references_by_manufacturer")
-                
-        except Exception as e:
-            logging.error(f"Errore nell'inizializzazione dell'autocompletamento: {str(e)}")
-            self.references_data = {}
-            self.reference_completer = QCompleter([])
+
+    def search_references(self, text):
+        """Suggerimenti per l'editor della referenza (prefisso e testo libero)"""
+        return self.db.search_products(text, self.manufacturer)
         
     def setup_database(self):
         try:
             self.db = sqlite3.connect('volta_plus.db')
-            self.setup_reference_autocomplete()
         except Exception as e:
             logging.error(f"Errore nella connessione al database: {str(e)}")
             raise
@@ -58,20 +42,16 @@ class MaterialsTab(QWidget):
 
     
     def setup_table(self):
-        self.table.setRowCount(200)
-        
-        # Colonne base + colonne nascoste
-        all_columns = [
-            "Quantité", "Référence No.", "Désignation", "Prix", 
-            "Temps Article (minutes)", "Prix * Qté", "Temps Article Tot",
-            "Numero Module", "Bornes", "1 Borne mm", "Tot mm Bornes",
-            "Prix 2S", "Prix 3S"
-        ]
-        self.table.setColumnCount(len(all_columns))
-        self.table.setHorizontalHeaderLabels(all_columns)
+        self.model = MaterialsTableModel(
+            manufacturer=self.manufacturer,
+            resolve_product=self.resolve_product,
+            resolve_products=self.resolve_products,
+            parent=self
+        )
+        self.table.setModel(self.model)
         
         # Nascondi le colonne aggiuntive di default
-        for col in range(7, len(all_columns)):
+        for col in range(7, len(MATERIAL_COLUMNS)):
             self.table.setColumnHidden(col, True)
         
         # Stile header
@@ -94,16 +74,6 @@ class MaterialsTab(QWidget):
         self.table.setColumnWidth(5, 100)  # Prix * Qté
         self.table.setColumnWidth(6, 150)  # Temps Article Tot
         
-        # Inizializza le righe
-        for row in range(200):
-            for col in range(len(all_columns)):
-                if col not in [0, 1]:  # Solo Quantité e Référence sono editabili
-                    item = QTableWidgetItem("")
-                    item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                    self.table.setItem(row, col, item)
-                else:
-                    self.table.setItem(row, col, QTableWidgetItem(""))
-        
         # Imposta il delegate per l'editing inline
         self.table.setItemDelegate(InlineEditDelegate(self))
         
@@ -114,8 +84,15 @@ class MaterialsTab(QWidget):
             QAbstractItemView.EditTrigger.DoubleClicked
         )
         
-        # Connetti l'evento di modifica cella
-        self.table.itemChanged.connect(self.on_cell_changed)
+        # Connetti l'evento di modifica del modello
+        self.model.dataChanged.connect(self.on_model_changed)
+
+    def resolve_product(self, reference):
+        return self.db.get_product(reference, self.manufacturer)
+
+    def resolve_products(self, references):
+        products = self.db.get_products((self.manufacturer, reference) for reference in references)
+        return {reference: product for (_, reference), product in products.items()}
     
     def toggle_column_visibility(self, column_id: str, state: bool):
         column_indices = {
@@ -129,24 +106,15 @@ class MaterialsTab(QWidget):
         self.table.setColumnHidden(column_indices[column_id], not state)
 
     def format_number(self, value, decimals=2):
-        try:
-            num = float(value)
-            return f"{num:,.{decimals}f}".replace(",", "'")
-        except (ValueError, TypeError):
-            return value
+        return format_number(value, decimals)
 
     
     def check_content(self):
-        for row in range(self.table.rowCount()):
-            qty_item = self.table.item(row, 0)
-            ref_item = self.table.item(row, 1)
-            if qty_item and ref_item and qty_item.text() and ref_item.text():
-                return True
-        return False
+        return self.model.has_content()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Delete:
-            current_row = self.table.currentRow()
+            current_row = self.table.currentIndex().row()
             if current_row >= 0:
                 reply = QMessageBox.question(
                     self,
@@ -165,32 +133,45 @@ class MaterialsTab(QWidget):
         super().keyPressEvent(event)
 
     def clear_row(self, row):
-        self.table.blockSignals(True)
-        for col in range(self.table.columnCount()):
-            self.table.setItem(row, col, QTableWidgetItem(""))
-        self.table.blockSignals(False)
-        has_content = self.check_content()
-        if has_content != self.has_content:
-            self.has_content = has_content
-            self.dataChanged.emit(self.manufacturer, has_content)
+        self.model.clear_row(row)
 
     def copy_row(self):
-        current_row = self.table.currentRow()
+        current_row = self.table.currentIndex().row()
         if current_row >= 0:
-            self.clipboard_data = []
-            for col in range(self.table.columnCount()):
-                item = self.table.item(current_row, col)
-                self.clipboard_data.append(item.text() if item else "")
+            row = self.model.row(current_row)
+            self.clipboard_data = row.copy() if row else None
+            if row:
+                # Anche negli appunti di sistema (quantità e referenza), per Excel
+                self.clipboard_text = '\t'.join(self.model.cell_text(row, column) for column in (0, 1))
+                QApplication.clipboard().setText(self.clipboard_text)
 
     def paste_row(self):
-        if hasattr(self, 'clipboard_data'):
-            current_row = self.table.currentRow()
-            if current_row >= 0:
-                self.table.blockSignals(True)
-                for col, value in enumerate(self.clipboard_data):
-                    self.table.setItem(current_row, col, QTableWidgetItem(value))
-                self.table.blockSignals(False)
-                self.on_cell_changed(self.table.item(current_row, 0))
+        current = self.table.currentIndex()
+        if current.row() < 0:
+            return
+        text = QApplication.clipboard().text()
+        if getattr(self, 'clipboard_data', None) is not None and text == getattr(self, 'clipboard_text', None):
+            # Riga copiata da questa tabella: si incolla con tutti i suoi dati
+            self.model.set_row(current.row(), self.clipboard_data)
+        elif text:
+            self.paste_text(text, current.row(), current.column())
+
+    def paste_text(self, text, row, column=0):
+        """Incolla un blocco copiato da Excel (quantità e/o referenze) dalla riga indicata"""
+        try:
+            return self.model.update_rows(row, parse_pasted_rows(text, column))
+        except Exception as e:
+            logging.error(f"Errore nell'incollare le righe: {str(e)}")
+            return 0
+    
+    def get_data(self):
+        return self.model.dump_rows()
+
+    def set_data(self, rows):
+        """Carica le righe salvate senza segnalare una modifica"""
+        self.model.load_rows(rows or [])
+        self.has_content = self.check_content()
+        self.contentChanged.emit(self.manufacturer, self.has_content)
     
     def save_column_layout(self):
         layout = {}
@@ -238,73 +219,19 @@ class MaterialsTab(QWidget):
         layout.addLayout(columns_layout)
         
         # Tabella materiali
-        self.table = QTableWidget()
+        self.table = QTableView()
         self.setup_table()
         layout.addWidget(self.table)
     
 
 
-    def on_cell_changed(self, item):
-        row = item.row()
-        col = item.column()
-        
+    def on_model_changed(self, top_left=None, bottom_right=None, roles=None):
         try:
-            if col == 1:  # Reference column
-                reference = item.text().strip()
-                if reference:
-                    product = self.db.get_product(reference, self.manufacturer)
-                    if product:
-                        # Blocca i segnali solo per l'aggiornamento dei dati
-                        self.table.blockSignals(True)
-                        
-                        # Aggiorna i campi
-                        self.table.setItem(row, 2, QTableWidgetItem(str(product['designation'])))
-                        self.table.setItem(row, 3, QTableWidgetItem(self.format_number(product['price'])))
-                        self.table.setItem(row, 4, QTableWidgetItem(str(product['time'])))
-                        
-                        # Aggiorna campi nascosti
-                        self.table.setItem(row, 7, QTableWidgetItem(str(product.get('num_modules', ''))))
-                        self.table.setItem(row, 8, QTableWidgetItem(str(product.get('num_bornes', ''))))
-                        self.table.setItem(row, 9, QTableWidgetItem(str(product.get('bornes_mm', ''))))
-                        self.table.setItem(row, 10, QTableWidgetItem(str(product.get('tot_bornes_mm', ''))))
-                        self.table.setItem(row, 11, QTableWidgetItem(self.format_number(product.get('prix_2s', 0))))
-                        self.table.setItem(row, 12, QTableWidgetItem(self.format_number(product.get('prix_3s', 0))))
-                        
-                        # Se c'è già una quantità, aggiorna i totali
-                        qty_item = self.table.item(row, 0)
-                        if qty_item and qty_item.text():
-                            try:
-                                qty = float(qty_item.text())
-                                self.table.setItem(row, 5, QTableWidgetItem(self.format_number(product['price'] * qty)))
-                                self.table.setItem(row, 6, QTableWidgetItem(str(int(product['time'] * qty))))
-                            except ValueError:
-                                pass
-                        
-                        self.table.blockSignals(False)
-            
-            elif col == 0:  # Quantity column
-                qty_text = item.text().strip()
-                price_item = self.table.item(row, 3)
-                time_item = self.table.item(row, 4)
-                
-                if qty_text and price_item and time_item:
-                    try:
-                        qty = float(qty_text)
-                        price = float(price_item.text().replace("'", ""))
-                        time = float(time_item.text())
-                        
-                        self.table.blockSignals(True)
-                        self.table.setItem(row, 5, QTableWidgetItem(self.format_number(price * qty)))
-                        self.table.setItem(row, 6, QTableWidgetItem(str(int(time * qty))))
-                        self.table.blockSignals(False)
-                    except ValueError:
-                        pass
-            
             # Verifica se c'è contenuto nella tabella
             has_content = self.check_content()
             if has_content != self.has_content:
                 self.has_content = has_content
-                self.dataChanged.emit()
-            
+                self.contentChanged.emit(self.manufacturer, has_content)
+            self.dataChanged.emit()
         except Exception as e:
             logging.error(f"Errore nell'aggiornamento della riga: {str(e)}")
@@ -5,6 +5,7 @@ from PyQt6.QtCore import Qt, pyqtSignal
 
 from ...config import SUMMARY_SECTIONS, COLORS, APP_CONFIG
 from ...utils.error_handler import ErrorHandler
+from ...utils.calculations import TotalCalculations
 
 class SummaryWidget(QWidget):
     marginChanged = pyqtSignal(float)
@@ -157,14 +158,18 @@ class SummaryWidget(QWidget):
             return "0.00"
     
     def update_costs(self, material_total, time_total, labor_total):
-        margin = self.margin_spin.value() / 100
-        material_with_margin = material_total * (1 + margin)
-        final_total = material_with_margin + labor_total
+        totals = TotalCalculations.calculate_final_totals(
+            {'total_price': material_total}, labor_total, self.get_margin()
+        )
+        totals['time_total'] = time_total
+        self.show_costs(totals)
 
-        self.costs_table.item(0, 1).setText(self.format_number(material_total))
-        self.costs_table.item(1, 1).setText(f"{time_total:.0f} min")
-        self.costs_table.item(2, 1).setText(self.format_number(labor_total))
-        self.costs_table.item(3, 1).setText(self.format_number(final_total))
+    def show_costs(self, totals):
+        """Mostra i costi calcolati da TotalCalculations"""
+        self.costs_table.item(0, 1).setText(self.format_number(totals['material_total']))
+        self.costs_table.item(1, 1).setText(f"{totals['time_total']:.0f} min")
+        self.costs_table.item(2, 1).setText(self.format_number(totals['labor_total']))
+        self.costs_table.item(3, 1).setText(self.format_number(totals['final_total']))
 
         # Evidenzia il totale finale
         final_item = self.costs_table.item(3, 1)
@@ -172,16 +177,26 @@ class SummaryWidget(QWidget):
     
     def update_info(self, modules_data):
         for i, key in enumerate(SUMMARY_SECTIONS['info_tableau']):
-            value = modules_data.get(key.lower().replace(' ', '_'), 0)
+            # Chiavi per etichetta (TotalCalculations.summary_info) o in forma snake_case
+            value = modules_data.get(key, modules_data.get(key.lower().replace(' ', '_'), 0))
             formatted_value = self.format_number(value) if isinstance(value, float) else str(value)
             
             item = self.info_table.item(i, 1)
             if item:
                 item.setText(formatted_value)
                 item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+
+    def show_totals(self, totals):
+        """Mostra i risultati di TotalCalculations.calculate_tableau_totals"""
+        self.show_costs(totals)
+        self.update_info(totals['info'])
     
     def get_margin(self):
         return self.margin_spin.value() / 100
     
-    def set_margin(self, value):
-        self.margin_spin.setValue(value * 100)
\ No newline at end of file
+    def set_margin(self, value, notify=True):
+        blocked = self.margin_spin.blockSignals(not notify or self.margin_spin.signalsBlocked())
+        try:
+            self.margin_spin.setValue(value * 100)
+        finally:
+            self.margin_spin.blockSignals(blocked)
\ No newline at end of file
@@ -0,0 +1,43 @@
+import logging
+import threading
+import traceback
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+class WorkerSignals(QObject):
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int, int, str)
+
+class Worker(QRunnable):
+    """Esegue una funzione nel QThreadPool e notifica il risultato con segnali.
+
+    I segnali arrivano nel thread della GUI, quindi gli slot collegati
+    possono aggiornare i widget. Con report_progress=True la funzione riceve
+    progress (emette signals.progress) e cancelled (vero dopo cancel()).
+    """
+
+    def __init__(self, fn, *args, report_progress=False, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
+        if report_progress:
+            self.kwargs['progress'] = self.signals.progress.emit
+            self.kwargs['cancelled'] = self.is_cancelled
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            logging.error(f"Errore nel thread di lavoro: {str(e)}\n{traceback.format_exc()}")
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
@@ -1,67 +1,237 @@
+import logging
+import numpy as np
+from ..config import LABOR_BASE_RATES, LABOR_COEFFICIENTS, SUMMARY_SECTIONS, MANUFACTURERS
+
+# Ordine delle somme parziali prodotte da MaterialCalculations.row_contribution
+MATERIAL_SUM_FIELDS = (
+    'total_price', 'total_time', 'knx', '0.5m', '1p2p', '3p', '4p',
+    'modules_total', 'bornes_count', 'bornes_space'
+)
+
+# Codici numerici dei produttori per il calcolo vettoriale
+MANUFACTURER_CODES = {name: code for code, name in enumerate(MANUFACTURERS)}
+KNX_CODE = MANUFACTURER_CODES['KNX']
+
+# Colonne numeriche richieste da calculate_material_totals_arrays
+MATERIAL_ARRAY_FIELDS = ('quantity', 'price', 'time', 'num_modules', 'num_bornes', 'tot_bornes_mm')
 
 class MaterialCalculations:
     @staticmethod
-    def calculate_material_totals(materials_data):
-        """Calcola i totali per i materiali"""
-        total_price = 0
-        total_time = 0
-        modules = {
-            'knx': 0,
-            '0.5m': 0,
-            '1p2p': 0,
-            '3p': 0,
-            '4p': 0,
-            'total': 0
-        }
-        bornes = {
-            'count': 0,
-            'space': 0
-        }
+    def row_contribution(row):
+        """Contributo di una riga alle somme, nell'ordine di MATERIAL_SUM_FIELDS.
 
-        for row in materials_data:
-            if not row['quantity']:
-                continue
+        La riga è un dizionario con quantity, price, time, manufacturer,
+        num_modules, num_bornes e tot_bornes_mm; le righe senza quantità o
+        senza prezzo (referenza non trovata) non contribuiscono (None).
+        Il tempo della riga è troncato ai minuti interi, come nella colonna
+        "Temps Article Tot" (MaterialRow.total_time).
+        """
+        if not row or not row.get('quantity') or row.get('price') is None:
+            return None
 
-            quantity = float(row['quantity'])
-            total_price += quantity * row['price']
-            total_time += quantity * row['time']
+        quantity = float(row['quantity'])
+        module_size = row.get('num_modules') or 0
 
-            # Calcolo moduli
-            if row['manufacturer'] == 'KNX':
-                modules['knx'] += quantity * row['num_modules']
-            
-            module_size = row['num_modules']
-            if module_size == 0.5:
-                modules['0.5m'] += quantity
-            elif module_size in [1, 2]:
-                modules['1p2p'] += quantity
-            elif module_size == 3:
-                modules['3p'] += quantity
-            elif module_size >= 4:
-                modules['4p'] += quantity
-            
-            modules['total'] += quantity * module_size
-            
+        # Calcolo moduli
+        knx = quantity * module_size if row.get('manufacturer') == 'KNX' else 0
+        m05 = m1p2p = m3p = m4p = 0
+        if module_size == 0.5:
+            m05 = quantity
+        elif module_size in [1, 2]:
+            m1p2p = quantity
+        elif module_size == 3:
+            m3p = quantity
+        elif module_size >= 4:
+            m4p = quantity
+
+        return (
+            quantity * row['price'],
+            int(quantity * (row.get('time') or 0)),
+            knx, m05, m1p2p, m3p, m4p,
+            quantity * module_size,
             # Calcolo bornes
-            if row['num_bornes']:
-                bornes['count'] += quantity * row['num_bornes']
-            if row['tot_bornes_mm']:
-                bornes['space'] += quantity * row['tot_bornes_mm']
+            quantity * (row.get('num_bornes') or 0),
+            quantity * (row.get('tot_bornes_mm') or 0)
+        )
 
+    @staticmethod
+    def build_totals(sums):
+        """Costruisce il dizionario dei totali dalle somme di MATERIAL_SUM_FIELDS"""
+        (total_price, total_time, knx, m05, m1p2p, m3p, m4p,
+         modules_total, bornes_count, bornes_space) = sums
+        
         # Calcolo rangées
         rangees = {
-            'standard': modules['total'] * 1.3 / 80 if modules['total'] > 0 else 0,
-            '24m': modules['total'] * 1.3 / 24 if modules['total'] > 0 else 0
+            'standard': modules_total * 1.3 / 80 if modules_total > 0 else 0,
+            '24m': modules_total * 1.3 / 24 if modules_total > 0 else 0
         }
 
         return {
             'total_price': total_price,
             'total_time': total_time,
-            'modules': modules,
-            'bornes': bornes,
+            'modules': {
+                'knx': knx,
+                '0.5m': m05,
+                '1p2p': m1p2p,
+                '3p': m3p,
+                '4p': m4p,
+                'total': modules_total
+            },
+            'bornes': {
+                'count': bornes_count,
+                'space': bornes_space
+            },
             'rangees': rangees
         }
 
+    @staticmethod
+    def sum_contributions(materials_data):
+        """Somma riga per riga in Python (usata per pochi dati e come riferimento)"""
+        sums = [0.0] * len(MATERIAL_SUM_FIELDS)
+        for row in materials_data:
+            contribution = MaterialCalculations.row_contribution(row)
+            if contribution:
+                sums = [total + value for total, value in zip(sums, contribution)]
+        return sums
+
+    @staticmethod
+    def calculate_material_totals(materials_data):
+        """Calcola i totali per i materiali"""
+        columns = MaterialCalculations.material_columns(materials_data)
+        return MaterialCalculations.calculate_material_totals_arrays(**columns)
+
+    @staticmethod
+    def material_columns(materials_data):
+        """Converte le righe (dizionari) in colonne NumPy; i valori mancanti diventano NaN"""
+        rows = [row for row in materials_data if row]
+        columns = {
+            name: np.array([row.get(name) for row in rows], dtype=float)
+            for name in MATERIAL_ARRAY_FIELDS
+        }
+        columns['manufacturer'] = np.array(
+            [MANUFACTURER_CODES.get(row.get('manufacturer'), -1) for row in rows], dtype=np.int16
+        )
+        return columns
+
+    @staticmethod
+    def contribution_arrays(quantity, price, time, num_modules, num_bornes,
+                            tot_bornes_mm, manufacturer):
+        """Contributi di tutte le righe, una riga della matrice per MATERIAL_SUM_FIELDS"""
+        quantity = np.nan_to_num(np.asarray(quantity, dtype=float))
+        price = np.asarray(price, dtype=float)
+        # Come row_contribution: senza quantità o senza prezzo la riga non conta
+        quantity = np.where(np.isnan(price), 0.0, quantity)
+        price = np.nan_to_num(price)
+        modules = np.nan_to_num(np.asarray(num_modules, dtype=float))
+        is_knx = np.asarray(manufacturer) == KNX_CODE
+
+        return np.stack([
+            quantity * price,
+            np.trunc(quantity * np.nan_to_num(np.asarray(time, dtype=float))),
+            np.where(is_knx, quantity * modules, 0.0),
+            np.where(modules == 0.5, quantity, 0.0),
+            np.where((modules == 1) | (modules == 2), quantity, 0.0),
+            np.where(modules == 3, quantity, 0.0),
+            np.where(modules >= 4, quantity, 0.0),
+            quantity * modules,
+            quantity * np.nan_to_num(np.asarray(num_bornes, dtype=float)),
+            quantity * np.nan_to_num(np.asarray(tot_bornes_mm, dtype=float))
+        ])
+
+    @staticmethod
+    def calculate_material_totals_arrays(quantity, price, time, num_modules, num_bornes,
+                                         tot_bornes_mm, manufacturer, groups=None, n_groups=None):
+        """Calcolo vettoriale dei totali a partire da colonne (array o liste).
+
+        manufacturer contiene i codici di MANUFACTURER_CODES. Con groups
+        (indice del quadro per ogni riga) restituisce una lista di totali,
+        uno per gruppo, calcolati nello stesso passaggio.
+        """
+        contributions = MaterialCalculations.contribution_arrays(
+            quantity, price, time, num_modules, num_bornes, tot_bornes_mm, manufacturer
+        )
+        if groups is None:
+            return MaterialCalculations.build_totals(contributions.sum(axis=1).tolist())
+        
+        groups = np.asarray(groups, dtype=np.intp)
+        if n_groups is None:
+            n_groups = int(groups.max()) + 1 if groups.size else 0
+        sums = np.stack([
+            np.bincount(groups, weights=values, minlength=n_groups)
+            for values in contributions
+        ]) if n_groups else np.zeros((len(MATERIAL_SUM_FIELDS), 0))
+        return [MaterialCalculations.build_totals(sums[:, group].tolist())
+                for group in range(n_groups)]
+
+class MaterialTotalsAggregator:
+    """Totali materiali mantenuti in modo incrementale.
+
+    apply() sottrae il contributo della riga prima della modifica e somma
+    quello nuovo, quindi ogni modifica costa O(1) qualunque sia la
+    dimensione del quadro. Con verify_every > 0 ogni N modifiche i totali
+    vengono ricalcolati da records_provider per eliminare gli errori di
+    arrotondamento accumulati; verify_every=1 ricalcola sempre (utile nei test).
+    """
+
+    TOLERANCE = 1e-6
+
+    def __init__(self, records_provider=None, verify_every=0):
+        self.records_provider = records_provider
+        self.verify_every = verify_every
+        self.updates = 0
+        self.mismatches = 0
+        self._sums = [0.0] * len(MATERIAL_SUM_FIELDS)
+
+    def reset(self, records=None):
+        """Ricalcola da zero (dalle righe date o da records_provider)"""
+        if records is None:
+            records = self.records_provider() if self.records_provider else []
+        self._sums = MaterialCalculations.sum_contributions(records)
+
+    def apply(self, old_row, new_row):
+        """Applica la differenza tra la riga prima e dopo la modifica"""
+        old = MaterialCalculations.row_contribution(old_row)
+        new = MaterialCalculations.row_contribution(new_row)
+        if old:
+            self._sums = [total - value for total, value in zip(self._sums, old)]
+        if new:
+            self._sums = [total + value for total, value in zip(self._sums, new)]
+        
+        self.updates += 1
+        if self.verify_every and self.records_provider and self.updates % self.verify_every == 0:
+            self.verify()
+
+    def apply_many(self, changes):
+        """Applica un blocco di coppie (riga prima, riga dopo) con una sola verifica"""
+        sums = self._sums
+        for old_row, new_row in changes:
+            old = MaterialCalculations.row_contribution(old_row)
+            new = MaterialCalculations.row_contribution(new_row)
+            if old:
+                sums = [total - value for total, value in zip(sums, old)]
+            if new:
+                sums = [total + value for total, value in zip(sums, new)]
+        self._sums = sums
+
+        previous = self.updates
+        self.updates += len(changes)
+        if (self.verify_every and self.records_provider
+                and self.updates // self.verify_every != previous // self.verify_every):
+            self.verify()
+
+    def verify(self) -> bool:
+        """Confronta con un ricalcolo completo e corregge eventuali differenze"""
+        running = self._sums
+        self.reset()
+        matches = all(abs(a - b) <= self.TOLERANCE for a, b in zip(running, self._sums))
+        if not matches:
+            self.mismatches += 1
+            logging.warning("Totali incrementali diversi dal ricalcolo completo: corretti")
+        return matches
+
+    def totals(self):
+        return MaterialCalculations.build_totals(self._sums)
+
 class LaborCalculations:
     @staticmethod
     def calculate_labor_cost(labor_data, labor_type):
@@ -72,8 +242,8 @@ class LaborCalculations:
                 continue
             
             hours = float(row['hours'])
-            base_rate = row['rate']
-            coefficient = labor_type.get_coefficient(row['type'])
+            base_rate = row.get('rate', LABOR_BASE_RATES[row['type']])
+            coefficient = LABOR_COEFFICIENTS[labor_type][row['type']]
             total_cost += hours * base_rate * coefficient
             
         return total_cost
@@ -91,3 +261,40 @@ class TotalCalculations:
             'labor_total': labor_cost,
             'final_total': total
         }
+
+    @staticmethod
+    def summary_info(material_totals):
+        """Valori della sezione Info Tableau, con le etichette di SUMMARY_SECTIONS"""
+        modules = material_totals['modules']
+        bornes = material_totals['bornes']
+        rangees = material_totals['rangees']
+        values = [
+            modules['knx'],
+            modules['0.5m'],
+            modules['1p2p'],
+            modules['3p'],
+            modules['4p'],
+            rangees['standard'],
+            rangees['24m'],
+            modules['total'],
+            bornes['count'],
+            bornes['space']
+        ]
+        return dict(zip(SUMMARY_SECTIONS['info_tableau'], map(float, values)))
+
+    @staticmethod
+    def calculate_tableau_totals(materials_data, labor_data, labor_type, material_margin):
+        """Calcola tutti i totali di un quadro a partire dai dati tipizzati"""
+        material_totals = MaterialCalculations.calculate_material_totals(materials_data)
+        return TotalCalculations.combine_tableau_totals(
+            material_totals, labor_data, labor_type, material_margin
+        )
+
+    @staticmethod
+    def combine_tableau_totals(material_totals, labor_data, labor_type, material_margin):
+        """Come calculate_tableau_totals, con i totali materiali già calcolati"""
+        labor_cost = LaborCalculations.calculate_labor_cost(labor_data, labor_type)
+        totals = TotalCalculations.calculate_final_totals(material_totals, labor_cost, material_margin)
+        totals['time_total'] = material_totals['total_time']
+        totals['info'] = TotalCalculations.summary_info(material_totals)
+        return totals
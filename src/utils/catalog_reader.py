@@ -0,0 +1,124 @@
+import csv
+import os
+import unicodedata
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Ordine dei campi restituiti dal lettore (senza il produttore)
+CATALOG_FIELDS = (
+    'reference', 'designation', 'price', 'time', 'num_modules', 'num_bornes',
+    'bornes_mm', 'tot_bornes_mm', 'prix_2s', 'prix_3s'
+)
+
+# Intestazioni accettate nei listini dei produttori, normalizzate
+# (minuscolo, senza accenti né spazi)
+HEADER_ALIASES = {
+    'reference': 'reference', 'ref': 'reference', 'referenceno': 'reference',
+    'referenceno.': 'reference', 'article': 'reference', 'articolo': 'reference',
+    'designation': 'designation', 'description': 'designation', 'descrizione': 'designation',
+    'price': 'price', 'prix': 'price', 'prezzo': 'price',
+    'time': 'time', 'temps': 'time', 'tempsarticle': 'time',
+    'tempsarticle(minutes)': 'time', 'tempo': 'time',
+    'num_modules': 'num_modules', 'numeromodule': 'num_modules', 'modules': 'num_modules',
+    'num_bornes': 'num_bornes', 'bornes': 'num_bornes',
+    'bornes_mm': 'bornes_mm', '1bornemm': 'bornes_mm',
+    'tot_bornes_mm': 'tot_bornes_mm', 'totmmbornes': 'tot_bornes_mm',
+    'prix_2s': 'prix_2s', 'prix2s': 'prix_2s',
+    'prix_3s': 'prix_3s', 'prix3s': 'prix_3s',
+}
+
+NUMERIC_FIELDS = set(CATALOG_FIELDS) - {'reference', 'designation'}
+
+def normalize_header(value) -> str:
+    text = unicodedata.normalize('NFKD', str(value or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return text.lower().replace(' ', '')
+
+def parse_number(value) -> Optional[float]:
+    """Converte un valore del listino in numero (accetta 1'234,50, 1.234,50 e 1,234.50).
+
+    Con sia punto che virgola il separatore decimale è l'ultimo dei due.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value).strip().replace("'", "").replace(" ", "").replace("\u00a0", "")
+    if ',' in text and ('.' not in text or text.rfind(',') > text.rfind('.')):
+        text = text.replace('.', '').replace(',', '.')
+    else:
+        text = text.replace(',', '')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def map_header(header) -> Dict[str, int]:
+    """Restituisce {campo: indice colonna} per le colonne riconosciute"""
+    mapping = {}
+    for idx, name in enumerate(header):
+        field = HEADER_ALIASES.get(normalize_header(name))
+        if field and field not in mapping:
+            mapping[field] = idx
+    if 'reference' not in mapping:
+        raise ValueError("Colonna 'Référence' non trovata nel listino")
+    return mapping
+
+def _convert_rows(rows, mapping) -> Iterator[Tuple]:
+    indices = [mapping.get(field) for field in CATALOG_FIELDS]
+    for row in rows:
+        values = []
+        for field, idx in zip(CATALOG_FIELDS, indices):
+            value = row[idx] if idx is not None and idx < len(row) else None
+            if field in NUMERIC_FIELDS:
+                value = parse_number(value)
+            elif value is not None:
+                value = str(value).strip()
+            values.append(value)
+        if values[0]:
+            yield tuple(values)
+
+def _iter_csv(path) -> Iterator[Tuple]:
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield from _convert_rows(reader, map_header(header))
+
+def _iter_xlsx(path) -> Iterator[Tuple]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield from _convert_rows(rows, map_header(header))
+    finally:
+        workbook.close()
+
+def iter_catalog_rows(path: str) -> Iterator[Tuple]:
+    """Legge un listino CSV o XLSX riga per riga, senza caricarlo in memoria"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return _iter_xlsx(path)
+    if extension in ('.csv', '.txt', '.tsv'):
+        return _iter_csv(path)
+    raise ValueError(f"Formato listino non supportato: {extension}")
+
+def iter_chunks(rows, chunk_size: int) -> Iterator[List[Tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -1,12 +1,105 @@
 
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
-from ..config import COLORS, MANUFACTURERS
+from ..config import APP_CONFIG, COLORS, MANUFACTURERS, SUMMARY_SECTIONS
+from ..models.materials import PRODUCT_FIELDS
+from ..models.project import copy_target_mode
+from .xlsx_writer import XlsxWriter, safe_sheet_name, sheet_xml
+
+EXPORT_BACKENDS = ('streaming', 'parallel', 'pandas')
+
+# Colonne esportate per i materiali, nell'ordine della tabella
+MATERIAL_EXPORT_FIELDS = ('quantity', 'reference') + PRODUCT_FIELDS
+
+# Voci del riepilogo: etichetta -> chiave dei totali di TotalCalculations
+SUMMARY_COST_KEYS = dict(zip(
+    SUMMARY_SECTIONS['costs'], ('material_total', 'time_total', 'labor_total', 'final_total')
+))
+
+MAX_COLUMN_WIDTH = 50
+LABOR_COLUMN_WIDTHS = (30, 15, 15)
+
+def material_rows(tableau, manufacturer):
+    rows = tableau.materials_data.get(manufacturer) or []
+    return [[row.get(name) for name in MATERIAL_EXPORT_FIELDS] for row in rows]
+
+def labor_rows(tableau):
+    return [[row.get('type'), row.get('hours')] for row in tableau.labor_data or []]
+
+def summary_rows(tableau):
+    """Riepilogo del quadro come coppie (voce, valore)"""
+    summary = tableau.summary_data or {}
+    rows = []
+    if 'labor_type' in summary:
+        rows.append(["Main d'Œuvre", summary['labor_type']])
+    if 'margin' in summary:
+        rows.append(["Margine Materiale (%)", summary['margin'] * 100])
+    totals = summary.get('totals') or {}
+    for label, key in SUMMARY_COST_KEYS.items():
+        if key in totals:
+            rows.append([label, totals[key]])
+    info = totals.get('info') or {}
+    for label in SUMMARY_SECTIONS['info_tableau']:
+        if label in info:
+            rows.append([label, info[label]])
+    return rows
+
+def tableau_sheets(tableau_name, tableau):
+    """Fogli di un quadro: (nome, intestazioni, righe, larghezze fisse o None)"""
+    tableau.load()
+    for manufacturer in MANUFACTURERS:
+        rows = material_rows(tableau, manufacturer)
+        if rows:
+            yield (f'{tableau_name} - {manufacturer}', list(MATERIAL_EXPORT_FIELDS), rows, None)
+    rows = labor_rows(tableau)
+    if rows:
+        yield (f'{tableau_name} - Manodopera', ['Type', 'Heures'], rows, LABOR_COLUMN_WIDTHS)
+    rows = summary_rows(tableau)
+    if rows:
+        yield (f'{tableau_name} - Riepilogo', ['Voce', 'Valore'], rows, None)
+
+def column_widths(header, rows):
+    widths = [len(str(value)) for value in header]
+    for row in rows:
+        for idx, value in enumerate(row):
+            length = len(str(value))
+            if length > widths[idx]:
+                widths[idx] = length
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+def render_sheet(sheet_name, header, rows, widths=None):
+    return sheet_name, sheet_xml(header, rows, widths or column_widths(header, rows))
+
+def render_tableau(tableau_name, tableau):
+    """Fogli di un quadro già in XML (eseguita nei processi del backend 'parallel')"""
+    return [render_sheet(*sheet) for sheet in tableau_sheets(tableau_name, tableau)]
 
 class ExcelExporter:
-    def __init__(self, project):
+    """Esporta il progetto in Excel.
+
+    Il backend 'streaming' scrive con openpyxl in modalità write-only: ogni
+    foglio è scritto una sola volta, con stili creati una volta per tutto il
+    file e larghezze delle colonne calcolate mentre si preparano le righe.
+    Il backend 'parallel' prepara l'XML dei fogli di ogni quadro in un pool di
+    processi e li unisce nell'archivio in un solo passaggio, in ordine.
+    Il backend 'pandas' è quello storico (DataFrame e stili cella per cella).
+    """
+
+    def __init__(self, project, backend=None, workers=None):
         self.project = project
+        self.backend = backend or APP_CONFIG['excel_export_backend']
+        self.workers = workers or APP_CONFIG['excel_export_workers'] or os.cpu_count() or 1
+        if self.backend not in EXPORT_BACKENDS:
+            raise ValueError(f"Backend di esportazione sconosciuto: {self.backend}")
         self.setup_styles()
 
     def setup_styles(self):
@@ -20,8 +113,8 @@ class ExcelExporter:
 
         # Stile header
         self.header_fill = PatternFill(
-            start_color=COLORS['primary'].replace('#', ''), 
-            end_color=COLORS['primary'].replace('#', ''), 
+            start_color=COLORS['primary'].replace('#', ''),
+            end_color=COLORS['primary'].replace('#', ''),
             fill_type="solid"
         )
         self.header_font = Font(color="FFFFFF", bold=True)
@@ -39,26 +132,200 @@ class ExcelExporter:
             alignment=Alignment(horizontal='left')
         )
 
+    def info_sheet(self):
+        return ('Info Progetto',
+                ['Progetto', 'Cliente', 'Numero Volta', 'Data Creazione'],
+                [[self.project.name, self.project.client_name,
+                  self.project.volta_number, self.project.creation_date]],
+                None)
+
+    def sheets(self):
+        """Fogli da esportare: (nome, intestazioni, righe, larghezze fisse o None)
+
+        I nomi sono già validi per Excel e unici (safe_sheet_name).
+        """
+        sheets = chain([self.info_sheet()], chain.from_iterable(
+            tableau_sheets(tableau_name, tableau) for tableau_name, tableau in self.project.tableaux.items()))
+        names = []
+        for sheet_name, header, rows, widths in sheets:
+            names.append(safe_sheet_name(sheet_name, names))
+            yield names[-1], header, rows, widths
+
+    def sheet_count(self):
+        """Numero di fogli che verranno scritti (per l'avanzamento)"""
+        count = 1
+        for tableau in self.project.tableaux.values():
+            tableau.load()
+            count += sum(1 for manufacturer in MANUFACTURERS if tableau.materials_data.get(manufacturer))
+            count += bool(labor_rows(tableau)) + bool(summary_rows(tableau))
+        return count
+
     def export(self, filename):
         try:
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                self._write_info_sheet(writer)
-                
-                for tableau_name, tableau in self.project.tableaux.items():
-                    # Scrive un foglio per ogni produttore
-                    for manufacturer in MANUFACTURERS:
-                        self._write_manufacturer_sheet(writer, tableau_name, tableau, manufacturer)
-                    
-                    self._write_labor_sheet(writer, tableau_name, tableau)
-                    self._write_summary_sheet(writer, tableau_name, tableau)
-                
-                self._apply_styles(writer)
-                self._adjust_columns(writer)
-            return True
+            return self.write(filename)
         except Exception as e:
             print(f"Errore durante l'esportazione: {str(e)}")
             return False
 
+    def write(self, filename, progress=None, cancelled=None):
+        """Scrive il file Excel; gli errori sono propagati.
+
+        progress(fatti, totale, nome_foglio) è chiamata dopo ogni foglio;
+        se cancelled() diventa vero l'esportazione si ferma e restituisce
+        False. Il file è scritto in un file temporaneo e sostituito solo
+        alla fine, quindi un'esportazione annullata non lascia file parziali.
+        """
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, tmp_path = tempfile.mkstemp(prefix='.export-', suffix='.xlsx', dir=directory)
+        os.close(fd)
+        try:
+            if self.backend == 'streaming':
+                completed = self._export_streaming(tmp_path, progress, cancelled)
+            elif self.backend == 'parallel':
+                completed = self._export_parallel(tmp_path, progress, cancelled)
+            else:
+                completed = self._export_pandas(tmp_path, progress, cancelled)
+            if completed:
+                copy_target_mode(tmp_path, filename)
+                os.replace(tmp_path, filename)
+            return completed
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # --- Backend streaming (openpyxl write-only) ---
+
+    def _export_streaming(self, filename, progress=None, cancelled=None):
+        workbook = Workbook(write_only=True)
+        header_style = NamedStyle(
+            name='header_style', font=self.header_font, fill=self.header_fill,
+            border=self.border, alignment=Alignment(horizontal='center', vertical='center')
+        )
+        number_style = NamedStyle(
+            name='number_style', number_format=self.number_style.number_format,
+            border=self.border, alignment=self.number_style.alignment
+        )
+        text_style = NamedStyle(name='text_style', border=self.border,
+                                alignment=self.text_style.alignment)
+        for style in (header_style, number_style, text_style):
+            workbook.add_named_style(style)
+
+        total = self.sheet_count() if progress else 0
+        for done, (sheet_name, header, rows, widths) in enumerate(self.sheets(), 1):
+            if cancelled and cancelled():
+                return False
+            sheet = workbook.create_sheet(sheet_name)
+            if widths is None:
+                widths = column_widths(header, rows)
+            # In write-only le larghezze vanno impostate prima delle righe
+            for idx, width in enumerate(widths, 1):
+                sheet.column_dimensions[get_column_letter(idx)].width = width
+
+            sheet.append([self._cell(sheet, 'header_style', value) for value in header])
+            # Una cella già stilizzata per colonna e tipo, riusata in ogni riga:
+            # openpyxl la scrive subito, quindi basta cambiarne il valore
+            numbers = [self._cell(sheet, 'number_style') for _ in header]
+            texts = [self._cell(sheet, 'text_style') for _ in header]
+            for row in rows:
+                cells = []
+                for idx, value in enumerate(row):
+                    cell = numbers[idx] if isinstance(value, (int, float)) else texts[idx]
+                    cell.value = value
+                    cells.append(cell)
+                sheet.append(cells)
+            if progress:
+                progress(done, total, sheet_name)
+        workbook.save(filename)
+        return True
+
+    @staticmethod
+    def _cell(sheet, style, value=None):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.style = style
+        return cell
+
+    # --- Backend parallel (XML dei fogli preparato in più processi) ---
+
+    def _export_parallel(self, filename, progress=None, cancelled=None):
+        total = self.sheet_count() if progress else 0
+        tableaux = list(self.project.tableaux.items())
+        workers = min(self.workers, len(tableaux))
+        # 'spawn' anche su Linux: l'esportazione parte da un thread della GUI
+        executor = (ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                    if workers > 1 else None)
+        # Al massimo due quadri in attesa per processo: la memoria resta
+        # limitata anche se la scrittura dell'archivio è più lenta
+        pending = deque()
+        queued = iter(tableaux)
+
+        def submit():
+            for tableau_name, tableau in queued:
+                # I quadri vanno caricati prima di passarli ai processi
+                tableau.load()
+                pending.append(executor.submit(render_tableau, tableau_name, tableau))
+                if len(pending) >= 2 * workers:
+                    return
+
+        def results():
+            submit()
+            while pending:
+                sheets = pending.popleft().result()
+                submit()
+                yield sheets
+
+        try:
+            with XlsxWriter(filename, COLORS['primary']) as writer:
+                writer.add_sheet(*render_sheet(*self.info_sheet()))
+                if progress:
+                    progress(1, total, 'Info Progetto')
+                if executor is None:
+                    rendered = (render_tableau(name, tableau) for name, tableau in tableaux)
+                else:
+                    rendered = results()
+
+                for sheets in rendered:
+                    if cancelled and cancelled():
+                        return False
+                    for sheet_name, xml in sheets:
+                        sheet_name = writer.add_sheet(sheet_name, xml)
+                        if progress:
+                            progress(len(writer.sheet_names), total, sheet_name)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return True
+
+    # --- Backend pandas ---
+
+    def _export_pandas(self, filename, progress=None, cancelled=None):
+        total = self.sheet_count() if progress else 0
+
+        def report():
+            if progress and writer.sheets:
+                progress(len(writer.sheets), total, list(writer.sheets)[-1])
+
+        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+            self._write_info_sheet(writer)
+            report()
+
+            for tableau_name, tableau in self.project.tableaux.items():
+                if cancelled and cancelled():
+                    return False
+                tableau.load()
+                # Scrive un foglio per ogni produttore
+                for manufacturer in MANUFACTURERS:
+                    self._write_manufacturer_sheet(writer, tableau_name, tableau, manufacturer)
+                    report()
+
+                self._write_labor_sheet(writer, tableau_name, tableau)
+                report()
+                self._write_summary_sheet(writer, tableau_name, tableau)
+                report()
+
+            self._apply_styles(writer)
+            self._adjust_columns(writer)
+        return True
+
     def _write_info_sheet(self, writer):
         info_data = {
             'Progetto': [self.project.name],
@@ -80,12 +347,12 @@ class ExcelExporter:
                 cell.alignment = Alignment(horizontal='left')
 
     def _write_manufacturer_sheet(self, writer, tableau_name, tableau, manufacturer):
-        if manufacturer not in tableau.materials_data or not tableau.materials_data[manufacturer]:
+        rows = material_rows(tableau, manufacturer)
+        if not rows:
             return
 
-        data = tableau.materials_data[manufacturer]
-        df = pd.DataFrame(data)
-        sheet_name = f'{tableau_name} - {manufacturer}'
+        df = pd.DataFrame(rows, columns=list(MATERIAL_EXPORT_FIELDS))
+        sheet_name = safe_sheet_name(f'{tableau_name} - {manufacturer}', writer.sheets)
         df.to_excel(writer, sheet_name=sheet_name, index=False)
 
         # Formattazione colonne
@@ -97,28 +364,29 @@ class ExcelExporter:
                 max((len(str(value)) for value in df[column]), default=0),
                 len(column)
             )
-            sheet.column_dimensions[col_letter].width = min(max_length + 2, 50)
+            sheet.column_dimensions[col_letter].width = min(max_length + 2, MAX_COLUMN_WIDTH)
 
     def _write_labor_sheet(self, writer, tableau_name, tableau):
-        if not tableau.labor_data:
+        rows = labor_rows(tableau)
+        if not rows:
             return
-        
-        df = pd.DataFrame(tableau.labor_data)
-        sheet_name = f'{tableau_name} - Manodopera'
+
+        df = pd.DataFrame(rows, columns=['Type', 'Heures'])
+        sheet_name = safe_sheet_name(f'{tableau_name} - Manodopera', writer.sheets)
         df.to_excel(writer, sheet_name=sheet_name, index=False)
 
         sheet = writer.sheets[sheet_name]
         # Imposta larghezze colonne specifiche per manodopera
-        sheet.column_dimensions['A'].width = 30  # Type
-        sheet.column_dimensions['B'].width = 15  # Heures
-        sheet.column_dimensions['C'].width = 15  # Tarif
+        for idx, width in enumerate(LABOR_COLUMN_WIDTHS, 1):
+            sheet.column_dimensions[get_column_letter(idx)].width = width
 
     def _write_summary_sheet(self, writer, tableau_name, tableau):
-        if not tableau.summary_data:
+        rows = summary_rows(tableau)
+        if not rows:
             return
-        
-        df = pd.DataFrame(tableau.summary_data)
-        sheet_name = f'{tableau_name} - Riepilogo'
+
+        df = pd.DataFrame(rows, columns=['Voce', 'Valore'])
+        sheet_name = safe_sheet_name(f'{tableau_name} - Riepilogo', writer.sheets)
         df.to_excel(writer, sheet_name=sheet_name, index=False)
 
         sheet = writer.sheets[sheet_name]
@@ -132,7 +400,7 @@ class ExcelExporter:
     def _apply_styles(self, writer):
         for sheet_name in writer.sheets:
             sheet = writer.sheets[sheet_name]
-            
+
             # Applica stili all'header
             for cell in sheet[1]:
                 cell.fill = self.header_fill
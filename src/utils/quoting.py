@@ -0,0 +1,155 @@
+import csv
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from ..config import APP_CONFIG, LaborType
+from ..models.database import Database
+from ..models.materials import MaterialRow
+from ..models.project import Project
+from .calculations import TotalCalculations
+
+# Preventivi senza interfaccia grafica: stessi calcoli del riepilogo della
+# finestra principale, applicati ai quadri salvati nei file .volta.
+
+QUOTE_TOTAL_KEYS = ('material_total', 'material_with_margin', 'labor_total', 'final_total', 'time_total')
+QUOTE_CSV_FIELDS = ('file', 'project', 'client', 'volta_number', 'tableau') + QUOTE_TOTAL_KEYS + (
+    'missing_products', 'error')
+
+# Catalogo e data dei prezzi del processo corrente (impostati da init_worker)
+_worker_db = None
+_worker_as_of = None
+
+def tableau_keys(tableau):
+    """Coppie (produttore, referenza) delle righe materiali del quadro"""
+    return [(manufacturer, data['reference'])
+            for manufacturer, rows in (tableau.materials_data or {}).items()
+            for data in rows if data.get('reference')]
+
+def tableau_records(tableau, products=None):
+    """Righe materiali del quadro come record per il motore di calcolo.
+
+    products è {(produttore, referenza): prodotto del catalogo}: i dati della
+    riga vengono aggiornati, quelli salvati restano se la referenza non è
+    più nel catalogo. Restituisce (record, referenze mancanti).
+    """
+    records = []
+    missing = []
+    for manufacturer, rows in (tableau.materials_data or {}).items():
+        for data in rows:
+            row = MaterialRow.from_dict(data)
+            if row.is_empty:
+                continue
+            if products is not None and row.reference:
+                product = products.get((manufacturer, row.reference))
+                if product:
+                    row.apply_product(product)
+                else:
+                    missing.append(row.reference)
+            records.append(dict(row.to_dict(), manufacturer=manufacturer))
+    return records, missing
+
+def quote_tableau(tableau, products=None) -> Dict:
+    """Totali del quadro con tipo di manodopera e margine salvati nel riepilogo"""
+    summary = tableau.summary_data or {}
+    labor_type = next((t for t in LaborType if t.value == summary.get('labor_type')), LaborType.INTERNAL)
+    margin = summary.get('margin', APP_CONFIG['default_margin'] / 100)
+    records, missing = tableau_records(tableau, products)
+    totals = TotalCalculations.calculate_tableau_totals(records, tableau.labor_data or [], labor_type, margin)
+    totals['missing_products'] = missing
+    return totals
+
+def quote_project(filename: str, db: Optional[Database] = None, as_of=None) -> Dict:
+    """Preventivo di un file .volta; con db i prodotti sono ripresi dal catalogo.
+
+    Con as_of (data) si usano i prezzi del catalogo in vigore a quella data.
+    """
+    project = Project.load_from_file(filename)
+    products = None
+    if db is not None:
+        keys = [key for tableau in project.tableaux.values() for key in tableau_keys(tableau)]
+        if as_of is None:
+            # Tutte le referenze del progetto con una sola query
+            products = db.get_products(keys)
+        else:
+            products = {key: db.get_product(key[1], key[0], as_of=as_of) for key in dict.fromkeys(keys)}
+    tableaux = {name: quote_tableau(tableau, products) for name, tableau in project.tableaux.items()}
+    return {
+        'file': filename,
+        'project': project.name,
+        'client': project.client_name,
+        'volta_number': project.volta_number,
+        'tableaux': tableaux,
+        'totals': {key: sum(totals[key] for totals in tableaux.values()) for key in QUOTE_TOTAL_KEYS},
+    }
+
+def init_worker(db_file: Optional[str], as_of=None):
+    global _worker_db, _worker_as_of
+    _worker_db = Database(db_file, seed=False) if db_file else None
+    _worker_as_of = as_of
+
+def close_worker():
+    global _worker_db
+    if _worker_db is not None:
+        _worker_db.close()
+        _worker_db = None
+
+def quote_file(filename: str) -> Dict:
+    """Preventivo di un file nel processo del pool; gli errori diventano risultati"""
+    try:
+        return quote_project(filename, _worker_db, _worker_as_of)
+    except Exception as e:
+        logging.error(f"Errore nel preventivo di {filename}: {str(e)}")
+        return {'file': filename, 'error': str(e)}
+
+def find_projects(paths: Iterable[str]) -> List[str]:
+    """File .volta indicati, cercando anche nelle sottocartelle delle cartelle"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '**', '*.volta'), recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+def quote_projects(files: List[str], db_file: Optional[str] = None, workers: Optional[int] = None,
+                   chunksize: int = 8, as_of=None):
+    """Preventivi di molti progetti in un pool di processi, nell'ordine dei file.
+
+    Ogni processo apre il proprio catalogo (db_file; None = prezzi salvati).
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(files) < 2:
+        init_worker(db_file, as_of)
+        try:
+            yield from map(quote_file, files)
+        finally:
+            close_worker()
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(db_file, as_of)) as executor:
+        yield from executor.map(quote_file, files, chunksize=chunksize)
+
+def csv_rows(results: Iterable[Dict]):
+    """Una riga per quadro (o per progetto in errore), colonne QUOTE_CSV_FIELDS"""
+    for result in results:
+        base = {'file': result['file'], 'project': result.get('project'),
+                'client': result.get('client'), 'volta_number': result.get('volta_number')}
+        if 'error' in result:
+            yield dict(base, error=result['error'])
+            continue
+        for name, totals in result['tableaux'].items():
+            row = dict(base, tableau=name, missing_products=' '.join(totals['missing_products']))
+            row.update((key, totals[key]) for key in QUOTE_TOTAL_KEYS)
+            yield row
+
+def write_csv(results: Iterable[Dict], f) -> int:
+    writer = csv.DictWriter(f, fieldnames=QUOTE_CSV_FIELDS)
+    writer.writeheader()
+    count = 0
+    for row in csv_rows(results):
+        writer.writerow(row)
+        count += 1
+    return count
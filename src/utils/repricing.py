@@ -0,0 +1,132 @@
+import csv
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from ..models import project_format
+from ..models.database import Database
+from ..models.project import Project
+from .quoting import quote_tableau, tableau_keys
+
+# Campi della riga materiale aggiornati dal catalogo
+REPRICE_FIELDS = ('price', 'time', 'prix_2s', 'prix_3s')
+
+REPRICE_REPORT_FIELDS = ('file', 'project', 'tableau', 'manufacturer', 'row', 'reference',
+                         'field', 'old', 'new')
+
+@dataclass
+class RepriceReport:
+    """Esito di un aggiornamento prezzi: una voce per ogni campo cambiato"""
+    projects: int = 0
+    updated: List[str] = field(default_factory=list)
+    changes: List[Dict] = field(default_factory=list)
+    totals: Dict[str, Dict] = field(default_factory=dict)  # file -> final_total prima/dopo
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def __str__(self):
+        return (f"{self.projects} progetti, {len(self.updated)} aggiornati, "
+                f"{len(self.changes)} prezzi cambiati, {len(self.errors)} errori")
+
+    def write_csv(self, f):
+        writer = csv.DictWriter(f, fieldnames=REPRICE_REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(self.changes)
+
+def material_keys(project: Project):
+    """Coppie (produttore, referenza) di tutte le righe materiali del progetto"""
+    for tableau in project.tableaux.values():
+        yield from tableau_keys(tableau)
+
+def reprice_project(project: Project, products: Dict, filename: str = '',
+                    fields=REPRICE_FIELDS) -> List[Dict]:
+    """Copia nelle righe i valori attuali del catalogo; restituisce le differenze.
+
+    I totali salvati nel riepilogo dei quadri modificati vengono ricalcolati.
+    """
+    changes = []
+    for tableau_name, tableau in project.tableaux.items():
+        tableau_changed = False
+        for manufacturer, rows in tableau.materials_data.items():
+            for position, row in enumerate(rows):
+                product = products.get((manufacturer, row.get('reference')))
+                if product is None:
+                    continue
+                for name in fields:
+                    if row.get(name) != product[name]:
+                        changes.append({
+                            'file': filename, 'project': project.name, 'tableau': tableau_name,
+                            'manufacturer': manufacturer, 'row': row.get('row', position),
+                            'reference': row['reference'], 'field': name,
+                            'old': row.get(name), 'new': product[name]
+                        })
+                        row[name] = product[name]
+                        tableau_changed = True
+        if tableau_changed:
+            totals = quote_tableau(tableau)
+            del totals['missing_products']
+            tableau.summary_data = dict(tableau.summary_data or {}, totals=totals)
+    return changes
+
+def project_total(project: Project) -> float:
+    return sum(quote_tableau(tableau)['final_total'] for tableau in project.tableaux.values())
+
+def output_targets(files: List[str], output_dir: str) -> Dict[str, str]:
+    """Percorsi in output_dir dei file, relativi alla cartella comune.
+
+    Mantiene le sottocartelle trovate da find_projects, così progetti con
+    lo stesso nome in cartelle diverse non si sovrascrivono.
+    """
+    if not files:
+        return {}
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files])
+    targets = {}
+    for filename in files:
+        targets[filename] = os.path.join(output_dir, os.path.relpath(os.path.abspath(filename), root))
+    if len(set(targets.values())) < len(files):
+        raise ValueError(f"Più progetti verrebbero scritti nello stesso file di {output_dir}")
+    return targets
+
+def reprice_files(files: List[str], db: Database, output_dir: Optional[str] = None,
+                  dry_run: bool = False, batch_size: int = 500) -> RepriceReport:
+    """Aggiorna i prezzi di molti file .volta dal catalogo.
+
+    Per ogni gruppo di batch_size progetti le referenze di tutte le righe
+    sono risolte con un solo join (Database.lookup_products). I progetti
+    cambiati sono riscritti nello stesso formato (in output_dir se indicata,
+    con le stesse sottocartelle), salvo con dry_run.
+    """
+    report = RepriceReport()
+    targets = output_targets(files, output_dir) if output_dir and not dry_run else {}
+    for start in range(0, len(files), batch_size):
+        projects = {}
+        for filename in files[start:start + batch_size]:
+            report.projects += 1
+            try:
+                projects[filename] = Project.load_from_file(filename)
+            except Exception as e:
+                logging.error(f"Errore nel caricamento di {filename}: {str(e)}")
+                report.errors[filename] = str(e)
+
+        products = db.lookup_products({key for project in projects.values()
+                                        for key in material_keys(project)})
+
+        for filename, project in projects.items():
+            try:
+                before = project_total(project)
+                changes = reprice_project(project, products, filename)
+                if not changes:
+                    continue
+                report.changes.extend(changes)
+                report.totals[filename] = {'old': before, 'new': project_total(project)}
+                if not dry_run:
+                    target = targets.get(filename, filename)
+                    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+                    with open(filename, 'rb') as f:
+                        binary = project_format.is_binary(f.read(len(project_format.MAGIC)))
+                    project.save_to_file(target, 'binary' if binary else 'json')
+                report.updated.append(filename)
+            except Exception as e:
+                logging.error(f"Errore nell'aggiornamento prezzi di {filename}: {str(e)}")
+                report.errors[filename] = str(e)
+    return report
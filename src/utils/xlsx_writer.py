@@ -0,0 +1,164 @@
+import math
+import re
+import zipfile
+from typing import Iterable, List, Sequence
+from xml.sax.saxutils import escape, quoteattr
+
+from openpyxl.utils import get_column_letter
+
+# Scrittura minima di un file .xlsx: fogli con intestazione e righe di valori,
+# tre stili fissi (intestazione, numero, testo) e larghezze delle colonne.
+# L'XML di ogni foglio è indipendente dagli altri (testi inline, indici di
+# stile fissi), quindi i fogli si possono preparare in processi separati e
+# unire poi nell'archivio in un solo passaggio.
+
+HEADER_STYLE = 1
+NUMBER_STYLE = 2
+TEXT_STYLE = 3
+
+_ILLEGAL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Excel: al massimo 31 caratteri, senza []:*?/\ e senza apostrofi ai bordi
+MAX_SHEET_NAME = 31
+_SHEET_NAME_CHARS = re.compile(r'[\[\]:*?/\\\x00-\x1f]')
+
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.'
+
+def _text(value) -> str:
+    return escape(_ILLEGAL_CHARS.sub('', str(value)))
+
+def _cell(ref: str, value, style: int) -> str:
+    if value is None:
+        return f'<c r="{ref}" s="{style}"/>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}" s="{style}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return f'<c r="{ref}" s="{style}"><v>{value!r}</v></c>'
+    return (f'<c r="{ref}" s="{style}" t="inlineStr">'
+            f'<is><t xml:space="preserve">{_text(value)}</t></is></c>')
+
+def sheet_xml(header: Sequence, rows: List[Sequence], widths: Sequence) -> bytes:
+    """XML di un foglio: intestazione, righe (numeri a destra, testo a sinistra)"""
+    letters = [get_column_letter(idx) for idx in range(1, max(len(header), 1) + 1)]
+    parts = [_XML_DECLARATION, f'<worksheet xmlns="{_MAIN_NS}">']
+    if widths:
+        parts.append('<cols>')
+        parts.extend(f'<col min="{idx}" max="{idx}" width="{width}" customWidth="1"/>'
+                     for idx, width in enumerate(widths, 1))
+        parts.append('</cols>')
+    parts.append('<sheetData><row r="1">')
+    parts.extend(_cell(f'{letters[idx]}1', value, HEADER_STYLE) for idx, value in enumerate(header))
+    parts.append('</row>')
+    for number, row in enumerate(rows, 2):
+        parts.append(f'<row r="{number}">')
+        for idx, value in enumerate(row):
+            style = NUMBER_STYLE if isinstance(value, (int, float)) else TEXT_STYLE
+            parts.append(_cell(f'{letters[idx]}{number}', value, style))
+        parts.append('</row>')
+    parts.append('</sheetData></worksheet>')
+    return ''.join(parts).encode('utf-8')
+
+def safe_sheet_name(name: str, existing: Iterable[str] = ()) -> str:
+    """Nome di foglio valido per Excel e diverso (senza maiuscole) da existing.
+
+    Toglie i caratteri non ammessi, tronca a 31 caratteri e, se il nome è
+    già usato, aggiunge un suffisso " (2)", " (3)"... entro lo stesso limite.
+    """
+    base = ' '.join(_SHEET_NAME_CHARS.sub('', str(name)).split()).strip("' ") or 'Foglio'
+    used = {other.casefold() for other in existing}
+    candidate = base[:MAX_SHEET_NAME].rstrip("' ")
+    number = 1
+    while candidate.casefold() in used:
+        number += 1
+        suffix = f' ({number})'
+        candidate = base[:MAX_SHEET_NAME - len(suffix)].rstrip("' ") + suffix
+    return candidate
+
+def _styles_xml(header_color: str) -> str:
+    color = 'FF' + header_color.lstrip('#').upper()
+    thin = '<left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/>'
+    return (
+        f'{_XML_DECLARATION}<styleSheet xmlns="{_MAIN_NS}">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="#,##0.00"/></numFmts>'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font></fonts>'
+        '<fills count="3"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill>'
+        f'<fill><patternFill patternType="solid"><fgColor rgb="{color}"/><bgColor rgb="{color}"/>'
+        '</patternFill></fill></fills>'
+        '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+        f'<border>{thin}</border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="2" borderId="1" xfId="0" applyFont="1" applyFill="1" '
+        'applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="1" xfId="0" applyNumberFormat="1" '
+        'applyBorder="1" applyAlignment="1"><alignment horizontal="right"/></xf>'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="1" xfId="0" applyBorder="1" '
+        'applyAlignment="1"><alignment horizontal="left"/></xf></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    )
+
+class XlsxWriter:
+    """Archivio .xlsx scritto in sequenza: i fogli si aggiungono già in XML.
+
+    Le parti comuni (cartella di lavoro, relazioni, stili) si scrivono alla
+    chiusura, quando sono noti tutti i nomi dei fogli.
+    """
+
+    def __init__(self, filename: str, header_color: str, compresslevel: int = 1):
+        self.header_color = header_color
+        self.sheet_names = []
+        self._zip = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_sheet(self, name: str, xml: bytes) -> str:
+        """Aggiunge un foglio; restituisce il nome usato (vedi safe_sheet_name)"""
+        name = safe_sheet_name(name, self.sheet_names)
+        self.sheet_names.append(name)
+        self._zip.writestr(f'xl/worksheets/sheet{len(self.sheet_names)}.xml', xml)
+        return name
+
+    def close(self):
+        if self._zip is None:
+            return
+        count = len(self.sheet_names)
+        sheets = ''.join(f'<sheet name={quoteattr(name)} sheetId="{idx}" r:id="rId{idx}"/>'
+                         for idx, name in enumerate(self.sheet_names, 1))
+        overrides = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{idx}.xml" ContentType="{_CONTENT_TYPE}worksheet+xml"/>'
+            for idx in range(1, count + 1))
+        relations = ''.join(
+            f'<Relationship Id="rId{idx}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{idx}.xml"/>'
+            for idx in range(1, count + 1))
+        self._zip.writestr('[Content_Types].xml', (
+            f'{_XML_DECLARATION}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            f'<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{_CONTENT_TYPE}sheet.main+xml"/>'
+            f'<Override PartName="/xl/styles.xml" ContentType="{_CONTENT_TYPE}styles+xml"/>'
+            f'{overrides}</Types>'))
+        self._zip.writestr('_rels/.rels', (
+            f'{_XML_DECLARATION}<Relationships xmlns="{_PACKAGE_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'))
+        self._zip.writestr('xl/workbook.xml', (
+            f'{_XML_DECLARATION}<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+            f'<sheets>{sheets}</sheets></workbook>'))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', (
+            f'{_XML_DECLARATION}<Relationships xmlns="{_PACKAGE_REL_NS}">{relations}'
+            f'<Relationship Id="rId{count + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>'))
+        self._zip.writestr('xl/styles.xml', _styles_xml(self.header_color))
+        self._zip.close()
+        self._zip = None
@@ -1,6 +1,24 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from datetime import date
+from unittest import mock
 from src.models import Project, TableauElectrique, Database
-from src.config import MANUFACTURERS
+from src.models.database import CATALOG_QUERIES, SCHEMA_VERSION, UPSERT_PRODUCT_SQL
+from src.models.catalog_search import SEARCH_PREFIX_SQL
+from src.models import project_format
+from src.models.materials import MaterialRow, parse_pasted_rows, parse_quantity
+from src.config import MANUFACTURERS, LaborType
+from src.utils.calculations import MaterialCalculations, MaterialTotalsAggregator, TotalCalculations
+from src.utils.export import ExcelExporter, EXPORT_BACKENDS
+from src.utils.xlsx_writer import safe_sheet_name
+from src.utils import quoting, repricing
+from src.utils.catalog_reader import parse_number
+from openpyxl import load_workbook
 
 class TestVoltaPlus(unittest.TestCase):
     def setUp(self):
@@ -29,5 +47,905 @@ class TestVoltaPlus(unittest.TestCase):
         self.assertIn("Test Tableau", self.project.tableaux)
         self.assertEqual(len(self.project.tableaux), 1)
 
+class TestDatabaseSchema(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmpdir.name, 'catalog.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_catalog_survives_reopen(self):
+        """Il catalogo non viene cancellato né ricaricato alla riapertura"""
+        Database(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute("UPDATE products SET price = 1.0 WHERE reference = 'A9F74206'")
+
+        db = Database(self.db_file)
+        self.assertEqual(db.get_product('A9F74206', 'Schneider')['price'], 1.0)
+
+    def test_schema_version(self):
+        """Lo schema viene portato all'ultima versione"""
+        Database(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            self.assertEqual(Database.get_schema_version(conn), SCHEMA_VERSION)
+
+    def test_no_seed(self):
+        """Senza seed il catalogo resta vuoto"""
+        db = Database(self.db_file, seed=False)
+        self.assertEqual(db.get_products_by_manufacturer('Schneider'), [])
+
+    def test_import_catalog_csv(self):
+        """Importa un listino CSV e aggiorna i prodotti esistenti"""
+        csv_file = os.path.join(self.tmpdir.name, 'listino.csv')
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("Référence No.;Désignation;Prix;Temps Article (minutes);Numero Module\n")
+            f.write("A9F74206;iC60N 2P C 6A;1'045,60;15;2\n")
+            f.write("NEW001;Nuovo prodotto;12,50;5;1\n")
+
+        db = Database(self.db_file)
+        report = db.import_catalog(csv_file, 'Schneider', chunk_size=1)
+
+        self.assertEqual(report.rows, 2)
+        self.assertEqual(db.get_product('A9F74206', 'Schneider')['price'], 1045.60)
+        self.assertEqual(db.get_product('NEW001', 'Schneider')['designation'], 'Nuovo prodotto')
+        self.assertEqual(db.search_products('nuovo', 'Schneider'), [('NEW001', 'Nuovo prodotto')])
+
+    def test_parse_catalog_numbers(self):
+        """Formati numerici dei listini: il separatore decimale è l'ultimo tra punto e virgola"""
+        for text, expected in (("1.234,50", 1234.5), ("1,234.50", 1234.5), ("1'234,50", 1234.5),
+                               ("1 234,50", 1234.5), ("12,5", 12.5), ("1234.50", 1234.5)):
+            self.assertEqual(parse_number(text), expected, text)
+        self.assertIsNone(parse_number("n.d."))
+
+    def test_failed_import_keeps_search_index(self):
+        """Un import fallito annulla tutto, compresa la sospensione dei trigger di ricerca"""
+        csv_file = os.path.join(self.tmpdir.name, 'listino.csv')
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("Désignation;Prix\nSenza referenza;1,00\n")
+
+        db = Database(self.db_file)
+        with self.assertRaises(ValueError):
+            db.import_catalog(csv_file, 'Schneider')
+        triggers = db.connection().execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'products_fts_%'"
+        ).fetchone()[0]
+        self.assertEqual(triggers, 3)
+
+        db.update_product('SP003', 'Swisspro', designation='Variateur LED')
+        self.assertEqual(db.search_products('variateur', 'Swisspro'), [('SP003', 'Variateur LED')])
+
+    def test_price_history(self):
+        """I prezzi cambiati restano nello storico e si leggono a una data"""
+        csv_file = os.path.join(self.tmpdir.name, 'listino.csv')
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("Référence No.;Prix\nA9F74206;50,00\nNEW001;12,50\n")
+
+        db = Database(self.db_file)
+        db.import_catalog(csv_file, 'Schneider', valid_from='2025-03-01')
+        db.update_product('A9F74206', 'Schneider', price=55.0, valid_from=date(2025, 9, 1))
+
+        def price(reference, as_of):
+            product = db.get_product(reference, 'Schneider', as_of=as_of)
+            return product and product['price']
+
+        self.assertEqual(price('A9F74206', '2024-12-31'), 45.60)
+        self.assertEqual(price('A9F74206', '2025-03-01'), 50.0)
+        self.assertEqual(price('A9F74206', '2025-08-31'), 50.0)
+        self.assertEqual(price('A9F74206', '2026-01-01'), 55.0)
+        self.assertIsNone(price('NEW001', '2025-02-28'))
+        self.assertEqual(price('NEW001', '2025-03-01'), 12.50)
+        self.assertEqual(db.get_product('A9F74206', 'Schneider')['price'], 55.0)
+
+    def test_backdated_price(self):
+        """Un prezzo retrodatato non sostituisce quello con validità successiva"""
+        csv_file = os.path.join(self.tmpdir.name, 'listino.csv')
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("Référence No.;Prix\nA9F74206;42,00\nA9F74210;49,90\n")
+
+        db = Database(self.db_file)
+        db.update_product('A9F74206', 'Schneider', price=50.0, valid_from='2026-01-01')
+        db.update_product('A9F74206', 'Schneider', price=40.0, valid_from='2025-06-01')
+        self.assertEqual(db.get_product('A9F74206', 'Schneider')['price'], 50.0)
+        self.assertEqual(db.get_product('A9F74206', 'Schneider', as_of='2025-12-31')['price'], 40.0)
+
+        db.import_catalog(csv_file, 'Schneider', valid_from='2025-09-01')
+        self.assertEqual(db.get_product('A9F74206', 'Schneider')['price'], 50.0)
+        # Il listino ha solo referenza e prezzo: gli altri campi restano
+        product = db.get_product('A9F74210', 'Schneider')
+        self.assertEqual((product['designation'], product['num_modules'], product['prix_2s']),
+                         ('iC60N 2P C 10A', 2, 53.80))
+        self.assertEqual(db.get_product('A9F74206', 'Schneider', as_of='2025-12-31')['price'], 42.0)
+        self.assertEqual(db.get_product('A9F74210', 'Schneider')['price'], 49.90)
+
+    def test_future_dated_price_list(self):
+        """Un listino con data futura cambia i prezzi attuali solo da quella data"""
+        csv_file = os.path.join(self.tmpdir.name, 'listino.csv')
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("Référence No.;Prix\nA9F74206;99,00\n")
+
+        db = Database(self.db_file)
+        db.import_catalog(csv_file, 'Schneider', valid_from='2099-01-01')
+        db.update_product('A9F74210', 'Schneider', price=88.0, valid_from='2099-01-01')
+        self.assertEqual(db.get_product('A9F74206', 'Schneider')['price'], 45.60)
+        self.assertEqual(db.get_product('A9F74210', 'Schneider')['price'], 48.90)
+        self.assertEqual(db.get_product('A9F74206', 'Schneider', as_of='2099-01-01')['price'], 99.0)
+
+        self.assertEqual(db.apply_due_prices(today='2098-12-31'), 0)
+        self.assertEqual(db.apply_due_prices(today='2099-01-01'), 2)
+        self.assertEqual(db.get_product('A9F74206', 'Schneider')['price'], 99.0)
+        self.assertEqual(db.get_product('A9F74210', 'Schneider')['price'], 88.0)
+
+    def test_get_products_batch(self):
+        """Molte referenze in una chiamata: None per le mancanti, poi dalla cache"""
+        db = Database(self.db_file)
+        keys = [('Hager', 'HTS263E'), ('KNX', 'MTN6003-0002'), ('Hager', 'NOPE'), ('Hager', 'HTS263E')]
+        products = db.get_products(keys)
+        self.assertEqual(list(products), keys[:3])
+        self.assertEqual(products[('KNX', 'MTN6003-0002')]['price'], 420.0)
+        self.assertIsNone(products[('Hager', 'NOPE')])
+
+        products[('Hager', 'HTS263E')]['price'] = 0
+        hits = db.product_cache.hits
+        self.assertEqual(db.get_products(keys)[('Hager', 'HTS263E')]['price'], 62.30)
+        self.assertEqual(db.product_cache.hits, hits + 3)
+
+    def test_memory_database_shared_between_threads(self):
+        """Il database in memoria è visibile anche dalle connessioni degli altri thread"""
+        with Database(':memory:') as db:
+            results = []
+            worker = threading.Thread(
+                target=lambda: results.append(db.get_product('SP001', 'Swisspro'))
+            )
+            worker.start()
+            worker.join()
+            self.assertEqual(results[0]['designation'], 'Presa T13')
+
+    def test_closed_database(self):
+        """Dopo close() il catalogo non si riapre (in memoria sarebbe vuoto)"""
+        db = Database(':memory:')
+        db.close()
+        db.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            db.connection()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            db.search_products('HTS', 'Hager')
+
+    def test_catalog_queries_use_indexes(self):
+        """Nessuna query del catalogo deve fare una scansione completa o un ordinamento temporaneo"""
+        with Database(self.db_file) as db:
+            for name, (sql, params) in CATALOG_QUERIES.items():
+                plan = db.explain_query_plan(sql, params)
+                for detail in plan:
+                    if 'VIRTUAL TABLE' in detail:
+                        continue  # l'indice FTS5 viene sempre interrogato così
+                    if name == 'search_fts' and detail == 'USE TEMP B-TREE FOR ORDER BY':
+                        continue  # ordinamento per bm25 delle corrispondenze FTS5
+                    self.assertFalse(detail.startswith('SCAN'), f"{name}: {plan}")
+                    self.assertNotIn('TEMP B-TREE', detail, f"{name}: {plan}")
+
+    def test_product_cache(self):
+        """Le ricerche ripetute usano la cache, invalidata dagli aggiornamenti di prezzo"""
+        with Database(self.db_file) as db:
+            db.get_product('HTS263E', 'Hager')
+            db.get_product('HTS263E', 'Hager')
+            db.get_product('INESISTENTE', 'Hager')
+            db.get_product('INESISTENTE', 'Hager')
+            self.assertEqual(db.product_cache.hits, 2)
+            self.assertEqual(db.product_cache.misses, 2)
+
+            db.update_product('HTS263E', 'Hager', price=70.0)
+            self.assertEqual(db.get_product('HTS263E', 'Hager')['price'], 70.0)
+
+    def test_search_products(self):
+        """La ricerca mette prima le referenze per prefisso, poi le designazioni"""
+        with Database(self.db_file) as db:
+            results = db.search_products('a9f7421', 'Schneider')
+            self.assertEqual([ref for ref, _ in results], ['A9F74210', 'A9F74216'])
+
+            results = db.search_products('Power Supply', 'KNX')
+            self.assertEqual(results[0][0], 'MTN6725-0001')
+
+            db.update_product('SP003', 'Swisspro', designation='Variateur LED')
+            self.assertEqual(db.search_products('variateur', 'Swisspro')[0][0], 'SP003')
+
+            # Termini sotto i 3 caratteri dell'indice trigram: filtrati con LIKE
+            self.assertEqual(db.search_products('C 6A', 'Schneider'),
+                             [('A9F74206', 'iC60N 2P C 6A'), ('A9F74216', 'iC60N 2P C 16A')])
+            self.assertEqual([ref for ref, _ in db.search_products('iC60N 2P 10', 'Schneider')], ['A9F74210'])
+            self.assertEqual(db.search_products('iC60N 3P', 'Schneider'), [])
+            self.assertEqual(db.search_products('%', 'Schneider'), [])
+
+    def test_search_ranking(self):
+        """Prefisso senza maiuscole/minuscole; i candidati FTS5 sono i migliori per bm25"""
+        db = Database(':memory:')
+        conn = db.connection()
+        with conn:
+            conn.executemany(UPSERT_PRODUCT_SQL, [
+                (f'X{i:03d}', f'Morsetto DIN {i}', 1.0, 1, 1, 1, 0, 0, 0, 0, 'Prova') for i in range(5)
+            ] + [('PDIN1', 'Guida', 1.0, 1, 1, 1, 0, 0, 0, 0, 'Prova'),
+                 ('rail-35', 'Guida', 1.0, 1, 1, 1, 0, 0, 0, 0, 'Prova')])
+
+        self.assertEqual(conn.execute(SEARCH_PREFIX_SQL, ('Prova', 'RAIL', 'RAIL\uffff', 20)).fetchall(),
+                         [('rail-35', 'Guida')])
+        # Con due soli candidati, quelli in ordine di rowid non conterrebbero PDIN1
+        with mock.patch('src.models.catalog_search.FTS_CANDIDATES', 2):
+            self.assertEqual(db.search_products('din', 'Prova', limit=1), [('PDIN1', 'Guida')])
+
+class TestProjectFile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'progetto.volta')
+        self.project = Project(name="P", client_name="C", volta_number="V1")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_dirty_tracking(self):
+        """Il progetto è da salvare solo dopo una modifica"""
+        self.assertFalse(self.project.is_dirty)
+        self.project.add_tableau("Q1")
+        self.assertTrue(self.project.is_dirty)
+        revision = self.project.revision
+        self.project.mark_dirty()
+        # Un salvataggio di una revisione precedente lascia il progetto da salvare
+        self.project.mark_saved(revision)
+        self.assertTrue(self.project.is_dirty)
+        self.project.save_to_file(self.filename)
+        self.assertFalse(self.project.is_dirty)
+        self.assertEqual(Project.load_from_file(self.filename).tableaux.keys(), {"Q1"})
+
+    def test_failed_write_keeps_previous_file(self):
+        """Un errore durante la scrittura non tronca il file esistente"""
+        self.project.add_tableau("Q1")
+        self.project.save_to_file(self.filename)
+        data = self.project.snapshot()
+        data['tableaux']['Q1']['materials_data'] = {'ABB': [object()]}
+        with self.assertRaises(TypeError):
+            Project.write_snapshot(data, self.filename)
+        self.assertEqual(Project.load_from_file(self.filename).tableaux.keys(), {"Q1"})
+        self.assertEqual(os.listdir(self.tmpdir.name), ['progetto.volta'])
+
+    def test_journal_only_for_own_file(self):
+        """Il giornale si usa solo se il file è quello dell'ultimo salvataggio completo"""
+        self.project.add_tableau("Q1")
+        self.project.save_to_file(self.filename)
+        self.assertEqual(self.project.filename, os.path.abspath(self.filename))
+        loaded = Project.load_from_file(self.filename)
+        self.assertEqual(loaded.filename, os.path.abspath(self.filename))
+
+        # Un altro progetto salvato nel frattempo con lo stesso nome di file
+        other = os.path.join(self.tmpdir.name, 'altro.volta')
+        self.project.save_to_file(other)
+        self.assertTrue(self.project.journal_ready(other))
+        Project(name="P", client_name="X", volta_number="V2").save_to_file(other)
+        self.assertFalse(self.project.journal_ready(other))
+
+        # Le modifiche non finiscono nel giornale dell'altro progetto: si riscrive tutto
+        self.project.record_row("Q1", 'Hager', 0, MaterialRow(1.0, 'HTS263E').to_dict())
+        self.project.mark_dirty()
+        self.project.save_changes(other)
+        self.assertFalse(os.path.exists(other + '.journal'))
+        self.assertEqual(Project.load_from_file(other).client_name, "C")
+
+    @unittest.skipIf(os.name == 'nt', "permessi POSIX")
+    def test_save_keeps_file_mode(self):
+        """Il salvataggio atomico non restringe i permessi del file"""
+        umask = os.umask(0o022)
+        try:
+            self.project.save_to_file(self.filename)
+            self.assertEqual(os.stat(self.filename).st_mode & 0o777, 0o644)
+            os.chmod(self.filename, 0o664)
+            self.project.save_to_file(self.filename)
+            self.assertEqual(os.stat(self.filename).st_mode & 0o777, 0o664)
+        finally:
+            os.umask(umask)
+
+    def test_binary_format_roundtrip(self):
+        """Il formato binario rilegge gli stessi dati del formato JSON"""
+        tableau = self.project.add_tableau("Q1")
+        tableau.materials_data = {'Hager': [
+            dict(MaterialRow(2.0, 'HTS263E', price=45.5, time=15).to_dict(), row=0),
+            dict(MaterialRow(1.0, 'XYZ').to_dict(), row=3),
+        ]}
+        tableau.labor_data = [{'type': 'Pose', 'hours': 2.5}]
+        tableau.summary_data = {'labor_type': LaborType.BKW.value, 'margin': 0.3}
+
+        self.project.save_to_file(self.filename, 'binary')
+        with open(self.filename, 'rb') as f:
+            self.assertTrue(project_format.is_binary(f.read()))
+        loaded = Project.load_from_file(self.filename)
+        self.assertEqual(loaded.tableaux["Q1"], tableau)
+
+    def test_lazy_load_reads_tableaux_on_demand(self):
+        """Intestazione e elenco dei quadri senza decodificare i dati"""
+        for i in range(3):
+            tableau = self.project.add_tableau(f"Q{i}")
+            tableau.materials_data = {'ABB': [dict(MaterialRow(float(i), f"R{i}é").to_dict(), row=0)]}
+            tableau.summary_data = {'margin': 0.1 * i}
+
+        for file_format in project_format.FILE_FORMATS:
+            self.project.save_to_file(self.filename, file_format)
+            header = project_format.read_project_header(self.filename)
+            self.assertEqual(header['volta_number'], "V1")
+
+            loaded = Project.load_from_file(self.filename, lazy=True)
+            self.assertEqual(list(loaded.tableaux), ["Q0", "Q1", "Q2"])
+            self.assertFalse(loaded.tableaux["Q1"].is_loaded)
+            loaded.tableaux["Q1"].load()
+            self.assertEqual(loaded.tableaux["Q1"], self.project.tableaux["Q1"])
+            self.assertFalse(loaded.tableaux["Q2"].is_loaded)
+            self.assertEqual(loaded.to_dict(), self.project.to_dict())
+
+    def test_lazy_load_header_after_tableaux(self):
+        """Intestazione scritta dopo i quadri (altro ordine delle chiavi): letta comunque"""
+        self.project.add_tableau("Q1").summary_data = {'margin': 0.2}
+        self.project.journal_id = "j1"
+        data = self.project.to_dict()
+        tableaux = data.pop('tableaux')
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(dict({'name': data.pop('name'), 'tableaux': tableaux}, **data), f)
+
+        self.assertEqual(project_format.read_project_header(self.filename)['journal_id'], "j1")
+        loaded = Project.load_from_file(self.filename, lazy=True)
+        self.assertEqual((loaded.name, loaded.client_name, loaded.journal_id), ("P", "C", "j1"))
+        loaded.tableaux["Q1"].load()
+        self.assertEqual(loaded.tableaux["Q1"].summary_data, {'margin': 0.2})
+
+    def test_journal_replay(self):
+        """Le modifiche salvate nel giornale sono riapplicate al caricamento"""
+        self.project.add_tableau("Q1")
+        self.project.save_to_file(self.filename)
+        size = os.path.getsize(self.filename)
+
+        row = MaterialRow(2.0, 'HTS263E', price=45.5).to_dict()
+        self.project.record_row("Q1", 'Hager', 4, row)
+        self.project.record_row("Q1", 'Hager', 7, row)
+        self.project.record_row("Q1", 'Hager', 4, None)
+        self.project.record_settings("Q1", [{'type': 'Pose', 'hours': 3.0}], {'margin': 0.2})
+        self.project.mark_dirty()
+        self.project.save_changes(self.filename)
+        self.assertEqual(os.path.getsize(self.filename), size)
+        self.assertFalse(self.project.is_dirty)
+
+        # Riga troncata da un'interruzione: le modifiche precedenti restano valide
+        with open(self.filename + '.journal', 'a', encoding='utf-8') as f:
+            f.write('{"op": "row", "tabl')
+
+        loaded = Project.load_from_file(self.filename)
+        tableau = loaded.tableaux["Q1"]
+        self.assertEqual(tableau.materials_data, {'Hager': [dict(row, row=7)]})
+        self.assertEqual(tableau.labor_data, [{'type': 'Pose', 'hours': 3.0}])
+        self.assertEqual(tableau.summary_data['margin'], 0.2)
+        self.assertTrue(loaded.needs_snapshot)
+
+        # Il salvataggio completo azzera il giornale
+        loaded.save_to_file(self.filename)
+        self.assertFalse(os.path.exists(self.filename + '.journal'))
+        self.assertEqual(Project.load_from_file(self.filename).tableaux["Q1"], tableau)
+
+class TestExcelExport(unittest.TestCase):
+    def test_backends_write_same_cells(self):
+        """Il backend streaming scrive gli stessi fogli e valori del backend pandas"""
+        project = Project(name="P", client_name="C", volta_number="V1")
+        tableau = project.add_tableau("Q1")
+        tableau.materials_data = {'Hager': [dict(MaterialRow(2.0, 'HTS263E', price=45.5).to_dict(), row=0)]}
+        tableau.labor_data = [{'type': 'Pose', 'hours': 2.5}]
+        tableau.summary_data = {'labor_type': LaborType.INTERNAL.value, 'margin': 0.25,
+                                'totals': TotalCalculations.calculate_tableau_totals(
+                                    [], tableau.labor_data, LaborType.INTERNAL, 0.25)}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            workbooks = {}
+            for backend in EXPORT_BACKENDS:
+                filename = os.path.join(tmpdir, f"{backend}.xlsx")
+                self.assertTrue(ExcelExporter(project, backend=backend, workers=2).export(filename))
+                workbook = load_workbook(filename)
+                workbooks[backend] = {
+                    name: [[cell.value for cell in row] for row in workbook[name].iter_rows()]
+                    for name in workbook.sheetnames
+                }
+            self.assertEqual(workbooks['streaming'], workbooks['pandas'])
+            self.assertEqual(workbooks['parallel'], workbooks['pandas'])
+            self.assertIn(["Total Final", 178.125], workbooks['streaming']['Q1 - Riepilogo'])
+
+    def test_long_tableau_names(self):
+        """Nomi dei fogli validi per Excel: senza caratteri vietati, 31 caratteri, unici"""
+        self.assertEqual(safe_sheet_name('A/B: [C]*?'), 'AB C')
+        self.assertEqual(safe_sheet_name('q1 - hager', ['Q1 - Hager']), 'q1 - hager (2)')
+
+        project = Project(name="P", client_name="C", volta_number="V1")
+        for name in ("Quadro generale piano terra / lato nord", "Quadro generale piano terra / lato sud"):
+            project.add_tableau(name).labor_data = [{'type': 'Pose', 'hours': 1.0}]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for backend in EXPORT_BACKENDS:
+                filename = os.path.join(tmpdir, f"{backend}.xlsx")
+                self.assertTrue(ExcelExporter(project, backend=backend, workers=2).write(filename))
+                self.assertEqual(load_workbook(filename, read_only=True).sheetnames, [
+                    'Info Progetto', 'Quadro generale piano terra lat',
+                    'Quadro generale piano terra (2)',
+                ])
+
+    def test_progress_and_cancel(self):
+        """Avanzamento per foglio; un'esportazione annullata non lascia file"""
+        project = Project(name="P", client_name="C", volta_number="V1")
+        for name in ("Q1", "Q2"):
+            project.add_tableau(name).labor_data = [{'type': 'Pose', 'hours': 1.0}]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for backend in EXPORT_BACKENDS:
+                exporter = ExcelExporter(project, backend=backend, workers=2)
+                filename = os.path.join(tmpdir, f"{backend}.xlsx")
+                steps = []
+                self.assertTrue(exporter.write(filename, progress=lambda *step: steps.append(step)))
+                self.assertEqual(steps[-1], (3, 3, 'Q2 - Manodopera'))
+
+                cancelled = os.path.join(tmpdir, f"{backend}-cancelled.xlsx")
+                self.assertFalse(exporter.write(cancelled, cancelled=lambda: True))
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             sorted(f"{backend}.xlsx" for backend in EXPORT_BACKENDS))
+
+    @unittest.skipIf(os.name == 'nt', "permessi POSIX")
+    def test_export_file_mode(self):
+        """Il file esportato ha i permessi predefiniti, non quelli del file temporaneo"""
+        project = Project(name="P", client_name="C", volta_number="V1")
+        project.add_tableau("Q1")
+        umask = os.umask(0o022)
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                filename = os.path.join(tmpdir, "export.xlsx")
+                self.assertTrue(ExcelExporter(project).write(filename))
+                self.assertEqual(os.stat(filename).st_mode & 0o777, 0o644)
+        finally:
+            os.umask(umask)
+
+class TestQuoting(unittest.TestCase):
+    def test_quote_projects(self):
+        """Preventivi senza GUI: prezzi dal catalogo, ordine dei file, errori per file"""
+        project = Project(name="P", client_name="C", volta_number="V1")
+        tableau = project.add_tableau("Q1")
+        tableau.materials_data = {'Hager': [dict(MaterialRow(2.0, 'HTS263E', price=1.0).to_dict(), row=0),
+                                            dict(MaterialRow(1.0, 'OLD1', price=10.0).to_dict(), row=1)]}
+        tableau.labor_data = [{'type': 'Schéma', 'hours': 2.0}]
+        tableau.summary_data = {'labor_type': LaborType.INTERNAL.value, 'margin': 0.25}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "p.volta")
+            project.save_to_file(filename)
+            broken = os.path.join(tmpdir, "broken.volta")
+            with open(broken, 'w') as f:
+                f.write('{')
+
+            with Database(':memory:') as db:
+                result = quoting.quote_project(filename, db)
+            totals = result['tableaux']['Q1']
+            self.assertAlmostEqual(totals['material_total'], 2 * 62.30 + 10.0)
+            self.assertAlmostEqual(totals['labor_total'], 192.0)
+            self.assertEqual(totals['missing_products'], ['OLD1'])
+
+            results = list(quoting.quote_projects([filename, broken, filename], workers=2))
+            self.assertEqual([r['file'] for r in results], [filename, broken, filename])
+            self.assertIn('error', results[1])
+            self.assertAlmostEqual(results[2]['totals']['material_total'], 12.0)
+
+    def test_reprice_files(self):
+        """Aggiornamento prezzi: un join per tutti i progetti, differenze e totali nuovi"""
+        db = Database(':memory:')
+        products = db.lookup_products([('Hager', 'HTS263E'), ('KNX', 'HTS263E'), ('Hager', 'OLD1')])
+        self.assertEqual(list(products), [('Hager', 'HTS263E')])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = []
+            for name in ("P1", "P2"):
+                project = Project(name=name, client_name="C", volta_number="V1")
+                project.add_tableau("Q1").materials_data = {'Hager': [
+                    dict(MaterialRow(2.0, 'HTS263E').to_dict(), **db.get_product('HTS263E', 'Hager'), row=0)
+                ]}
+                files.append(os.path.join(tmpdir, f"{name}.volta"))
+                project.save_to_file(files[-1])
+
+            db.update_product('HTS263E', 'Hager', price=70.0)
+            report = repricing.reprice_files(files, db)
+            self.assertEqual(report.updated, files)
+            self.assertEqual([(c['field'], c['old'], c['new']) for c in report.changes],
+                             [('price', 62.30, 70.0)] * 2)
+
+            tableau = Project.load_from_file(files[0]).tableaux["Q1"]
+            self.assertEqual(tableau.materials_data['Hager'][0]['price'], 70.0)
+            self.assertAlmostEqual(tableau.summary_data['totals']['material_total'], 140.0)
+            self.assertEqual(repricing.reprice_files(files, db).changes, [])
+
+    def test_reprice_output_dir_keeps_subfolders(self):
+        """Progetti omonimi in sottocartelle diverse non si sovrascrivono in output_dir"""
+        db = Database(':memory:')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for client in ("A", "B"):
+                os.makedirs(os.path.join(tmpdir, 'in', client))
+                project = Project(name="P", client_name=client, volta_number="V1")
+                project.add_tableau("Q1").materials_data = {'Hager': [
+                    dict(MaterialRow(1.0, 'HTS263E').to_dict(), **db.get_product('HTS263E', 'Hager'), row=0)
+                ]}
+                project.save_to_file(os.path.join(tmpdir, 'in', client, "P.volta"))
+            db.update_product('HTS263E', 'Hager', price=70.0)
+
+            files = quoting.find_projects([os.path.join(tmpdir, 'in')])
+            output_dir = os.path.join(tmpdir, 'out')
+            report = repricing.reprice_files(files, db, output_dir=output_dir)
+            self.assertEqual(report.errors, {})
+            for client in ("A", "B"):
+                project = Project.load_from_file(os.path.join(output_dir, client, "P.volta"))
+                self.assertEqual(project.client_name, client)
+                self.assertEqual(project.tableaux["Q1"].materials_data['Hager'][0]['price'], 70.0)
+
+            with self.assertRaises(ValueError):
+                repricing.reprice_files(files + files[:1], db, output_dir=output_dir)
+
+class TestMaterialRow(unittest.TestCase):
+    def test_totals_from_product(self):
+        """La riga copia i dati del prodotto e calcola i totali"""
+        db = Database(':memory:')
+        row = MaterialRow(quantity=parse_quantity('2,5'), reference='HTS263E')
+        row.apply_product(db.get_product('HTS263E', 'Hager'))
+        self.assertAlmostEqual(row.total_price, 155.75)
+        self.assertEqual(row.total_time, 50)
+        self.assertEqual(MaterialRow.from_dict(row.to_dict()), row)
+
+    def test_parse_pasted_rows(self):
+        """Blocco copiato da Excel: quantità e referenze, colonne in più ignorate"""
+        text = '2\tHTS263E\tInterruttore\r\n1,5\t SP001 \r\n\r\nqtà\tA9F74206\r\n'
+        self.assertEqual(parse_pasted_rows(text), [
+            {'quantity': 2.0, 'reference': 'HTS263E'},
+            {'quantity': 1.5, 'reference': 'SP001'},
+            {},
+            {'reference': 'A9F74206'},
+        ])
+        self.assertEqual(parse_pasted_rows('HTS263E\t3\n', first_column=1), [{'reference': 'HTS263E'}])
+
+class TestCalculations(unittest.TestCase):
+    def setUp(self):
+        db = Database(':memory:')
+        self.records = []
+        for manufacturer, reference, quantity in [('Hager', 'HTS263E', 2), ('KNX', 'MTN6003-0002', 1),
+                                                  ('Swisspro', 'SP001', None)]:
+            row = MaterialRow(quantity=quantity, reference=reference)
+            row.apply_product(db.get_product(reference, manufacturer))
+            self.records.append(dict(row.to_dict(), manufacturer=manufacturer))
+
+    def test_tableau_totals(self):
+        """Totali di un quadro: materiali, manodopera, margine e info tableau"""
+        labor = [{'type': 'Schéma', 'hours': 2.0}]
+        totals = TotalCalculations.calculate_tableau_totals(self.records, labor, LaborType.INTERNAL, 0.25)
+
+        self.assertAlmostEqual(totals['material_total'], 544.60)
+        self.assertAlmostEqual(totals['labor_total'], 2 * 64.00 * 1.5)
+        self.assertAlmostEqual(totals['final_total'], 544.60 * 1.25 + 192.0)
+        self.assertEqual(totals['time_total'], 75)
+        self.assertEqual(totals['info']['Tot Modules KNX'], 2.0)
+        self.assertEqual(totals['info']['Qté 4P/+4P'], 2.0)
+        self.assertEqual(totals['info']['Tot Modules'], 10.0)
+
+    def test_time_total_matches_row_times(self):
+        """Il tempo totale è la somma dei minuti interi mostrati per ogni riga"""
+        rows = [MaterialRow(quantity=1.5, reference='X', price=1.0, time=5),
+                MaterialRow(quantity=0.5, reference='Y', price=1.0, time=3)]
+        records = [dict(row.to_dict(), manufacturer='Hager') for row in rows]
+        expected = sum(row.total_time for row in rows)
+        self.assertEqual(expected, 8)
+        self.assertEqual(MaterialCalculations.calculate_material_totals(records)['total_time'], expected)
+        self.assertEqual(MaterialCalculations.build_totals(
+            MaterialCalculations.sum_contributions(records))['total_time'], expected)
+
+    def test_incremental_totals_match_full_recalculation(self):
+        """L'aggregatore incrementale dà gli stessi totali del ricalcolo completo"""
+        rows = {}
+        aggregator = MaterialTotalsAggregator(records_provider=lambda: list(rows.values()),
+                                              verify_every=1)
+        edits = [(0, self.records[0]), (1, self.records[1]), (2, self.records[2]),
+                 (0, dict(self.records[0], quantity=5)), (1, None)]
+        for index, record in edits:
+            old = rows.pop(index, None)
+            if record is not None:
+                rows[index] = record
+            aggregator.apply(old, record)
+
+        self.assertEqual(aggregator.mismatches, 0)
+        expected = MaterialCalculations.calculate_material_totals(rows.values())
+        self.assertAlmostEqual(aggregator.totals()['total_price'], expected['total_price'])
+        self.assertAlmostEqual(aggregator.totals()['total_price'], 5 * 62.30)
+        self.assertEqual(aggregator.totals()['modules']['knx'], 0)
+
+    def test_block_update_matches_single_updates(self):
+        """apply_many su un blocco dà gli stessi totali delle modifiche una per una"""
+        changes = [(None, self.records[0]), (None, self.records[1]),
+                   (self.records[0], dict(self.records[0], quantity=5)), (self.records[1], None)]
+        single = MaterialTotalsAggregator()
+        for old, new in changes:
+            single.apply(old, new)
+        block = MaterialTotalsAggregator(records_provider=lambda: [dict(self.records[0], quantity=5)],
+                                         verify_every=3)
+        block.apply_many(changes)
+
+        self.assertEqual(block.mismatches, 0)
+        self.assertEqual(block.updates, 4)
+        self.assertAlmostEqual(block.totals()['total_price'], single.totals()['total_price'])
+        self.assertEqual(block.totals()['modules'], single.totals()['modules'])
+
+    def test_vectorized_totals_match_python_loop(self):
+        """Il calcolo NumPy per gruppi coincide con la somma riga per riga"""
+        records = self.records + [dict(self.records[0], quantity=3, manufacturer='KNX')]
+        groups = [0, 1, 1, 0]
+        columns = MaterialCalculations.material_columns(records)
+        grouped = MaterialCalculations.calculate_material_totals_arrays(**columns, groups=groups)
+
+        for group, totals in enumerate(grouped):
+            rows = [record for record, g in zip(records, groups) if g == group]
+            expected = MaterialCalculations.build_totals(MaterialCalculations.sum_contributions(rows))
+            self.assertAlmostEqual(totals['total_price'], expected['total_price'])
+            self.assertEqual(totals['modules'], expected['modules'])
+            self.assertEqual(totals['bornes'], expected['bornes'])
+
+def qt_application():
+    """QApplication condivisa dai test dei widget, senza display (piattaforma offscreen)"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+class TestWidgets(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = qt_application()
+
+    def test_labor_type_emits_once(self):
+        """Un cambio di tipo di manodopera emette dataChanged una sola volta"""
+        from src.ui.widgets import LaborWidget
+        widget = LaborWidget()
+        emitted = []
+        widget.dataChanged.connect(lambda: emitted.append(True))
+        widget.type_buttons[LaborType.BKW].click()
+        self.assertEqual(len(emitted), 1)
+        self.assertEqual(widget.current_labor_type, LaborType.BKW)
+
+        widget.set_labor_rows([{'type': 'Pose', 'hours': 2.0}], LaborType.INTERNAL)
+        self.assertEqual(len(emitted), 1)
+        self.assertIn({'type': 'Pose', 'hours': 2.0}, widget.get_labor_rows())
+
+    def test_restore_keeps_blocked_signals(self):
+        """I metodi che bloccano i segnali ripristinano lo stato precedente"""
+        from src.ui.widgets import LaborWidget, SummaryWidget
+        labor = LaborWidget()
+        labor.blockSignals(True)
+        labor.table.blockSignals(True)
+        labor.set_labor_rows([{'type': 'Pose', 'hours': 1.0}])
+        self.assertTrue(labor.signalsBlocked())
+        self.assertTrue(labor.table.signalsBlocked())
+
+        summary = SummaryWidget()
+        summary.margin_spin.blockSignals(True)
+        for notify in (True, False):
+            summary.set_margin(0.3, notify=notify)
+            self.assertTrue(summary.margin_spin.signalsBlocked())
+        summary.margin_spin.blockSignals(False)
+        summary.set_margin(0.2, notify=False)
+        self.assertFalse(summary.margin_spin.signalsBlocked())
+
+    def test_recalc_requests_coalesce(self):
+        """Molte richieste nello stesso giro del ciclo eventi: un ricalcolo per quadro"""
+        from PyQt6.QtTest import QTest
+        from src.ui.recalc_scheduler import RecalcScheduler
+        calls = []
+        scheduler = RecalcScheduler(calls.append)
+        for _ in range(100):
+            scheduler.request('Q1')
+        for _ in range(50):
+            scheduler.request('Q2')
+        scheduler.request('Q3')
+        scheduler.cancel('Q3')
+        self.assertEqual(calls, [])
+
+        QTest.qWait(20)
+        self.assertEqual(calls, ['Q1', 'Q2'])
+        self.assertEqual(scheduler.stats(), {'requested': 151, 'executed': 2, 'saved': 149})
+
+        scheduler.request('Q1')
+        QTest.qWait(20)
+        self.assertEqual(calls, ['Q1', 'Q2', 'Q1'])
+        self.assertEqual(scheduler.saved, 149)
+
+class TestMaterialsModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = qt_application()
+
+    def setUp(self):
+        from PyQt6.QtCore import qInstallMessageHandler
+        from PyQt6.QtTest import QAbstractItemModelTester
+        from src.ui.widgets.materials_model import MaterialsTableModel
+        self.db = Database(':memory:')
+        self.model = MaterialsTableModel(
+            manufacturer='Hager',
+            resolve_product=lambda reference: self.db.get_product(reference, 'Hager'),
+            resolve_products=lambda references: {key[1]: product for key, product in self.db.get_products(
+                ('Hager', reference) for reference in references).items() if product}
+        )
+        # Le violazioni del contratto dei modelli Qt trovate dal tester arrivano come avvisi
+        self.warnings = []
+        qInstallMessageHandler(lambda mode, context, message: self.warnings.append(message))
+        self.addCleanup(qInstallMessageHandler, None)
+        self.tester = QAbstractItemModelTester(
+            self.model, QAbstractItemModelTester.FailureReportingMode.Warning)
+        self.signals = {'inserted': [], 'removed': [], 'changed': []}
+        self.model.rowsInserted.connect(lambda parent, first, last: self.signals['inserted'].append((first, last)))
+        self.model.rowsRemoved.connect(lambda parent, first, last: self.signals['removed'].append((first, last)))
+        self.model.dataChanged.connect(
+            lambda first, last, roles: self.signals['changed'].append(
+                ((first.row(), first.column()), (last.row(), last.column()))))
+
+    def tearDown(self):
+        self.assertEqual(self.warnings, [])
+
+    def test_grow_and_trim(self):
+        """Le righe libere seguono l'ultima riga compilata, con i segnali di inserimento e rimozione"""
+        from PyQt6.QtCore import QModelIndex, Qt
+        model = self.model
+        spare = model.spare_rows
+        self.assertEqual(model.flags(QModelIndex()), Qt.ItemFlag.NoItemFlags)
+        self.assertTrue(model.flags(model.index(0, 1)) & Qt.ItemFlag.ItemIsEditable)
+        self.assertEqual(model.rowCount(), spare)
+
+        self.assertTrue(model.setData(model.index(spare - 1, 1), 'HTS263E'))
+        self.assertEqual(model.rowCount(), 2 * spare)
+        self.assertEqual(self.signals['inserted'], [(spare, 2 * spare - 1)])
+        self.assertEqual(model.data(model.index(spare - 1, 2)), 'Interruttore 2P C 63A')
+
+        # Riga intermedia: nessuna riga aggiunta
+        model.setData(model.index(2, 0), '3')
+        self.assertEqual(model.rowCount(), 2 * spare)
+        self.assertEqual(len(self.signals['inserted']), 1)
+
+        model.clear_row(spare - 1)
+        self.assertEqual(self.signals['removed'], [(3 + spare, 2 * spare - 1)])
+        self.assertEqual(model.rowCount(), 3 + spare)
+        model.clear_row(2)
+        self.assertEqual(model.rowCount(), spare)
+        self.assertEqual(self.signals['removed'][-1], (spare, spare + 2))
+
+    def test_paste_block_grows_table(self):
+        """Un blocco incollato oltre la fine aggiunge righe ed emette un solo dataChanged"""
+        model = self.model
+        spare = model.spare_rows
+        blocks = []
+        model.rowsChanged.connect(blocks.append)
+        start = spare - 2
+        changes = [{'quantity': 2.0, 'reference': 'HTS263E'}, {}, {'quantity': 1.0},
+                   {'quantity': 4.0, 'reference': 'HTS240E'}]
+        self.assertEqual(model.update_rows(start, changes), 3)
+
+        self.assertEqual(model.rowCount(), start + len(changes) + spare)
+        self.assertEqual(self.signals['inserted'], [(spare, start + len(changes) + spare - 1)])
+        self.assertEqual(self.signals['changed'],
+                         [((start, 0), (start + len(changes) - 1, model.columnCount() - 1))])
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(model.data(model.index(start + 3, 3)), '58.70')
+        self.assertEqual(model.data(model.index(start + 3, 5)), '234.80')
+
+    def test_has_content_counts_filled_rows(self):
+        """has_content segue le righe compilate in ogni tipo di modifica"""
+        model = self.model
+        self.assertFalse(model.has_content())
+        model.update_row(0, reference='HTS263E')
+        self.assertFalse(model.has_content())
+        model.update_row(0, quantity=2.0)
+        self.assertTrue(model.has_content())
+        model.update_rows(1, [{'quantity': 1.0, 'reference': 'HTS240E'}, {'quantity': 3.0}])
+        model.clear_row(0)
+        self.assertTrue(model.has_content())
+        model.update_rows(1, [{'reference': ''}])
+        self.assertFalse(model.has_content())
+
+        model.set_row(4, MaterialRow(1.0, 'HTS263E'))
+        self.assertTrue(model.has_content())
+        model.set_row(4, MaterialRow(1.0))
+        self.assertFalse(model.has_content())
+
+        model.load_rows([dict(MaterialRow(2.0, 'HTS263E').to_dict(), row=3)])
+        self.assertTrue(model.has_content())
+        model.load_rows([])
+        self.assertFalse(model.has_content())
+
+class TestMainWindow(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = qt_application()
+
+    def setUp(self):
+        from src.ui.main_window import MainWindow
+        self.project = Project(name="P", client_name="C", volta_number="V1")
+        for i in range(5):
+            self.project.add_tableau(f"Q{i}")
+        # Catalogo in memoria e progetto già pronto al posto della finestra iniziale
+        with mock.patch('src.ui.main_window.Database', lambda: Database(':memory:')), \
+                mock.patch.object(MainWindow, 'setup_project',
+                                  lambda window: setattr(window, 'project', self.project)):
+            self.window = MainWindow()
+        self.window.auto_save_timer.stop()
+        self.addCleanup(self.window.deleteLater)
+        self.tabs = [self.window.tableaux_tabs.widget(i) for i in range(5)]
+
+    def activate(self, index):
+        self.window.tableaux_tabs.setCurrentIndex(index)
+        self.app.processEvents()
+
+    def test_save_does_not_wait_for_export(self):
+        """Attendere il salvataggio automatico non attende un'esportazione in corso"""
+        from PyQt6.QtCore import QThreadPool
+        from src.ui.workers import Worker
+        release = threading.Event()
+        QThreadPool.globalInstance().start(Worker(release.wait, 10))
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                self.project.filename = os.path.join(tmpdir, 'p.volta')
+                start = time.monotonic()
+                self.window.auto_save()
+                self.window.wait_for_autosave()
+                self.assertLess(time.monotonic() - start, 5)
+                self.assertTrue(os.path.exists(self.project.filename))
+        finally:
+            release.set()
+            QThreadPool.globalInstance().waitForDone()
+
+    def test_reference_suggestions_without_per_tab_lists(self):
+        """I tab dei materiali non caricano elenchi di referenze: i suggerimenti vengono dal catalogo"""
+        from PyQt6.QtWidgets import QStyleOptionViewItem
+        with mock.patch.object(Database, 'get_references_by_manufacturer') as references:
+            for index in range(5):
+                self.activate(index)
+        references.assert_not_called()
+
+        widget = self.tabs[4].materials_widgets[MANUFACTURERS.index('Hager')]
+        editor = widget.table.itemDelegate().createEditor(
+            widget.table.viewport(), QStyleOptionViewItem(), widget.model.index(0, 1))
+        self.assertEqual(editor.search, widget.search_references)
+        self.assertEqual(editor.search('HTS263')[0][0], 'HTS263E')
+
+    def test_lazy_tabs_keep_unsaved_edits(self):
+        """Tab costruiti alla prima apertura, rilasciati i meno recenti senza perdere modifiche"""
+        from src.config import UI_CONFIG
+        tabs = self.tabs
+        self.assertEqual([tab.is_built for tab in tabs], [True, False, False, False, False])
+
+        # Modifiche non salvate nel primo quadro
+        hager = tabs[0].materials_widgets[MANUFACTURERS.index('Hager')].model
+        hager.setData(hager.index(0, 1), 'HTS263E')
+        hager.setData(hager.index(0, 0), '2')
+        labor_table = tabs[0].labor_widget.table
+        pose = next(row for row in range(labor_table.rowCount()) if labor_table.item(row, 0).text() == 'Pose')
+        labor_table.item(pose, 1).setText('3')
+        tabs[0].labor_widget.type_buttons[LaborType.BKW].click()
+        self.app.processEvents()
+        totals = tabs[0].material_totals.totals()
+
+        for index in range(1, 5):
+            self.activate(index)
+        self.assertEqual(len(self.window.live_tableaux), UI_CONFIG['live_inactive_tableaux'] + 1)
+        self.assertFalse(tabs[0].is_built)
+        self.assertTrue(all(tab.is_built for tab in tabs[1:]))
+        tableau = self.project.tableaux["Q0"]
+        self.assertEqual(tableau.materials_data['Hager'][0]['reference'], 'HTS263E')
+        self.assertIn({'type': 'Pose', 'hours': 3.0}, tableau.labor_data)
+        self.assertEqual(tableau.summary_data['labor_type'], LaborType.BKW.value)
+
+        # Alla riapertura si rilascia il meno recente (Q1) e le modifiche tornano nei widget
+        self.activate(0)
+        self.assertTrue(tabs[0].is_built)
+        self.assertFalse(tabs[1].is_built)
+        hager = tabs[0].materials_widgets[MANUFACTURERS.index('Hager')].model
+        self.assertEqual(hager.data(hager.index(0, 1)), 'HTS263E')
+        self.assertEqual(hager.data(hager.index(0, 0)), '2')
+        self.assertEqual(tabs[0].labor_widget.current_labor_type, LaborType.BKW)
+        self.assertIn({'type': 'Pose', 'hours': 3.0}, tabs[0].labor_widget.get_labor_rows())
+        self.assertEqual(tabs[0].material_totals.totals(), totals)
+        self.assertTrue(self.project.is_dirty)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file